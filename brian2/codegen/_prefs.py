@@ -21,9 +21,22 @@ brian_prefs.register_preferences(
         * `'weave`' uses ``scipy.weave`` to generate and compile C++ code,
           should work anywhere where ``gcc`` is installed and available at the
           command line.
+        * `'cpp_extension'` uses the same C++ code as weave, but compiles it
+          into Python extension modules (without depending on weave).
+        * `'numexpr'` uses the numpy code but evaluates vector expressions
+          with the ``numexpr`` package (using several threads).
         
         Or it can be a ``CodeObject`` class.
         ''',
         validator=lambda target: isinstance(target, str) or issubclass(target, CodeObject),
         ),
+    loop_invariant_optimisations = BrianPreference(
+        default=True,
+        docs='''
+        Whether to optimise the generated code by calculating expressions that
+        only refer to scalar values (e.g. ``exp(-dt/tau)``) only once instead
+        of for every element, and by calculating common subexpressions of the
+        statements only once. See `brian2.codegen.optimisation`.
+        ''',
+        ),
     )
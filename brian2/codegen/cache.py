@@ -0,0 +1,347 @@
+'''
+Module providing a persistent on-disk cache for generated code.
+
+The cache stores the rendered code of a `CodeObject` (and, if the target
+supports it, its compiled form, e.g. the Python bytecode for numpy) so that
+other processes running the same model do not have to repeat the code
+generation. Entries are addressed by a hash over everything that determines
+the generated code: the abstract code, the signatures of the variables, the
+template, the preferences and the version of the code generation machinery.
+'''
+import os
+import sys
+import hashlib
+import cPickle as pickle
+
+import numpy as np
+
+import brian2
+from brian2.core.preferences import brian_prefs, BrianPreference
+from brian2.core.names import Nameable
+from brian2.core.variables import (Variable, ArrayVariable, AttributeVariable,
+                                   Subexpression)
+from brian2.core.functions import Function
+from brian2.utils.logger import get_logger
+
+from .templates import MultiTemplate
+
+__all__ = ['CodeCache', 'get_code_cache', 'code_object_cache_key']
+
+logger = get_logger(__name__)
+
+# Preferences
+brian_prefs.register_preferences(
+    'codegen.cache',
+    'Code cache preferences',
+    directory = BrianPreference(
+        default=os.path.join('~', '.brian', 'code_cache'),
+        docs='''
+        The directory in which generated code is stored, so that the code
+        generation for a code object does not have to be repeated in other
+        processes. Use an empty string to switch off the cache.
+        '''
+        ),
+    size_limit = BrianPreference(
+        default=100,
+        docs='''
+        The maximum size of the code cache in megabytes. If the cache grows
+        larger, the least recently used entries are deleted.
+        '''
+        ),
+    )
+
+
+class _NotCacheable(Exception):
+    pass
+
+
+def _signature(value):
+    '''
+    Return a hashable description of ``value`` that does not depend on the
+    current process. Raises `_NotCacheable` for unknown objects.
+    '''
+    if value is None or isinstance(value, (bool, int, long, float, basestring)):
+        return value
+    elif isinstance(value, (tuple, list)):
+        return tuple(_signature(v) for v in value)
+    elif isinstance(value, (set, frozenset)):
+        return ('set', tuple(sorted(_signature(v) for v in value)))
+    elif isinstance(value, dict):
+        return ('dict', tuple(sorted((_signature(k), _signature(v))
+                                     for k, v in value.iteritems())))
+    elif isinstance(value, np.dtype):
+        return ('dtype', value.str)
+    elif isinstance(value, np.generic):
+        return ('numpy', value.dtype.str, value.item())
+    elif isinstance(value, type):
+        return ('class', value.__module__, value.__name__)
+    elif isinstance(value, Nameable):
+        return (value.__class__.__name__, value.name)
+    else:
+        raise _NotCacheable(repr(value))
+
+
+def _variable_signature(var, generator, owner):
+    '''
+    Return a description of a `Variable` (or `Function`) with everything that
+    can influence the generated code.
+    '''
+    if isinstance(var, Function):
+        try:
+            implementation = var.implementations[generator.codeobj_class]
+        except KeyError:
+            return ('Function', None)
+        return ('Function', implementation.name,
+                _signature(implementation.get_code(owner)))
+    elif not isinstance(var, Variable):
+        return _signature(var)
+
+    signature = [var.__class__.__name__, var.name,
+                 None if var.dtype is None else np.dtype(var.dtype).str,
+                 var.scalar, var.constant, var.read_only]
+    if isinstance(var, ArrayVariable):
+        signature.append(generator.get_array_name(var))
+        if hasattr(var, 'resize'):
+            signature.append(generator.get_array_name(var, access_data=False))
+        if var.conditional_write is not None:
+            signature.append(var.conditional_write.name)
+    elif isinstance(var, Subexpression):
+        signature.append(var.expr)
+    elif isinstance(var, AttributeVariable):
+        signature.append(var.attribute)
+    return tuple(signature)
+
+
+_code_version = None
+
+
+def _get_code_version():
+    '''
+    Return a hash describing the Brian and Python versions as well as the
+    state of the code generation source files and templates, so that changes
+    to any of these invalidate the cache.
+    '''
+    global _code_version
+    if _code_version is None:
+        version_hash = hashlib.sha1(brian2.__version__)
+        version_hash.update(sys.version)
+        base_dir = os.path.dirname(brian2.__file__)
+        for package in ['codegen', 'parsing']:
+            for dirpath, dirnames, filenames in os.walk(os.path.join(base_dir,
+                                                                     package)):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.endswith(('.pyc', '.pyo')):
+                        continue
+                    full_name = os.path.join(dirpath, filename)
+                    stat = os.stat(full_name)
+                    version_hash.update('%s:%d:%d' % (full_name,
+                                                      stat.st_mtime,
+                                                      stat.st_size))
+        _code_version = version_hash.hexdigest()
+    return _code_version
+
+
+def code_object_cache_key(codeobj_class, template_name, name, abstract_code,
+                          variables, variable_indices, template_kwds,
+                          override_conditional_write, generator, owner):
+    '''
+    Return the key under which the code for a code object is stored in the
+    cache.
+
+    The arguments are the arguments of `Device.code_object`, with ``name``
+    being the final (unique) name of the code object and ``generator`` the
+    `CodeGenerator` that would translate the code.
+
+    Returns
+    -------
+    key : str or ``None``
+        A hexadecimal hash, or ``None`` if the code object cannot be cached
+        (e.g. because one of the template keywords is an unknown object).
+    '''
+    try:
+        prefs = [(pref_name, _signature(brian_prefs[pref_name]))
+                 for pref_name in sorted(brian_prefs)
+                 if (pref_name.startswith(('core.', 'codegen.')) and
+                     not pref_name.startswith('codegen.cache.'))]
+        description = (_get_code_version(),
+                       codeobj_class.__module__, codeobj_class.__name__,
+                       template_name, name,
+                       _signature(abstract_code),
+                       tuple(sorted((varname,
+                                     _variable_signature(var, generator, owner))
+                                    for varname, var in variables.iteritems())),
+                       _signature(dict(variable_indices)),
+                       _signature(template_kwds),
+                       _signature(override_conditional_write),
+                       tuple(prefs))
+    except _NotCacheable as ex:
+        logger.debug('Not caching code object %s: %s' % (name, ex))
+        return None
+    return hashlib.sha1(repr(description)).hexdigest()
+
+
+class CodeCache(object):
+    '''
+    A directory of cached code, with a least-recently-used eviction policy.
+
+    Parameters
+    ----------
+    directory : str
+        The directory where the cache entries are stored.
+    size_limit : int
+        The maximum total size of all entries in bytes.
+    '''
+    def __init__(self, directory, size_limit):
+        self.directory = directory
+        self.size_limit = size_limit
+        #: Number of successful lookups
+        self.hits = 0
+        #: Number of failed lookups
+        self.misses = 0
+        # The total size of the entries, determined at the first write
+        self._size = None
+
+    def _filename(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def get(self, key):
+        '''
+        Look up an entry in the cache.
+
+        Parameters
+        ----------
+        key : str
+            The key as returned by `code_object_cache_key`.
+
+        Returns
+        -------
+        entry : tuple or ``None``
+            A tuple ``(code, compiled_data)`` with the code (a string or a
+            `MultiTemplate`) and the data returned by
+            `CodeObject.get_compiled_data`, or ``None`` if there is no entry
+            for this key.
+        '''
+        filename = self._filename(key)
+        try:
+            with open(filename, 'rb') as f:
+                code, compiled_data = pickle.load(f)
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        except Exception as ex:
+            # A corrupted entry (e.g. from an interrupted write on a file
+            # system without atomic renames)
+            logger.debug('Removing corrupted code cache entry %s: %s' % (filename, ex))
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            self.misses += 1
+            return None
+        # Mark the entry as recently used
+        try:
+            os.utime(filename, None)
+        except OSError:
+            pass
+        self.hits += 1
+        if isinstance(code, dict):
+            code = MultiTemplate.from_templates(code)
+        return code, compiled_data
+
+    def set(self, key, code, compiled_data=None):
+        '''
+        Store an entry in the cache and remove the least recently used entries
+        if the cache got too big.
+
+        Parameters
+        ----------
+        key : str
+            The key as returned by `code_object_cache_key`.
+        code : str or `MultiTemplate`
+            The rendered code.
+        compiled_data : object, optional
+            The (picklable) compiled form of the code.
+        '''
+        if isinstance(code, MultiTemplate):
+            code = code._templates
+        if not os.path.exists(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                # Another process might have created it in the meantime
+                if not os.path.isdir(self.directory):
+                    raise
+        filename = self._filename(key)
+        # Write to a temporary file first, so that other processes never see
+        # an incomplete entry
+        tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+        with open(tmp_filename, 'wb') as f:
+            pickle.dump((code, compiled_data), f, pickle.HIGHEST_PROTOCOL)
+        size = os.path.getsize(tmp_filename)
+        try:
+            os.rename(tmp_filename, filename)
+        except OSError:
+            # On Windows, renaming fails if the target exists
+            os.remove(tmp_filename)
+            return
+        if self._size is None:
+            self._size = self._total_size()
+        else:
+            self._size += size
+        if self._size > self.size_limit:
+            self.prune()
+
+    def _entries(self):
+        entries = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.pickle'):
+                continue
+            full_name = os.path.join(self.directory, filename)
+            try:
+                stat = os.stat(full_name)
+            except OSError:
+                # Removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, full_name))
+        return entries
+
+    def _total_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def prune(self):
+        '''
+        Remove the least recently used entries until the total size of the
+        cache is below its size limit.
+        '''
+        entries = sorted(self._entries())
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, filename in entries:
+            if total_size <= self.size_limit:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            total_size -= size
+        self._size = total_size
+
+
+_code_cache = None
+
+
+def get_code_cache():
+    '''
+    Return the `CodeCache` as specified by the preferences, or ``None`` if the
+    cache is switched off.
+    '''
+    global _code_cache
+    directory = brian_prefs['codegen.cache.directory']
+    if not directory:
+        return None
+    directory = os.path.expanduser(directory)
+    size_limit = int(brian_prefs['codegen.cache.size_limit'] * 1024 * 1024)
+    if (_code_cache is None or _code_cache.directory != directory or
+            _code_cache.size_limit != size_limit):
+        _code_cache = CodeCache(directory, size_limit)
+    return _code_cache
@@ -58,6 +58,28 @@ class CodeObject(Nameable):
     def compile(self):
         pass
 
+    def get_compiled_data(self):
+        '''
+        Return the compiled form of the code so that it can be stored in the
+        code cache (see `brian2.codegen.cache`).
+
+        Returns
+        -------
+        data : object
+            A picklable object that can be passed to `load_compiled_data`, or
+            ``None`` (the default implementation) if the compiled form cannot
+            be stored.
+        '''
+        return None
+
+    def load_compiled_data(self, data):
+        '''
+        Use a previously compiled form of the code (as returned by
+        `get_compiled_data`) instead of compiling it. The default
+        implementation ignores ``data`` and calls `compile`.
+        '''
+        self.compile()
+
     def __call__(self, **kwds):
         self.update_namespace()
         self.namespace.update(**kwds)
@@ -76,6 +98,30 @@ class CodeObject(Nameable):
         '''
         raise NotImplementedError()
 
+    @classmethod
+    def multistep_runner(cls, code_objects, clock):
+        '''
+        Return a function that runs a sequence of code objects for several
+        time steps in a single call.
+
+        Parameters
+        ----------
+        code_objects : list of `CodeObject`
+            The code objects (all of this class) that are run in every time
+            step, in the order in which they should be run.
+        clock : `Clock`
+            The clock for all the code objects.
+
+        Returns
+        -------
+        runner : callable or ``None``
+            A function taking the number of time steps to run as its only
+            argument, with a ``steps`` attribute giving the maximum number of
+            time steps per call. ``None`` (the default implementation) if the
+            code objects cannot be run in this way.
+        '''
+        return None
+
 
 def check_code_units(code, group, additional_variables=None,
                      level=0, run_namespace=None,):
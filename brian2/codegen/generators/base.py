@@ -2,9 +2,13 @@
 Base class for generating code in different programming languages, gives the
 methods which should be overridden to implement a new language.
 '''
+import itertools
+
+from brian2.core.preferences import brian_prefs
 from brian2.core.variables import ArrayVariable
 from brian2.utils.stringtools import get_identifiers
 from brian2.codegen.translation import make_statements
+from brian2.codegen.optimisation import optimise_statements
 
 __all__ = ['CodeGenerator']
 
@@ -22,7 +26,7 @@ class CodeGenerator(object):
 
     def __init__(self, variables, variable_indices, owner, iterate_all,
                  codeobj_class, override_conditional_write=None,
-                 allows_scalar_write=False):
+                 allows_scalar_write=False, uses_scalar_code=False):
         # We have to do the import here to avoid circular import dependencies.
         from brian2.devices.device import get_device
         self.device = get_device()
@@ -36,6 +40,9 @@ class CodeGenerator(object):
         else:
             self.override_conditional_write = set(override_conditional_write)
         self.allows_scalar_write = allows_scalar_write
+        #: Whether the template executes the scalar code, i.e. whether
+        #: expressions can be moved from the vector into the scalar code
+        self.uses_scalar_code = uses_scalar_code
 
     @staticmethod
     def get_array_name(var, access_data=True):
@@ -158,11 +165,28 @@ class CodeGenerator(object):
                                if var in conditional_write_vars)))
         return read, write, indices, conditional_write_vars
 
+    def replace_function_variables(self):
+        '''
+        Replace the `Function` objects in the variables by the objects that
+        the generated code uses. This is done as part of `translate`, but has
+        to be done separately for code that is loaded from the code cache.
+        '''
+        pass
+
     def translate(self, code, dtype):
         '''
         Translates an abstract code block into the target language.
         '''
         statements = {}
+        # Use unique names for new variables over all code blocks, they might
+        # end up in the same function
+        counter = itertools.count(1)
         for ac_name, ac_code in code.iteritems():
             statements[ac_name] = make_statements(ac_code, self.variables, dtype)
+            if brian_prefs['codegen.loop_invariant_optimisations']:
+                statements[ac_name] = optimise_statements(statements[ac_name],
+                                                          self.variables,
+                                                          dtype,
+                                                          hoist_scalars=self.uses_scalar_code,
+                                                          counter=counter)
         return self.translate_statement_sequence(statements)
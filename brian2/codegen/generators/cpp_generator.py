@@ -1,4 +1,5 @@
 import itertools
+import hashlib
 
 import numpy
 
@@ -228,6 +229,36 @@ class CPPCodeGenerator(CodeGenerator):
         else:
             return ''
 
+    def replace_function_variables(self):
+        '''
+        Replace the `Function` objects in the variables by the values the
+        generated code refers to: the Python function (prefixed with
+        ``_python_``) and the namespace of the function implementation (e.g.
+        the state of the random number generator).
+        '''
+        user_functions = []
+        for varname, variable in self.variables.items():
+            if isinstance(variable, Function):
+                user_functions.append((varname, variable))
+                # add the Python function with a leading '_python', if it
+                # exists. This allows the function to make use of the Python
+                # function via weave if necessary (e.g. in the case of randn)
+                if not variable.pyfunc is None:
+                    pyfunc_name = '_python_' + varname
+                    if pyfunc_name in self.variables:
+                        logger.warn(('Namespace already contains function %s, '
+                                     'not replacing it') % pyfunc_name)
+                    else:
+                        self.variables[pyfunc_name] = variable.pyfunc
+
+        # delete the user-defined functions from the namespace and add the
+        # function namespaces (if any)
+        for funcname, func in user_functions:
+            del self.variables[funcname]
+            func_namespace = func.implementations[self.codeobj_class].get_namespace(self.owner)
+            if func_namespace is not None:
+                self.variables.update(func_namespace)
+
     def determine_keywords(self):
         # set up the restricted pointers, these are used so that the compiler
         # knows there is no aliasing in the pointers, for optimisation
@@ -256,34 +287,26 @@ class CPPCodeGenerator(CodeGenerator):
         pointers = '\n'.join(lines)
 
         # set up the functions
-        user_functions = []
         support_code = ''
         hash_defines = ''
         for varname, variable in self.variables.items():
             if isinstance(variable, Function):
-                user_functions.append((varname, variable))
                 funccode = variable.implementations[self.codeobj_class].get_code(self.owner)
                 if funccode is not None:
-                    support_code += '\n' + deindent(funccode.get('support_code', ''))
+                    func_support_code = deindent(funccode.get('support_code', ''))
+                    if func_support_code.strip():
+                        # Make sure that every block of support code is only
+                        # defined once, even if the code of several code
+                        # objects is compiled together (see
+                        # WeaveMultiStepRunner)
+                        guard = '_BRIAN_SUPPORT_CODE_%s' % hashlib.sha1(func_support_code).hexdigest()
+                        support_code += '\n'.join(['', '#ifndef ' + guard,
+                                                   '#define ' + guard,
+                                                   func_support_code,
+                                                   '#endif'])
                     hash_defines += '\n' + deindent(funccode.get('hashdefine_code', ''))
-                # add the Python function with a leading '_python', if it
-                # exists. This allows the function to make use of the Python
-                # function via weave if necessary (e.g. in the case of randn)
-                if not variable.pyfunc is None:
-                    pyfunc_name = '_python_' + varname
-                    if pyfunc_name in self.variables:
-                        logger.warn(('Namespace already contains function %s, '
-                                     'not replacing it') % pyfunc_name)
-                    else:
-                        self.variables[pyfunc_name] = variable.pyfunc
 
-        # delete the user-defined functions from the namespace and add the
-        # function namespaces (if any)
-        for funcname, func in user_functions:
-            del self.variables[funcname]
-            func_namespace = func.implementations[self.codeobj_class].get_namespace(self.owner)
-            if func_namespace is not None:
-                self.variables.update(func_namespace)
+        self.replace_function_variables()
 
         keywords = {'pointers_lines': stripped_deindented_lines(pointers),
                     'support_code_lines': stripped_deindented_lines(support_code),
@@ -302,7 +325,20 @@ class CPPCodeGenerator(CodeGenerator):
             scalar_code[name] = self.translate_one_statement_sequence(scalar_statements)
             vector_code[name] = self.translate_one_statement_sequence(vector_statements)
 
+        # Information for templates that run the vector code in parallel: the
+        # random number functions use a global state and the variables written
+        # to determine which indices can be processed in parallel
+        uses_random_numbers = any(self.variables.get(func_name, None) is
+                                  DEFAULT_FUNCTIONS[func_name]
+                                  for func_name in ['rand', 'randn'])
+        written_variables = set(stmt.var for block in statements.itervalues()
+                                for stmt in block
+                                if isinstance(self.variables.get(stmt.var, None),
+                                              ArrayVariable))
+
         kwds = self.determine_keywords()
+        kwds['uses_random_numbers'] = uses_random_numbers
+        kwds['written_variables'] = written_variables
 
         return scalar_code, vector_code, kwds
 
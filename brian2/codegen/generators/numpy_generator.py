@@ -1,3 +1,4 @@
+import ast
 import itertools
 
 import numpy as np
@@ -5,12 +6,43 @@ import numpy as np
 from brian2.utils.stringtools import word_substitute
 from brian2.parsing.rendering import NumpyNodeRenderer
 from brian2.core.functions import DEFAULT_FUNCTIONS, Function
+from brian2.core.preferences import brian_prefs, BrianPreference
 from brian2.core.variables import ArrayVariable
 
 from .base import CodeGenerator
 
 __all__ = ['NumpyCodeGenerator']
 
+# Preferences
+brian_prefs.register_preferences(
+    'codegen.generators.numpy',
+    'Numpy codegen preferences',
+    inplace_operations = BrianPreference(
+        default=False,
+        docs='''
+        Whether to translate vector statements into sequences of ufunc calls
+        that store their results in preallocated buffers (using the ``out``
+        argument) instead of creating new temporary arrays for every operation.
+        Only applies to code that operates on all elements of a group, e.g.
+        state updates.
+        '''
+        )
+    )
+
+# ufuncs used for the operators in in-place mode
+BINARY_UFUNCS = {'Add': 'add',
+                 'Sub': 'subtract',
+                 'Mult': 'multiply',
+                 'Div': 'divide',
+                 'Pow': 'power',
+                 'Mod': 'remainder'}
+INPLACE_UFUNCS = {'+=': 'add',
+                  '-=': 'subtract',
+                  '*=': 'multiply',
+                  '/=': 'divide',
+                  '**=': 'power',
+                  '%=': 'remainder'}
+
 
 class NumpyCodeGenerator(CodeGenerator):
     '''
@@ -21,12 +53,20 @@ class NumpyCodeGenerator(CodeGenerator):
 
     class_name = 'numpy'
 
-    def translate_expression(self, expr):
+    def __init__(self, *args, **kwds):
+        super(NumpyCodeGenerator, self).__init__(*args, **kwds)
+        self.inplace_operations = brian_prefs['codegen.generators.numpy.inplace_operations']
+
+    def substitute_function_names(self, expr):
         for varname, var in self.variables.iteritems():
             if isinstance(var, Function):
                 impl_name = var.implementations[self.codeobj_class].name
                 if impl_name is not None:
                     expr = word_substitute(expr, {varname: impl_name})
+        return expr
+
+    def translate_expression(self, expr):
+        expr = self.substitute_function_names(expr)
         return NumpyNodeRenderer().render_expr(expr, self.variables).strip()
 
     def translate_statement(self, statement):
@@ -41,7 +81,219 @@ class NumpyCodeGenerator(CodeGenerator):
             code += ' # ' + comment
         return code
         
+    def ufunc_names(self):
+        '''
+        Return the names of all functions that are implemented as numpy
+        ufuncs (and therefore allow to specify an ``out`` argument).
+        '''
+        names = set()
+        for varname, var in self.variables.iteritems():
+            if isinstance(var, Function):
+                implementation = var.implementations[self.codeobj_class]
+                if isinstance(implementation.get_code(self.owner), np.ufunc):
+                    names.add(implementation.name or varname)
+            elif isinstance(var, np.ufunc):
+                names.add(varname)
+        return names
+
+    def translate_inplace_expression(self, expr, vector_dtypes, ufunc_names,
+                                     shape_array, lines, buffer_prefix='_buf'):
+        '''
+        Translate an expression into a sequence of ufunc calls storing their
+        results in scratch buffers (see `NumpyCodeObject.scratch_buffer`).
+
+        Parameters
+        ----------
+        expr : str
+            The expression to translate.
+        vector_dtypes : dict
+            The dtypes of all vector variables.
+        ufunc_names : set of str
+            The names of the functions implemented as ufuncs.
+        shape_array : str
+            The name of an array with the shape of the vector values.
+        lines : list of str
+            The list to which the ufunc calls will be appended.
+        buffer_prefix : str, optional
+            The prefix for the names of the buffers. Buffers are reused
+            whenever the code is run, each expression should therefore use
+            its own prefix. Defaults to ``'_buf'``.
+
+        Returns
+        -------
+        value : str
+            The code for the value of the expression, either the name of a
+            buffer or an expression (possibly referring to buffers).
+        '''
+        counter = itertools.count(1)
+        renderer = NumpyNodeRenderer()
+
+        def ufunc_call(func, args, dtypes):
+            dtype = np.dtype(reduce(np.promote_types, dtypes))
+            if dtype.kind != 'f':
+                return None
+            name = '%s_%d' % (buffer_prefix, next(counter))
+            lines.append("%s = %s(%s, out=_scratch_buffer('%s_%s', %s, '%s'))" %
+                         (name, func,
+                          ', '.join(renderer.render_node(arg) for arg in args),
+                          name, dtype.name, shape_array, dtype.name))
+            return ast.Name(id=name, ctx=ast.Load()), 'vector', dtype
+
+        def translate_node(node):
+            # Returns the new node, its kind ('scalar', 'vector' or 'other'
+            # for unknown values) and its dtype (for vectors)
+            if isinstance(node, ast.Name):
+                if node.id in vector_dtypes:
+                    return node, 'vector', vector_dtypes[node.id]
+                else:
+                    return node, 'scalar', None
+            elif isinstance(node, ast.Num):
+                return node, 'scalar', None
+            elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.UAdd):
+                return translate_node(node.operand)
+
+            if isinstance(node, ast.BinOp) and node.op.__class__.__name__ in BINARY_UFUNCS:
+                func = '_numpy.' + BINARY_UFUNCS[node.op.__class__.__name__]
+                fields = ['left', 'right']
+            elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+                func = '_numpy.negative'
+                fields = ['operand']
+            elif (isinstance(node, ast.Call) and
+                      isinstance(node.func, ast.Name) and
+                      node.func.id in ufunc_names and len(node.args) > 0 and
+                      not len(node.keywords) and
+                      getattr(node, 'starargs', None) is None and
+                      getattr(node, 'kwargs', None) is None):
+                func = node.func.id
+                fields = None
+            else:
+                # Anything else is evaluated as before, but its arguments
+                # might still use in-place operations
+                for field, value in ast.iter_fields(node):
+                    if isinstance(value, ast.expr):
+                        setattr(node, field, translate_node(value)[0])
+                    elif isinstance(value, list):
+                        setattr(node, field,
+                                [translate_node(v)[0]
+                                 if isinstance(v, ast.expr) else v
+                                 for v in value])
+                return node, 'other', None
+
+            if fields is None:
+                results = [translate_node(arg) for arg in node.args]
+                node.args = [result[0] for result in results]
+                args = node.args
+            else:
+                results = [translate_node(getattr(node, field))
+                           for field in fields]
+                for field, result in zip(fields, results):
+                    setattr(node, field, result[0])
+                args = [result[0] for result in results]
+            kinds = [result[1] for result in results]
+            if 'other' in kinds:
+                return node, 'other', None
+            elif 'vector' not in kinds:
+                return node, 'scalar', None
+            new_node = ufunc_call(func, args,
+                                  [result[2] for result in results
+                                   if result[1] == 'vector'])
+            if new_node is None:
+                return node, 'other', None
+            return new_node
+
+        expr = self.substitute_function_names(expr)
+        node = ast.parse(expr.strip(), mode='eval').body
+        node = translate_node(node)[0]
+        return renderer.render_node(node)
+
+    def translate_inplace_statement_sequence(self, statements):
+        '''
+        Translate a sequence of vector statements using in-place operations
+        (see `translate_inplace_expression`). Returns ``None`` if the
+        statements cannot be translated in this way, i.e. if they do not
+        operate on all elements of the arrays.
+        '''
+        variables = self.variables
+        read, write, indices, conditional_write_vars = self.arrays_helper(statements)
+        if len(indices):
+            return None
+        vector_dtypes = {}
+        for varname in read | write:
+            var = variables[varname]
+            if var.scalar:
+                continue
+            if not self.variable_indices[varname] in self.iterate_all:
+                return None
+            vector_dtypes[varname] = var.dtype
+        if not len(vector_dtypes):
+            return None
+        shape_array = self.get_array_name(variables[sorted(vector_dtypes)[0]])
+        for stmt in statements:
+            if stmt.op == ':=':
+                vector_dtypes[stmt.var] = stmt.dtype
+        ufunc_names = self.ufunc_names()
+
+        lines = []
+        # read arrays, use a copy of the arrays that are written to
+        for varname in read | write:
+            var = variables[varname]
+            array_name = self.get_array_name(var)
+            if var.scalar:
+                lines.append('%s = %s[%s]' % (varname, array_name,
+                                              self.variable_indices[varname]))
+            elif varname in write:
+                lines.append("%s = _scratch_buffer('_read_%s', %s)" % (varname,
+                                                                     varname,
+                                                                     array_name))
+                lines.append('%s[:] = %s' % (varname, array_name))
+            else:
+                lines.append('%s = %s' % (varname, array_name))
+        # the actual code, every statement uses its own buffers since variables
+        # might refer to them until the end of the code
+        for stmt_idx, stmt in enumerate(statements):
+            var, op, comment = stmt.var, stmt.op, stmt.comment
+            if op == ':=':
+                op = '='
+            condition = conditional_write_vars.get(var, None)
+            value = self.translate_inplace_expression(stmt.expr, vector_dtypes,
+                                                      ufunc_names, shape_array,
+                                                      lines,
+                                                      buffer_prefix='_buf_%d' % stmt_idx)
+            if condition is None:
+                line = '%s %s %s' % (var, op, value)
+            elif op == '=':
+                line = ("_numpy.copyto(%s, %s, where=%s, casting='unsafe')" %
+                        (var, value, condition))
+            elif op in INPLACE_UFUNCS:
+                line = ("_numpy.%s(%s, %s, out=%s, where=%s, casting='unsafe')" %
+                        (INPLACE_UFUNCS[op], var, value, var, condition))
+            else:
+                line = ("_numpy.copyto(%s, %s %s (%s), where=%s, casting='unsafe')" %
+                        (var, var, op[:-1], value, condition))
+            if len(comment):
+                line += ' # ' + comment
+            lines.append(line)
+        # write arrays
+        for varname in write:
+            lines.append('%s[:] = %s' % (self.get_array_name(variables[varname]),
+                                         varname))
+        return lines
+
+    def replace_function_variables(self):
+        # Make sure we do not use the __call__ function of Function objects but
+        # rather the Python function stored internally. The __call__ function
+        # would otherwise return values with units
+        for varname, var in self.variables.iteritems():
+            if isinstance(var, Function):
+                self.variables[varname] = var.implementations[self.codeobj_class].get_code(self.owner)
+
     def translate_one_statement_sequence(self, statements):
+        if (self.inplace_operations and len(statements) and
+                not statements[0].scalar):
+            lines = self.translate_inplace_statement_sequence(statements)
+            if lines is not None:
+                self.replace_function_variables()
+                return lines
         variables = self.variables
         variable_indices = self.variable_indices
         read, write, indices, conditional_write_vars = self.arrays_helper(statements)
@@ -122,12 +374,7 @@ class NumpyCodeGenerator(CodeGenerator):
 #                else:
 #                    lines.extend(line.split('\n'))
 
-        # Make sure we do not use the __call__ function of Function objects but
-        # rather the Python function stored internally. The __call__ function
-        # would otherwise return values with units
-        for varname, var in variables.iteritems():
-            if isinstance(var, Function):
-                variables[varname] = var.implementations[self.codeobj_class].get_code(self.owner)
+        self.replace_function_variables()
 
         return lines
 
@@ -157,6 +404,9 @@ for func_name, func in [('sin', np.sin), ('cos', np.cos), ('tan', np.tan),
 
 # Functions that are implemented in a somewhat special way
 def randn_func(vectorisation_idx):
+    if np.ndim(vectorisation_idx) > 1:
+        # e.g. the 2D arrays used in the synapse creation
+        return np.random.randn(*np.shape(vectorisation_idx))
     try:
         N = int(vectorisation_idx)
     except (TypeError, ValueError):
@@ -165,6 +415,9 @@ def randn_func(vectorisation_idx):
     return np.random.randn(N)
 
 def rand_func(vectorisation_idx):
+    if np.ndim(vectorisation_idx) > 1:
+        # e.g. the 2D arrays used in the synapse creation
+        return np.random.rand(*np.shape(vectorisation_idx))
     try:
         N = int(vectorisation_idx)
     except (TypeError, ValueError):
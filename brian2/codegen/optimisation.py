@@ -0,0 +1,302 @@
+'''
+Optimisations of abstract code statements, applied before they are translated
+into the target language.
+
+Two optimisations are performed on the vector statements (the statements that
+are executed for every element, e.g. every neuron):
+
+* Loop-invariant code motion: expressions that only refer to scalar values
+  (e.g. ``exp(-dt/tau)``) are calculated once in the scalar part of the code.
+* Common subexpression elimination: expressions that appear several times in
+  the statements (and refer to the same values) are calculated only once.
+
+Only expressions with a floating point result that consist of arithmetic
+operations and calls to side-effect free mathematical functions are
+considered, the evaluation of the code is therefore not changed (apart from
+changes in the rounding of floating point values).
+'''
+import ast
+import itertools
+
+import numpy as np
+
+from brian2.core.functions import DEFAULT_FUNCTIONS, Function
+from brian2.parsing.rendering import NodeRenderer
+
+from .statements import Statement
+
+__all__ = ['optimise_statements']
+
+#: Functions that return a floating point value and do not have side effects
+FLOAT_FUNCTIONS = set(['exp', 'log', 'log10', 'sqrt', 'sin', 'cos', 'tan',
+                       'sinh', 'cosh', 'tanh', 'arcsin', 'arccos', 'arctan'])
+
+# Operators that return a float if one of their operands is a float
+ARITHMETIC_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow)
+
+
+def _value_type(dtype):
+    '''
+    Return ``'float'`` or ``'int'`` for a numerical dtype, ``None`` otherwise.
+    '''
+    try:
+        kind = np.dtype(dtype).kind
+    except TypeError:
+        return None
+    if kind == 'f':
+        return 'float'
+    elif kind in 'iu':
+        return 'int'
+    else:
+        return None
+
+
+def _annotate(node, types, variables):
+    '''
+    Annotate all nodes of an expression tree with the names they refer to
+    (``brian_names``) and the type of their value (``brian_type``, either
+    ``'float'``, ``'int'`` or ``None`` for non-numerical or unknown values).
+    '''
+    if isinstance(node, ast.Name):
+        node.brian_names = set([node.id])
+        node.brian_type = types.get(node.id, None)
+        return
+    elif isinstance(node, ast.Num):
+        node.brian_names = set()
+        if isinstance(node.n, float):
+            node.brian_type = 'float'
+        elif isinstance(node.n, (int, long)):
+            node.brian_type = 'int'
+        else:
+            node.brian_type = None
+        return
+    elif isinstance(node, ast.BinOp) and isinstance(node.op,
+                                                    ARITHMETIC_OPERATORS):
+        children = [node.left, node.right]
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub,
+                                                                ast.UAdd)):
+        children = [node.operand]
+    elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and
+          node.func.id in FLOAT_FUNCTIONS and
+          variables.get(node.func.id, DEFAULT_FUNCTIONS[node.func.id]) is
+                  DEFAULT_FUNCTIONS[node.func.id] and
+          len(node.args) > 0 and not len(node.keywords) and
+          getattr(node, 'starargs', None) is None and
+          getattr(node, 'kwargs', None) is None):
+        for arg in node.args:
+            _annotate(arg, types, variables)
+        node.brian_names = set.union(*[arg.brian_names for arg in node.args])
+        if all(arg.brian_type is not None for arg in node.args):
+            node.brian_type = 'float'
+        else:
+            node.brian_type = None
+        return
+    else:
+        # Anything else (comparisons, boolean operators, other functions, ...)
+        # is not optimised, but its arguments might be
+        node.brian_names = set()
+        for child in ast.iter_child_nodes(node):
+            _annotate(child, types, variables)
+            node.brian_names |= getattr(child, 'brian_names', set())
+        node.brian_type = None
+        return
+
+    for child in children:
+        _annotate(child, types, variables)
+    node.brian_names = set.union(*[child.brian_names for child in children])
+    child_types = [child.brian_type for child in children]
+    if None in child_types:
+        node.brian_type = None
+    elif 'float' in child_types:
+        node.brian_type = 'float'
+    else:
+        node.brian_type = 'int'
+
+
+def _is_trivial(node):
+    if isinstance(node, (ast.Name, ast.Num)):
+        return True
+    elif isinstance(node, ast.UnaryOp):
+        return _is_trivial(node.operand)
+    else:
+        return False
+
+
+def _is_candidate(node):
+    '''
+    Whether the value of this node can be stored in a new variable.
+    '''
+    return (getattr(node, 'brian_type', None) == 'float' and
+            len(node.brian_names) > 0 and not _is_trivial(node))
+
+
+def _render(node):
+    return NodeRenderer().render_node(node)
+
+
+class _Replacer(ast.NodeTransformer):
+    '''
+    Replace all (maximal) subexpressions for which ``get_name`` returns a name
+    by this name.
+    '''
+    def __init__(self, get_name):
+        self.get_name = get_name
+        self.replaced = False
+
+    def visit(self, node):
+        if _is_candidate(node):
+            name = self.get_name(node)
+            if name is not None:
+                self.replaced = True
+                return ast.copy_location(ast.Name(id=name, ctx=ast.Load()),
+                                         node)
+        return self.generic_visit(node)
+
+
+def _candidates(node):
+    '''
+    Yield all candidate subexpressions of an expression tree.
+    '''
+    if _is_candidate(node):
+        yield node
+    for child in ast.iter_child_nodes(node):
+        for candidate in _candidates(child):
+            yield candidate
+
+
+def optimise_statements(statements, variables, dtype, hoist_scalars=True,
+                        counter=None):
+    '''
+    Optimise a list of statements by moving loop-invariant expressions into
+    the scalar statements and by eliminating common subexpressions in the
+    vector statements.
+
+    Parameters
+    ----------
+    statements : list of `Statement`
+        The statements (as returned by `make_statements`).
+    variables : dict-like
+        The `Variable` objects for the names used in the statements.
+    dtype : `dtype`
+        The floating point dtype used for the new variables.
+    hoist_scalars : bool, optional
+        Whether to move scalar expressions into new scalar statements. This
+        should only be done if the template executes the scalar code. Defaults
+        to ``True``.
+    counter : iterator, optional
+        An iterator over integers used to generate unique names for the new
+        variables. Has to be given when several blocks of statements end up in
+        the same code. Defaults to ``itertools.count(1)``.
+
+    Returns
+    -------
+    statements : list of `Statement`
+        The new list of statements. The scalar statements still come before
+        the vector statements.
+    '''
+    if counter is None:
+        counter = itertools.count(1)
+
+    def new_name(prefix):
+        while True:
+            name = '%s_%d' % (prefix, next(counter))
+            if name not in variables:
+                return name
+
+    scalar_statements = [stmt for stmt in statements if stmt.scalar]
+    vector_statements = [stmt for stmt in statements if not stmt.scalar]
+
+    # The types of all known names
+    types = {}
+    scalars = set()
+    for name, var in variables.iteritems():
+        if isinstance(var, Function):
+            continue
+        types[name] = _value_type(getattr(var, 'dtype', None))
+        if getattr(var, 'scalar', False):
+            scalars.add(name)
+    for stmt in scalar_statements:
+        types[stmt.var] = _value_type(stmt.dtype)
+        scalars.add(stmt.var)
+    for stmt in vector_statements:
+        if stmt.op == ':=':
+            types[stmt.var] = _value_type(stmt.dtype)
+            scalars.discard(stmt.var)
+
+    trees = []
+    for stmt in vector_statements:
+        tree = ast.parse(stmt.expr.strip(), mode='eval').body
+        _annotate(tree, types, variables)
+        trees.append(tree)
+    changed = [False] * len(vector_statements)
+
+    # Loop-invariant code motion
+    new_scalar_statements = []
+    if hoist_scalars:
+        hoisted = {}
+        def get_hoisted_name(node):
+            if not node.brian_names.issubset(scalars):
+                return None
+            expr = _render(node)
+            if expr not in hoisted:
+                name = new_name('_lio')
+                hoisted[expr] = name
+                new_scalar_statements.append(Statement(name, ':=', expr, '',
+                                                       dtype=dtype,
+                                                       constant=True,
+                                                       scalar=True))
+            return hoisted[expr]
+        for idx, tree in enumerate(trees):
+            replacer = _Replacer(get_hoisted_name)
+            trees[idx] = replacer.visit(tree)
+            if replacer.replaced:
+                changed[idx] = True
+                for stmt in new_scalar_statements:
+                    types[stmt.var] = 'float'
+                    scalars.add(stmt.var)
+                _annotate(trees[idx], types, variables)
+
+    # Common subexpression elimination. To take into account that variables
+    # can change their value from one statement to the next, subexpressions
+    # are identified by their code and the "version" of each variable used in
+    # them (i.e. the number of assignments to the variable so far).
+    def version_key(node, versions):
+        return (_render(node),
+                tuple(sorted((name, versions.get(name, 0))
+                             for name in node.brian_names)))
+
+    counts = {}
+    versions = {}
+    for stmt, tree in zip(vector_statements, trees):
+        for candidate in _candidates(tree):
+            key = version_key(candidate, versions)
+            counts[key] = counts.get(key, 0) + 1
+        versions[stmt.var] = versions.get(stmt.var, 0) + 1
+
+    new_vector_statements = []
+    cse_names = {}
+    versions = {}
+    for idx, (stmt, tree) in enumerate(zip(vector_statements, trees)):
+        def get_cse_name(node):
+            key = version_key(node, versions)
+            if counts[key] < 2:
+                return None
+            if key not in cse_names:
+                name = new_name('_cse')
+                cse_names[key] = name
+                new_vector_statements.append(Statement(name, ':=', key[0], '',
+                                                       dtype=dtype,
+                                                       constant=True,
+                                                       scalar=False))
+            return cse_names[key]
+        replacer = _Replacer(get_cse_name)
+        tree = replacer.visit(tree)
+        if changed[idx] or replacer.replaced:
+            stmt = Statement(stmt.var, stmt.op, _render(tree), stmt.comment,
+                             dtype=stmt.dtype, constant=stmt.constant,
+                             subexpression=stmt.subexpression,
+                             scalar=stmt.scalar)
+        new_vector_statements.append(stmt)
+        versions[stmt.var] = versions.get(stmt.var, 0) + 1
+
+    return scalar_statements + new_scalar_statements + new_vector_statements
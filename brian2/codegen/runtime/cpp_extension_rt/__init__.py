@@ -0,0 +1,8 @@
+'''
+Runtime C++ code generation, compiling the code into Python extension modules.
+
+Preferences
+--------------------
+.. document_brian_prefs:: codegen.runtime.cpp_extension
+'''
+from .cpp_extension_rt import *
@@ -0,0 +1,211 @@
+// A minimal replacement for the parts of weave's "py::" C++ interface to
+// Python objects that are used in the weave templates.
+#ifndef _BRIAN_PY_COMPAT_H
+#define _BRIAN_PY_COMPAT_H
+
+#include <Python.h>
+#include <numpy/arrayobject.h>
+
+namespace py {
+
+// Thrown after a Python exception has been set
+class error {};
+
+class object
+{
+protected:
+    PyObject *_obj;
+public:
+    struct steal_reference {};
+
+    object() : _obj(Py_None) { Py_INCREF(_obj); }
+    // Uses a borrowed reference
+    object(PyObject *obj) : _obj(obj)
+    {
+        if (_obj == NULL)
+            throw error();
+        Py_INCREF(_obj);
+    }
+    // Uses a new reference
+    object(PyObject *obj, steal_reference) : _obj(obj)
+    {
+        if (_obj == NULL)
+            throw error();
+    }
+    object(const object &other) : _obj(other._obj) { Py_INCREF(_obj); }
+    object(int value) : _obj(PyLong_FromLong(value))
+    {
+        if (_obj == NULL)
+            throw error();
+    }
+    object(long value) : _obj(PyLong_FromLong(value))
+    {
+        if (_obj == NULL)
+            throw error();
+    }
+    object(double value) : _obj(PyFloat_FromDouble(value))
+    {
+        if (_obj == NULL)
+            throw error();
+    }
+    ~object() { Py_XDECREF(_obj); }
+
+    object& operator=(const object &other)
+    {
+        Py_INCREF(other._obj);
+        Py_XDECREF(_obj);
+        _obj = other._obj;
+        return *this;
+    }
+    // Takes over a new reference (as returned by the Python/numpy C API), as
+    // in "return_val = PyArray_SimpleNewFromData(...)"
+    object& operator=(PyObject *obj)
+    {
+        if (obj == NULL)
+            throw error();
+        Py_XDECREF(_obj);
+        _obj = obj;
+        return *this;
+    }
+
+    operator PyObject*() const { return _obj; }
+    operator int() const { return (int)(long)*this; }
+    operator long() const
+    {
+        const long value = PyLong_AsLong(_obj);
+        if (value == -1 && PyErr_Occurred())
+            throw error();
+        return value;
+    }
+    operator double() const
+    {
+        const double value = PyFloat_AsDouble(_obj);
+        if (value == -1.0 && PyErr_Occurred())
+            throw error();
+        return value;
+    }
+
+    // Return a new reference to the object
+    PyObject *new_reference() const
+    {
+        Py_INCREF(_obj);
+        return _obj;
+    }
+
+    object attr(const char *name) const
+    {
+        return object(PyObject_GetAttrString(_obj, name), steal_reference());
+    }
+    object operator[](int index) const
+    {
+        return object(PySequence_GetItem(_obj, index), steal_reference());
+    }
+    int size() const
+    {
+        const Py_ssize_t size = PyObject_Length(_obj);
+        if (size < 0)
+            throw error();
+        return (int)size;
+    }
+    object call(const object &args) const
+    {
+        return object(PyObject_Call(_obj, args, NULL), steal_reference());
+    }
+    object mcall(const char *name, const object &args) const
+    {
+        return attr(name).call(args);
+    }
+};
+
+class tuple : public object
+{
+public:
+    class item
+    {
+        PyObject *_tuple;
+        const int _index;
+    public:
+        item(PyObject *tuple, int index) : _tuple(tuple), _index(index) {}
+        item& operator=(const object &value)
+        {
+            // PyTuple_SetItem steals the reference
+            if (PyTuple_SetItem(_tuple, _index, value.new_reference()) < 0)
+                throw error();
+            return *this;
+        }
+    };
+
+    tuple(int size) : object(PyTuple_New(size), steal_reference()) {}
+    item operator[](int index) { return item(_obj, index); }
+};
+
+} // namespace py
+
+// Functions to get the values from the namespace, raising a TypeError if the
+// type of a value does not match the type for which the code was compiled
+
+static PyObject *_brian_get(PyObject *namespace_, const char *name)
+{
+    PyObject *obj = PyDict_GetItemString(namespace_, name);
+    if (obj == NULL)
+    {
+        PyErr_Format(PyExc_NameError, "name '%s' is not defined", name);
+        throw py::error();
+    }
+    return obj;
+}
+
+template<class T>
+static T *_brian_get_array(PyObject *namespace_, const char *name, int typenum)
+{
+    PyObject *obj = _brian_get(namespace_, name);
+    if (!PyArray_Check(obj) ||
+        !PyArray_EquivTypenums(PyArray_TYPE((PyArrayObject *)obj), typenum) ||
+        !PyArray_IS_C_CONTIGUOUS((PyArrayObject *)obj))
+    {
+        PyErr_Format(PyExc_TypeError,
+                     "'%s' has to be a contiguous array with type number %d",
+                     name, typenum);
+        throw py::error();
+    }
+    return (T *)PyArray_DATA((PyArrayObject *)obj);
+}
+
+static long _brian_get_long(PyObject *namespace_, const char *name)
+{
+    PyObject *obj = _brian_get(namespace_, name);
+    if (PyFloat_Check(obj) || PyArray_Check(obj))
+    {
+        PyErr_Format(PyExc_TypeError, "'%s' has to be an integer", name);
+        throw py::error();
+    }
+    const long value = PyLong_AsLong(obj);
+    if (value == -1 && PyErr_Occurred())
+        throw py::error();
+    return value;
+}
+
+static double _brian_get_double(PyObject *namespace_, const char *name)
+{
+    PyObject *obj = _brian_get(namespace_, name);
+    if (PyArray_Check(obj))
+    {
+        PyErr_Format(PyExc_TypeError, "'%s' has to be a number", name);
+        throw py::error();
+    }
+    const double value = PyFloat_AsDouble(obj);
+    if (value == -1.0 && PyErr_Occurred())
+        throw py::error();
+    return value;
+}
+
+static bool _brian_get_bool(PyObject *namespace_, const char *name)
+{
+    PyObject *obj = _brian_get(namespace_, name);
+    const int value = PyObject_IsTrue(obj);
+    if (value < 0)
+        throw py::error();
+    return value != 0;
+}
+
+#endif
@@ -0,0 +1,345 @@
+'''
+Module providing `CPPExtensionCodeObject`.
+'''
+import os
+import sys
+import shutil
+import hashlib
+import tempfile
+
+import numpy
+from distutils.ccompiler import new_compiler
+from distutils.sysconfig import (customize_compiler, get_python_inc,
+                                 get_config_var)
+
+from brian2.core.preferences import brian_prefs, BrianPreference
+from brian2.utils.logger import get_logger
+from brian2.utils.stringtools import get_identifiers
+
+from ...templates import Templater
+from ...generators.cpp_generator import CPPCodeGenerator, c_data_type
+from ...targets import codegen_targets
+from ..weave_rt import WeaveCodeObject
+
+__all__ = ['CPPExtensionCodeObject']
+
+logger = get_logger(__name__)
+
+# Preferences
+brian_prefs.register_preferences(
+    'codegen.runtime.cpp_extension',
+    'C++ extension runtime codegen preferences',
+    directory = BrianPreference(
+        default=os.path.join('~', '.brian', 'extensions'),
+        docs='''
+        The directory where the compiled extension modules are stored. Modules
+        are identified by a hash of their source code, i.e. a module is only
+        compiled once, even across processes.
+        '''
+        ),
+    extra_compile_args = BrianPreference(
+        default=['-w', '-O3'],
+        docs='''
+        Extra compile arguments to pass to the compiler.
+        '''
+        ),
+    include_dirs = BrianPreference(
+        default=[],
+        docs='''
+        Additional include directories.
+        '''
+        ),
+    )
+
+_compat_header = None
+
+
+def _get_compat_header():
+    global _compat_header
+    if _compat_header is None:
+        filename = os.path.join(os.path.dirname(__file__), 'brianlib',
+                                'py_compat.h')
+        with open(filename) as f:
+            _compat_header = f.read()
+    return _compat_header
+
+
+def extension_data_type(dtype):
+    '''
+    Gives the C type for a numpy data type, using the numpy type names for
+    the types not handled by `c_data_type`.
+    '''
+    try:
+        return c_data_type(dtype)
+    except ValueError:
+        return 'npy_' + numpy.dtype(dtype).name
+
+
+def _value_declaration(name, value):
+    '''
+    Return the C++ code declaring a local variable for a value from the
+    namespace.
+    '''
+    if isinstance(value, numpy.ndarray):
+        c_type = extension_data_type(value.dtype)
+        return '%s * %s = _brian_get_array<%s>(_namespace, "%s", %d);' % (c_type, name, c_type, name,
+                                                                          value.dtype.num)
+    elif isinstance(value, (bool, numpy.bool_)):
+        return 'bool %s = _brian_get_bool(_namespace, "%s");' % (name, name)
+    elif isinstance(value, (int, long, numpy.integer)):
+        return 'long %s = _brian_get_long(_namespace, "%s");' % (name, name)
+    elif isinstance(value, (float, numpy.floating)):
+        return 'double %s = _brian_get_double(_namespace, "%s");' % (name, name)
+    else:
+        return 'py::object %s(_brian_get(_namespace, "%s"));' % (name, name)
+
+
+def _value_signature(value):
+    if isinstance(value, numpy.ndarray):
+        return ('array', value.dtype.str)
+    elif isinstance(value, (bool, numpy.bool_)):
+        return 'bool'
+    elif isinstance(value, (int, long, numpy.integer)):
+        return 'long'
+    elif isinstance(value, (float, numpy.floating)):
+        return 'double'
+    else:
+        return 'object'
+
+
+# The source code of the extension modules, __MODULE_NAME__ is replaced by the
+# name of the module (see `compile_extension`)
+module_template = '''
+%(header)s
+
+#include <cmath>
+#include <cstdlib>
+#include <cstring>
+#include <ctime>
+#include <algorithm>
+
+%(support_code)s
+
+static PyObject *_brian_main(PyObject *_self, PyObject *_args)
+{
+    PyObject *_namespace;
+    if (!PyArg_ParseTuple(_args, "O!", &PyDict_Type, &_namespace))
+        return NULL;
+    try
+    {
+        py::object return_val;
+        %(declarations)s
+        %(main_code)s
+        return return_val.new_reference();
+    }
+    catch (const py::error&)
+    {
+        return NULL;
+    }
+    catch (...)
+    {
+        // Exceptions thrown by the templates after a Python error occurred
+        if (!PyErr_Occurred())
+            PyErr_SetString(PyExc_RuntimeError, "Unknown C++ exception");
+        return NULL;
+    }
+}
+
+static PyMethodDef _brian_methods[] = {
+    {"main", _brian_main, METH_VARARGS, NULL},
+    {NULL, NULL, 0, NULL}
+};
+
+#if PY_MAJOR_VERSION >= 3
+static struct PyModuleDef _brian_module = {
+    PyModuleDef_HEAD_INIT, "__MODULE_NAME__", NULL, -1, _brian_methods
+};
+
+PyMODINIT_FUNC PyInit___MODULE_NAME__(void)
+{
+    import_array();
+    return PyModule_Create(&_brian_module);
+}
+#else
+PyMODINIT_FUNC init__MODULE_NAME__(void)
+{
+    import_array();
+    Py_InitModule("__MODULE_NAME__", _brian_methods);
+}
+#endif
+'''
+
+# The functions of all extension modules loaded in this process
+_loaded_functions = {}
+
+
+def _load_module(module_name, filename):
+    try:
+        from importlib.util import spec_from_file_location, module_from_spec
+    except ImportError:
+        # Python 2
+        import imp
+        return imp.load_dynamic(module_name, filename)
+    spec = spec_from_file_location(module_name, filename)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _build_module(module_name, source, filename, include_dirs,
+                  extra_compile_args):
+    build_dir = tempfile.mkdtemp(prefix='brian_extension_')
+    try:
+        source_file = os.path.join(build_dir, module_name + '.cpp')
+        with open(source_file, 'w') as f:
+            f.write(source)
+        compiler = new_compiler()
+        customize_compiler(compiler)
+        objects = compiler.compile([source_file], output_dir=build_dir,
+                                   include_dirs=[get_python_inc(),
+                                                 numpy.get_include()] + include_dirs,
+                                   extra_postargs=extra_compile_args)
+        module_file = os.path.join(build_dir, os.path.basename(filename))
+        compiler.link_shared_object(objects, module_file, target_lang='c++')
+        # Move the module into the cache directory with a (usually atomic)
+        # rename, so that other processes never see an incomplete file
+        tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+        shutil.move(module_file, tmp_filename)
+        try:
+            os.rename(tmp_filename, filename)
+        except OSError:
+            # On Windows, renaming fails if the target exists
+            os.remove(tmp_filename)
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+
+def compile_extension(source, include_dirs=(), extra_compile_args=()):
+    '''
+    Compile C++ code into an extension module and return its ``main``
+    function. Modules are stored in the directory given by the
+    ``codegen.runtime.cpp_extension.directory`` preference and are reused if a
+    module for the same code exists.
+
+    Parameters
+    ----------
+    source : str
+        The source code of the module, using ``__MODULE_NAME__`` as a
+        placeholder for the name of the module.
+    include_dirs : sequence of str, optional
+        Additional include directories.
+    extra_compile_args : sequence of str, optional
+        Additional arguments for the compiler.
+
+    Returns
+    -------
+    main : function
+        The ``main`` function of the module.
+    '''
+    include_dirs = list(include_dirs)
+    extra_compile_args = list(extra_compile_args)
+    source_hash = hashlib.sha1(source)
+    source_hash.update(repr((include_dirs, extra_compile_args, sys.version,
+                             numpy.__version__)))
+    module_name = '_brian_extension_' + source_hash.hexdigest()
+    if module_name in _loaded_functions:
+        return _loaded_functions[module_name]
+    directory = os.path.expanduser(brian_prefs['codegen.runtime.cpp_extension.directory'])
+    if not os.path.exists(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # Another process might have created it in the meantime
+            if not os.path.isdir(directory):
+                raise
+    ext_suffix = get_config_var('EXT_SUFFIX') or get_config_var('SO')
+    filename = os.path.join(directory, module_name + ext_suffix)
+    if not os.path.exists(filename):
+        logger.debug('Compiling extension module %s' % module_name)
+        _build_module(module_name, source.replace('__MODULE_NAME__', module_name),
+                      filename, include_dirs, extra_compile_args)
+    module = _load_module(module_name, filename)
+    _loaded_functions[module_name] = module.main
+    return module.main
+
+
+class CPPExtensionCodeGenerator(CPPCodeGenerator):
+    def __init__(self, *args, **kwds):
+        super(CPPExtensionCodeGenerator, self).__init__(*args, **kwds)
+        self.c_data_type = extension_data_type
+
+
+class CPPExtensionCodeObject(WeaveCodeObject):
+    '''
+    C++ code object compiled into a Python extension module
+
+    Uses the weave templates (and the same function implementations) but
+    does not depend on weave: the code is compiled into an extension module
+    that reads all values from the namespace. The compiled modules are stored
+    on disk, see `compile_extension`.
+    '''
+    templater = Templater('brian2.codegen.runtime.weave_rt',
+                          env_globals={'c_data_type': extension_data_type,
+                                       'dtype': numpy.dtype})
+    generator_class = CPPExtensionCodeGenerator
+    class_name = 'cpp_extension'
+
+    def __init__(self, owner, code, variables,
+                 name='cpp_extension_code_object*'):
+        super(CPPExtensionCodeObject, self).__init__(owner, code, variables,
+                                                     name=name)
+        self.include_dirs = list(brian_prefs['codegen.runtime.cpp_extension.include_dirs'])
+        self.extra_compile_args = brian_prefs['codegen.runtime.cpp_extension.extra_compile_args']
+        #: The types of the values the compiled function was generated for
+        self.compiled_signature = None
+
+    def module_source(self):
+        '''
+        Return the source code of the extension module for the current values
+        in the namespace (see `compile_extension`).
+        '''
+        support_code = self.code.support_code
+        main_code = self.code.main
+        used_names = get_identifiers(support_code) | get_identifiers(main_code)
+        declarations = [_value_declaration(name, self.namespace[name])
+                        for name in sorted(self.namespace)
+                        if name in used_names]
+        return module_template % {'header': _get_compat_header(),
+                                  'support_code': support_code,
+                                  'declarations': '\n        '.join(declarations),
+                                  'main_code': main_code}
+
+    def namespace_signature(self):
+        return tuple((name, _value_signature(value))
+                     for name, value in sorted(self.namespace.iteritems()))
+
+    def run(self):
+        if self.python_pre_func is not None:
+            self.python_pre_func()
+        ret_val = None
+        if not self.code.main.strip():
+            # Templates that only run Python code
+            pass
+        elif self.compiled_func is not None:
+            try:
+                ret_val = self.compiled_func(self.namespace)
+            except TypeError:
+                # The types of the values changed, compile the code again
+                if self.namespace_signature() == self.compiled_signature:
+                    raise
+                self.compiled_func = None
+        if self.compiled_func is None and self.code.main.strip():
+            self.compiled_signature = self.namespace_signature()
+            self.compiled_func = compile_extension(self.module_source(),
+                                                   self.include_dirs,
+                                                   self.extra_compile_args)
+            ret_val = self.compiled_func(self.namespace)
+        if self.python_post_func is not None:
+            self.python_post_func()
+        return ret_val
+
+    @classmethod
+    def multistep_runner(cls, code_objects, clock):
+        return None
+
+codegen_targets.add(CPPExtensionCodeObject)
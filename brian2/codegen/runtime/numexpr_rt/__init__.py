@@ -0,0 +1,4 @@
+'''
+Runtime code generation evaluating vector expressions with numexpr.
+'''
+from .numexpr_rt import *
@@ -0,0 +1,194 @@
+'''
+Module providing `NumexprCodeObject`.
+'''
+import ast
+
+import numpy as np
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+from brian2.core.functions import DEFAULT_FUNCTIONS, Function
+from brian2.core.variables import ArrayVariable
+from brian2.parsing.rendering import NumexprNodeRenderer
+
+from ..numpy_rt import NumpyCodeObject
+from ...templates import Templater
+from ...generators.numpy_generator import NumpyCodeGenerator
+from ...targets import codegen_targets
+
+__all__ = ['NumexprCodeObject', 'NumexprCodeGenerator']
+
+#: Functions of `DEFAULT_FUNCTIONS` that numexpr can evaluate
+NUMEXPR_FUNCTIONS = set(['sin', 'cos', 'tan', 'sinh', 'cosh', 'tanh',
+                         'arcsin', 'arccos', 'arctan', 'exp', 'log', 'log10',
+                         'sqrt', 'abs'])
+
+#: Data types that numexpr can handle
+NUMEXPR_DTYPES = set(np.dtype(dtype) for dtype in [np.bool_, np.int32,
+                                                   np.int64, np.float32,
+                                                   np.float64])
+
+# Syntax elements that numexpr can evaluate (function calls and comparisons
+# are checked separately). Note that the modulo operator is missing, numexpr
+# does not follow Python's sign convention for it.
+NUMEXPR_NODES = (ast.Expression, ast.Name, ast.Num, ast.BinOp, ast.UnaryOp,
+                 ast.BoolOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow,
+                 ast.USub, ast.UAdd, ast.Not, ast.And, ast.Or, ast.Lt, ast.LtE,
+                 ast.Gt, ast.GtE, ast.Eq, ast.NotEq, ast.expr_context)
+if hasattr(ast, 'NameConstant'):
+    # Python 3.4
+    NUMEXPR_NODES += (ast.NameConstant, )
+
+
+class NumexprCodeGenerator(NumpyCodeGenerator):
+    '''
+    Numexpr language
+
+    Generates the same code as `NumpyCodeGenerator`, but evaluates the
+    expressions of vector statements with ``numexpr.evaluate`` (which uses
+    several threads). Statements that numexpr cannot evaluate (e.g. because
+    they call a function that numexpr does not support) use numpy instead.
+    '''
+
+    class_name = 'numexpr'
+
+    def __init__(self, *args, **kwds):
+        super(NumexprCodeGenerator, self).__init__(*args, **kwds)
+        # The in-place mode does not translate single statements
+        self.inplace_operations = False
+        # Names of the variables created in the vector code
+        self.vector_names = set()
+        # Code for statements writing to conditionally written variables
+        self.conditional_lines = {}
+        # Functions that numexpr can evaluate. This has to be determined before
+        # the translation, the scalar code replaces the `Function` objects in
+        # `variables` by their numpy implementations.
+        self.numexpr_functions = set(func_name for func_name in NUMEXPR_FUNCTIONS
+                                     if self.variables.get(func_name, None) is DEFAULT_FUNCTIONS[func_name])
+
+    def is_numexpr_expression(self, expr, additional_names=()):
+        '''
+        Whether an expression can be evaluated with numexpr, i.e. whether it
+        only uses supported operations, functions and data types. Expressions
+        without any operation or that do not refer to a vector value are
+        better evaluated with numpy and also return ``False``.
+
+        Parameters
+        ----------
+        expr : str
+            The expression.
+        additional_names : sequence of str, optional
+            Names of additional variables that will be used in the numexpr
+            expression.
+        '''
+        try:
+            tree = ast.parse(expr.strip(), mode='eval')
+        except SyntaxError:
+            return False
+        names = set(additional_names)
+        function_names = set()
+        has_operation = False
+        # Note that ast.walk visits a function call before its name
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Call):
+                func_name = getattr(node.func, 'id', None)
+                if (func_name not in self.numexpr_functions or
+                        len(node.args) != 1 or len(node.keywords) or
+                        getattr(node, 'starargs', None) is not None or
+                        getattr(node, 'kwargs', None) is not None):
+                    return False
+                function_names.add(node.func)
+                has_operation = True
+            elif isinstance(node, ast.Compare):
+                if len(node.comparators) != 1:
+                    return False
+                has_operation = True
+            elif isinstance(node, NUMEXPR_NODES):
+                if isinstance(node, ast.Name) and node not in function_names:
+                    names.add(node.id)
+                elif isinstance(node, (ast.BinOp, ast.UnaryOp, ast.BoolOp)):
+                    has_operation = True
+            else:
+                return False
+
+        has_vector = False
+        for name in names:
+            if name in self.vector_names:
+                has_vector = True
+                continue
+            var = self.variables.get(name, None)
+            if var is None:
+                # True/False or variables created in the scalar code
+                continue
+            if isinstance(var, Function):
+                return False
+            dtype = getattr(var, 'dtype', None)
+            try:
+                if dtype is None or np.dtype(dtype) not in NUMEXPR_DTYPES:
+                    return False
+            except TypeError:
+                return False
+            if isinstance(var, ArrayVariable) and not var.scalar:
+                has_vector = True
+        return has_operation and has_vector
+
+    def translate_statement(self, statement):
+        var, op, expr, comment = (statement.var, statement.op,
+                                  statement.expr, statement.comment)
+        condition = self.get_conditional_write_vars().get(var, None)
+        if statement.scalar:
+            return super(NumexprCodeGenerator, self).translate_statement(statement)
+        if op == ':=':
+            self.vector_names.add(var)
+        additional_names = [] if condition is None else [var, condition]
+        if not self.is_numexpr_expression(expr, additional_names):
+            return super(NumexprCodeGenerator, self).translate_statement(statement)
+
+        expr = NumexprNodeRenderer().render_expr(expr)
+        if condition is None:
+            if op == ':=':
+                op = '='
+            code = "%s %s _numexpr.evaluate('%s')" % (var, op, expr)
+        else:
+            if op != '=':
+                expr = '%s %s (%s)' % (var, op[:-1], expr)
+            code = ("_numexpr.evaluate('where(%s, %s, %s)', out=%s, "
+                    "casting='unsafe')") % (condition, expr, var, var)
+        if len(comment):
+            code += ' # ' + comment
+        if condition is not None:
+            # The numpy code generator would index all variables with the
+            # condition, use a placeholder until the translation is finished
+            placeholder = '_numexpr_conditional_%d' % len(self.conditional_lines)
+            self.conditional_lines[placeholder] = code
+            code = placeholder
+        return code
+
+    def translate_one_statement_sequence(self, statements):
+        lines = super(NumexprCodeGenerator,
+                      self).translate_one_statement_sequence(statements)
+        return [self.conditional_lines.get(line, line) for line in lines]
+
+
+class NumexprCodeObject(NumpyCodeObject):
+    '''
+    Execute code using numpy, evaluating vector expressions with numexpr
+
+    Uses the numpy templates, but evaluates all expressions of vector
+    statements that numexpr supports with multiple threads.
+    '''
+    templater = Templater('brian2.codegen.runtime.numpy_rt')
+    generator_class = NumexprCodeGenerator
+    class_name = 'numexpr'
+
+    def __init__(self, owner, code, variables, name='numexpr_code_object*'):
+        if numexpr is None:
+            raise ImportError('The numexpr target needs the numexpr package.')
+        super(NumexprCodeObject, self).__init__(owner, code, variables,
+                                                name=name)
+        self.namespace['_numexpr'] = numexpr
+
+codegen_targets.add(NumexprCodeObject)
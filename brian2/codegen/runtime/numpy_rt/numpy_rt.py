@@ -1,6 +1,8 @@
 '''
 Module providing `NumpyCodeObject`.
 '''
+import marshal
+
 import numpy as np
 
 from brian2.core.preferences import brian_prefs, BrianPreference
@@ -26,6 +28,14 @@ brian_prefs.register_preferences(
         Whether to change the namespace of user-specifed functions to remove
         units.
         '''
+        ),
+    synapses_create_block_size = BrianPreference(
+        default=1000000,
+        docs='''
+        The maximum number of pre-/postsynaptic pairs for which the condition
+        is evaluated at once when creating synapses with a string condition.
+        Larger values make the synapse creation faster but use more memory.
+        '''
         )
     )
 
@@ -43,12 +53,39 @@ class NumpyCodeObject(CodeObject):
     def __init__(self, owner, code, variables, name='numpy_code_object*'):
         from brian2.devices.device import get_device
         self.device = get_device()
+        #: Preallocated arrays used by code generated with in-place operations
+        self.scratch_buffers = {}
         self.namespace = {'_owner': owner,
                           # TODO: This should maybe go somewhere else
-                          'logical_not': np.logical_not}
+                          'logical_not': np.logical_not,
+                          '_numpy': np,
+                          '_scratch_buffer': self.scratch_buffer}
         CodeObject.__init__(self, owner, code, variables, name=name)
         self.variables_to_namespace()
 
+    def scratch_buffer(self, name, like, dtype=None):
+        '''
+        Return a preallocated array with the shape of ``like``. The same array
+        is returned for every call with the same ``name``, a new array is only
+        allocated if the shape or the dtype changed.
+
+        Parameters
+        ----------
+        name : str
+            The name of the buffer.
+        like : `ndarray`
+            An array with the required shape.
+        dtype : `dtype`, optional
+            The required dtype, defaults to the dtype of ``like``.
+        '''
+        if dtype is None:
+            dtype = like.dtype
+        buf = self.scratch_buffers.get(name, None)
+        if buf is None or buf.shape != like.shape or buf.dtype != dtype:
+            buf = np.empty(like.shape, dtype=dtype)
+            self.scratch_buffers[name] = buf
+        return buf
+
     def variables_to_namespace(self):
         # Variables can refer to values that are either constant (e.g. dt)
         # or change every timestep (e.g. t). We add the values of the
@@ -103,6 +140,16 @@ class NumpyCodeObject(CodeObject):
         super(NumpyCodeObject, self).compile()
         self.compiled_code = compile(self.code, '(string)', 'exec')
 
+    def get_compiled_data(self):
+        return marshal.dumps(self.compiled_code)
+
+    def load_compiled_data(self, data):
+        if data is None:
+            self.compile()
+        else:
+            super(NumpyCodeObject, self).compile()
+            self.compiled_code = marshal.loads(data)
+
     def run(self):
         exec self.compiled_code in self.namespace
         # output variables should land in the variable name _return_values
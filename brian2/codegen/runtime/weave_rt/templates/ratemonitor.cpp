@@ -4,19 +4,37 @@
     {# USES_VARIABLES { t, rate, _clock_t, _clock_dt, _spikespace, _num_source_neurons } #}
 	const int _num_spikes = {{_spikespace}}[_num_spikespace-1];
 
-    // Calculate the new length for the arrays
-    const npy_int _new_len = (npy_int)({{_dynamic_t}}.attr("shape")[0]) + 1;
-
-    // Resize the arrays
-    PyObject_CallMethod(_owner, "resize", "i", _new_len);
+    // Get the index for the new values, the arrays are enlarged for all
+    // remaining time steps of the run if necessary (see
+    // PopulationRateMonitor.reserve)
+    int _new_idx = -1;
+    {
+        py::object _num_recorded = _owner.attr("_num_recorded");
+        if ((PyObject*)_num_recorded != Py_None)
+            _new_idx = (int)_num_recorded;
+    }
+    const int _curlen = {{_dynamic_t}}.attr("shape")[0];
+    if (_new_idx < 0 || _new_idx >= _curlen)
+    {
+        PyObject *_reserved = PyObject_CallMethod(_owner, "reserve", NULL);
+        if (_reserved == NULL)
+            throw 1;  // propagate the Python exception
+        _new_idx = (int)PyNumber_AsSsize_t(_reserved, NULL);
+        Py_DECREF(_reserved);
+    }
+    {
+        PyObject *_new_num_recorded = PyLong_FromLong(_new_idx + 1);
+        PyObject_SetAttrString(_owner, "_num_recorded", _new_num_recorded);
+        Py_DECREF(_new_num_recorded);
+    }
 
     // Get the potentially newly created underlying data arrays
     double *t_data = (double*)(((PyArrayObject*)(PyObject*){{_dynamic_t}}.attr("data"))->data);
     double *rate_data = (double*)(((PyArrayObject*)(PyObject*){{_dynamic_rate}}.attr("data"))->data);
 
     //Set the new values
-    t_data[_new_len - 1] = _clock_t;
-    rate_data[_new_len - 1] = 1.0 * _num_spikes / (double)_clock_dt / _num_source_neurons;
+    t_data[_new_idx] = _clock_t;
+    rate_data[_new_idx] = 1.0 * _num_spikes / (double)_clock_dt / _num_source_neurons;
 
 {% endmacro %}
 
@@ -32,13 +32,13 @@
             _end_idx =_num_spikes;
         _num_spikes = _end_idx - _start_idx;
         if (_num_spikes > 0) {
-            // Get the current length and new length of t and i arrays
-            const int _curlen = {{_dynamic_t}}.attr("shape")[0];
-            const int _newlen = _curlen + _num_spikes;
             // Resize the arrays
             py::tuple _newlen_tuple(1);
-            _newlen_tuple[0] = _newlen;
+            _newlen_tuple[0] = (int){{_dynamic_t}}.attr("shape")[0] + _num_spikes;
             _owner.mcall("resize", _newlen_tuple);
+            // The monitor might have moved the previous spikes to its storage
+            const int _newlen = {{_dynamic_t}}.attr("shape")[0];
+            const int _curlen = _newlen - _num_spikes;
             // Get the potentially newly created underlying data arrays
             double *_t_data = (double*)(((PyArrayObject*)(PyObject*){{_dynamic_t}}.attr("data"))->data);
             // TODO: How to get the correct datatype automatically here?
@@ -3,27 +3,78 @@
 {% block maincode %}
     {# USES_VARIABLES { t, _clock_t, _indices } #}
 
-    // Get the current length and new length of t and value arrays
-    const int _curlen = {{_dynamic_t}}.attr("shape")[0];
-    const int _new_len = _curlen + 1;
-    // Resize the arrays
-    PyObject_CallMethod(_owner, "resize", "i", _new_len);
+    {% if _every > 1 %}
+    // The position of the current time step in its window of {{_every}} time
+    // steps
+    const int _window_step = {{_window_step}}[0];
+    {{_window_step}}[0] = (_window_step + 1) % {{_every}};
+    {% if _reduction %}
+    if (_window_step == 0)
+        {{_window_t}}[0] = _clock_t;
+    // Values are recorded at the end of each window
+    const bool _record_values = _window_step == {{_every - 1}};
+    {% else %}
+    // Values are recorded for the first time step of each window
+    const bool _record_values = _window_step == 0;
+    {% endif %}
+    {% else %}
+    const bool _record_values = true;
+    {% endif %}
 
-    // Get the potentially newly created underlying data arrays and copy the
-    // data
-    double *_t_data = (double*)(((PyArrayObject*)(PyObject*){{_dynamic_t}}.attr("data"))->data);
-    _t_data[_new_len - 1] = _clock_t;
+    int _new_idx = -1;
+    if (_record_values)
+    {
+        // Get the index for the new values, the arrays are enlarged for all
+        // remaining time steps of the run if necessary (see
+        // StateMonitor.reserve)
+        {
+            py::object _num_recorded = _owner.attr("_num_recorded");
+            if ((PyObject*)_num_recorded != Py_None)
+                _new_idx = (int)_num_recorded;
+        }
+        const int _curlen = {{_dynamic_t}}.attr("shape")[0];
+        if (_new_idx < 0 || _new_idx >= _curlen)
+        {
+            PyObject *_reserved = PyObject_CallMethod(_owner, "reserve", NULL);
+            if (_reserved == NULL)
+                throw 1;  // propagate the Python exception
+            _new_idx = (int)PyNumber_AsSsize_t(_reserved, NULL);
+            Py_DECREF(_reserved);
+        }
+        {
+            PyObject *_new_num_recorded = PyLong_FromLong(_new_idx + 1);
+            PyObject_SetAttrString(_owner, "_num_recorded", _new_num_recorded);
+            Py_DECREF(_new_num_recorded);
+        }
 
+        // Get the potentially newly created underlying data arrays and copy
+        // the data
+        double *_t_data = (double*)(((PyArrayObject*)(PyObject*){{_dynamic_t}}.attr("data"))->data);
+        {% if _reduction %}
+        _t_data[_new_idx] = {{_window_t}}[0];
+        {% else %}
+        _t_data[_new_idx] = _clock_t;
+        {% endif %}
+    }
 
     // scalar code
 	const int _vectorisation_idx = 1;
 	{{scalar_code|autoindent}}
 
     {% for varname, var in _recorded_variables.items() %}
-    {%set c_type = c_data_type(variables[varname].dtype) %}
+    {% set record_type = c_data_type(var.dtype) %}
+    {% if _reduction %}
+    {% set _window_array = get_array_name(_window_variables[varname]) %}
+    {% else %}
+    // Values are only calculated for recorded time steps
+    if (_record_values)
+    {% endif %}
     {
         PyArrayObject *_record_data = (((PyArrayObject*)(PyObject*){{get_array_name(var, access_data=False)}}.attr("data")));
         const npy_intp* _record_strides = _record_data->strides;
+        {% if _population_mean %}
+        double _sum = 0;
+        {% endif %}
         for (int _i = 0; _i < _num_indices; _i++)
         {
             // vector code
@@ -31,8 +82,40 @@
             const int _vectorisation_idx = _idx;
             {{ super() }}
 
-            {{c_type}} *recorded_entry = ({{c_type}}*)(_record_data->data + (_new_len - 1)*_record_strides[0] + _i*_record_strides[1]);
-            *recorded_entry = _to_record_{{varname}};
+            {% if _population_mean %}
+            _sum += _to_record_{{varname}};
+        }
+        {
+            // The mean is stored in the first (and only) column
+            const int _i = 0;
+            const {{record_type}} _value = _sum / _num_indices;
+            {% else %}
+            const {{record_type}} _value = _to_record_{{varname}};
+            {% endif %}
+            {% if _reduction %}
+            if (_window_step == 0)
+                {{_window_array}}[_i] = _value;
+            else
+                {% if _reduction == 'mean' %}
+                {{_window_array}}[_i] += _value;
+                {% elif _reduction == 'min' %}
+                {{_window_array}}[_i] = std::min<{{record_type}}>({{_window_array}}[_i], _value);
+                {% else %}
+                {{_window_array}}[_i] = std::max<{{record_type}}>({{_window_array}}[_i], _value);
+                {% endif %}
+            if (_record_values)
+            {
+                {{record_type}} *recorded_entry = ({{record_type}}*)(_record_data->data + _new_idx*_record_strides[0] + _i*_record_strides[1]);
+                {% if _reduction == 'mean' %}
+                *recorded_entry = {{_window_array}}[_i] / {{_every}};
+                {% else %}
+                *recorded_entry = {{_window_array}}[_i];
+                {% endif %}
+            }
+            {% else %}
+            {{record_type}} *recorded_entry = ({{record_type}}*)(_record_data->data + _new_idx*_record_strides[0] + _i*_record_strides[1]);
+            *recorded_entry = _value;
+            {% endif %}
         }
     }
     {% endfor %}
@@ -2,7 +2,9 @@
 Module providing `WeaveCodeObject`.
 '''
 import os
+import re
 import sys
+import types
 import numpy
 
 try:
@@ -17,6 +19,8 @@ from brian2.core.variables import (DynamicArrayVariable, ArrayVariable,
                                    Subexpression)
 from brian2.core.preferences import brian_prefs, BrianPreference
 from brian2.core.functions import DEFAULT_FUNCTIONS
+from brian2.utils.logger import get_logger
+from brian2.utils.stringtools import word_substitute
 
 from ...codeobject import CodeObject
 from ...templates import Templater
@@ -25,6 +29,8 @@ from ...targets import codegen_targets
 
 __all__ = ['WeaveCodeObject', 'WeaveCodeGenerator']
 
+logger = get_logger(__name__)
+
 # Preferences
 brian_prefs.register_preferences(
     'codegen.runtime.weave',
@@ -49,6 +55,30 @@ brian_prefs.register_preferences(
         appended to the end automatically, where ``$prefix`` is Python's
         site-specific directory prefix as returned by `sys.prefix`.
         '''
+        ),
+    random_generator = BrianPreference(
+        default='native',
+        validator=lambda pref: pref in ['native', 'numpy'],
+        docs='''
+        The random number generator used for ``rand()`` and ``randn()``.
+        ``'native'`` uses a fast generator (xorshift128+) implemented in C++,
+        with a separate state for every code object; the states are seeded
+        from numpy's random number generator, i.e. using `numpy.random.seed`
+        makes simulations reproducible. ``'numpy'`` calls numpy's
+        random number functions, which gives exactly the same random numbers
+        as the numpy target.
+        '''
+        ),
+    steps_per_call = BrianPreference(
+        default=1,
+        docs='''
+        The maximum number of time steps that are run in a single weave call.
+        If this is larger than 1 and all objects of a network only run weave
+        code objects with a single clock and without any Python code (e.g. a
+        `NeuronGroup` without synapses or monitors), the code of all objects
+        is combined into a single function that loops over the time steps
+        internally.
+        '''
         )
     )
 
@@ -161,28 +191,166 @@ class WeaveCodeObject(CodeObject):
             
     def compile(self):
         CodeObject.compile(self)
+        # The Python code is wrapped in functions (using the namespace as
+        # their globals), calling them is cheaper than using exec
+        self.python_pre_func = None
+        self.python_post_func = None
         if hasattr(self.code, 'python_pre'):
             self.compiled_python_pre = compile(self.code.python_pre, '(string)', 'exec')
+            self.python_pre_func = types.FunctionType(self.compiled_python_pre,
+                                                      self.python_code_namespace)
         if hasattr(self.code, 'python_post'):
             self.compiled_python_post = compile(self.code.python_post, '(string)', 'exec')
+            self.python_post_func = types.FunctionType(self.compiled_python_post,
+                                                       self.python_code_namespace)
+        #: The compiled extension function, determined after the first call
+        self.compiled_func = None
 
     def run(self):
-        if hasattr(self, 'compiled_python_pre'):
-            exec self.compiled_python_pre in self.python_code_namespace
-        ret_val = weave.inline(self.code.main, self.namespace.keys(),
-                               local_dict=self.namespace,
-                               support_code=self.code.support_code,
-                               compiler=self.compiler,
-                               headers=['<algorithm>'],
-                               extra_compile_args=self.extra_compile_args,
-                               include_dirs=self.include_dirs)
-        if hasattr(self, 'compiled_python_post'):
-            exec self.compiled_python_post in self.python_code_namespace
+        if self.python_pre_func is not None:
+            self.python_pre_func()
+        ret_val = None
+        called = False
+        if self.compiled_func is not None:
+            # Directly call the compiled function (with the namespace as the
+            # local variables), avoiding weave's catalog lookups
+            try:
+                ret_val = self.compiled_func(self.namespace, {})
+                called = True
+            except TypeError as ex:
+                # If the types of the arguments changed, let weave look for a
+                # matching function (or compile a new one). Other errors were
+                # raised while running the code and must not lead to a
+                # second run (this is the same check as in weave's
+                # inline_tools.attempt_function_call)
+                if not str(ex).strip().startswith('Conversion Error'):
+                    raise
+                self.compiled_func = None
+        if not called:
+            ret_val = weave.inline(self.code.main, self.namespace.keys(),
+                                   local_dict=self.namespace,
+                                   support_code=self.code.support_code,
+                                   compiler=self.compiler,
+                                   headers=['<algorithm>'],
+                                   extra_compile_args=self.extra_compile_args,
+                                   include_dirs=self.include_dirs)
+            # weave keeps the function that was used last for every code
+            self.compiled_func = weave.inline_tools.function_cache.get(self.code.main,
+                                                                       None)
+        if self.python_post_func is not None:
+            self.python_post_func()
         return ret_val
 
+    @classmethod
+    def multistep_runner(cls, code_objects, clock):
+        steps = brian_prefs['codegen.runtime.weave.steps_per_call']
+        if steps <= 1:
+            return None
+        for codeobj in code_objects:
+            if (hasattr(codeobj.code, 'python_pre') or
+                    hasattr(codeobj.code, 'python_post')):
+                return None
+            # The only value that can change between time steps is the time
+            for name, _ in codeobj.nonconstant_values:
+                var = codeobj.variables.get(name, None)
+                if not (isinstance(var, AttributeVariable) and
+                        var.obj is clock and var.attribute == 't_'):
+                    return None
+        try:
+            return WeaveMultiStepRunner(code_objects, clock, steps)
+        except Exception as ex:
+            logger.warn(('Cannot run the code objects %s for several time '
+                         'steps, running them one time step at a time: '
+                         '%s') % (', '.join(c.name for c in code_objects),
+                                  str(ex)))
+            return None
+
 codegen_targets.add(WeaveCodeObject)
 
 
+class WeaveMultiStepRunner(object):
+    '''
+    Runs a sequence of `WeaveCodeObject` objects for several time steps in a
+    single `weave.inline` call (see `CodeObject.multistep_runner`).
+
+    Names that refer to different values in different code objects are
+    renamed, and the time is calculated from the time step in the loop.
+
+    Parameters
+    ----------
+    code_objects : list of `WeaveCodeObject`
+        The code objects to run in every time step.
+    clock : `Clock`
+        The clock for all code objects.
+    steps : int
+        The maximum number of time steps per call.
+    '''
+    def __init__(self, code_objects, clock, steps):
+        self.clock = clock
+        self.steps = steps
+        first = code_objects[0]
+        self.compiler = first.compiler
+        self.extra_compile_args = first.extra_compile_args
+        self.include_dirs = first.include_dirs
+        self.namespace = {}
+        blocks = []
+        support_code = []
+        for idx, codeobj in enumerate(code_objects):
+            time_names = [name for name, _ in codeobj.nonconstant_values]
+            replacements = {}
+            for name, value in codeobj.namespace.iteritems():
+                if name == '_owner' or name in time_names:
+                    continue
+                if name in self.namespace:
+                    other = self.namespace[name]
+                    if other is value:
+                        continue
+                    if (numpy.isscalar(other) and numpy.isscalar(value) and
+                            type(other) == type(value) and other == value):
+                        continue
+                    replacements[name] = '%s_%d' % (name, idx)
+                    name = replacements[name]
+                self.namespace[name] = value
+            code = word_substitute(codeobj.code.main, replacements)
+            time_lines = ''.join('const double %s = _multistep_t;\n' % name
+                                 for name in time_names)
+            # Macros (e.g. for the random number functions) might refer to
+            # renamed variables, they are only valid in their own block
+            undef_lines = ''.join('#undef %s\n' % macro
+                                  for macro in re.findall(r'^\s*#define\s+(\w+)',
+                                                          code, re.M))
+            blocks.append('// %s\n{\n%s%s\n%s}\n' % (codeobj.name, time_lines,
+                                                        code, undef_lines))
+            # The support code of functions is protected against multiple
+            # definitions (see CPPCodeGenerator.determine_keywords), identical
+            # support code is only included once to keep the code short
+            if not codeobj.code.support_code in support_code:
+                support_code.append(codeobj.code.support_code)
+        self.code = '''
+        for(long _multistep_step=0; _multistep_step<_multistep_num_steps; _multistep_step++)
+        {
+            const double _multistep_t = (_multistep_i_start + _multistep_step)*_multistep_dt;
+            %s
+        }
+        ''' % '\n'.join(blocks)
+        self.support_code = '\n'.join(support_code)
+        self.namespace['_multistep_dt'] = clock.dt_
+        # Compile the code (running it for zero time steps), this raises an
+        # error if the code objects cannot be combined
+        self(0)
+
+    def __call__(self, num_steps):
+        self.namespace['_multistep_i_start'] = int(self.clock.i)
+        self.namespace['_multistep_num_steps'] = num_steps
+        weave.inline(self.code, self.namespace.keys(),
+                     local_dict=self.namespace,
+                     support_code=self.support_code,
+                     compiler=self.compiler,
+                     headers=['<algorithm>'],
+                     extra_compile_args=self.extra_compile_args,
+                     include_dirs=self.include_dirs)
+
+
 # Use a special implementation for the randn function that makes use of numpy's
 # randn
 randn_code = {'support_code': '''
@@ -216,9 +384,6 @@ randn_code = {'support_code': '''
             return number;
         }
         ''', 'hashdefine_code': '#define _randn(_vectorisation_idx) _call_randn(_python_randn)'}
-DEFAULT_FUNCTIONS['randn'].implementations.add_implementation(WeaveCodeObject,
-                                                              code=randn_code,
-                                                              name='_randn')
 
 # Also use numpy for rand
 rand_code = {'support_code': '''
@@ -252,6 +417,102 @@ rand_code = {'support_code': '''
             return number;
         }
         ''', 'hashdefine_code': '#define _rand(_vectorisation_idx) _call_rand(_python_rand)'}
-DEFAULT_FUNCTIONS['rand'].implementations.add_implementation(WeaveCodeObject,
-                                                             code=rand_code,
-                                                             name='_rand')
+
+# The native random number generator: a xorshift128+ generator with a separate
+# state for every code object (stored in the _rng_state array: two words of
+# state, a flag whether a second normally distributed number is available and
+# this number)
+native_rng_support_code = '''
+        #ifndef _BRIAN_NATIVE_RNG
+        #define _BRIAN_NATIVE_RNG
+        template<class T>
+        inline npy_uint64 _native_rng_next(T* _state)
+        {
+            npy_uint64 *state = (npy_uint64 *)_state;
+            npy_uint64 s1 = state[0];
+            const npy_uint64 s0 = state[1];
+            state[0] = s0;
+            s1 ^= s1 << 23;
+            state[1] = s1 ^ s0 ^ (s1 >> 17) ^ (s0 >> 26);
+            return state[1] + s0;
+        }
+
+        // uniformly distributed in [0, 1), using the upper 53 bits
+        template<class T>
+        inline double _native_rand(T* _state)
+        {
+            return (_native_rng_next(_state) >> 11) * (1.0/9007199254740992.0);
+        }
+
+        // normally distributed (polar Box-Muller method), every second number
+        // is stored in the state
+        template<class T>
+        inline double _native_randn(T* _state)
+        {
+            npy_uint64 *state = (npy_uint64 *)_state;
+            double number;
+            if (state[2])
+            {
+                state[2] = 0;
+                memcpy(&number, &state[3], sizeof(double));
+                return number;
+            }
+            double x1, x2, w;
+            do {
+                x1 = 2.0*_native_rand(_state) - 1.0;
+                x2 = 2.0*_native_rand(_state) - 1.0;
+                w = x1*x1 + x2*x2;
+            } while (w >= 1.0 || w == 0.0);
+            w = sqrt(-2.0*log(w)/w);
+            number = x2*w;
+            memcpy(&state[3], &number, sizeof(double));
+            state[2] = 1;
+            return x1*w;
+        }
+        #endif
+        '''
+
+native_rand_code = {'support_code': native_rng_support_code,
+                    'hashdefine_code': '#define _rand(_vectorisation_idx) _native_rand(_rng_state)'}
+native_randn_code = {'support_code': native_rng_support_code,
+                     'hashdefine_code': '#define _randn(_vectorisation_idx) _native_randn(_rng_state)'}
+
+
+def native_rng_state():
+    '''
+    Return a new state for the native random number generator. It is seeded
+    from numpy's random number generator, seeding numpy's generator (with
+    `numpy.random.seed`) before the code objects are created therefore makes
+    simulations reproducible.
+    '''
+    state = numpy.zeros(4, dtype=numpy.uint64)
+    while not state[0] and not state[1]:  # state must not be all zero
+        state[:2] = numpy.frombuffer(numpy.random.bytes(16), dtype=numpy.uint64)
+    return state
+
+
+def _random_function_code(numpy_code, native_code):
+    def code(owner):
+        if brian_prefs['codegen.runtime.weave.random_generator'] == 'native':
+            return native_code
+        else:
+            return numpy_code
+    return code
+
+
+def _random_function_namespace(owner):
+    # Every code object gets its own state (if a code object uses rand and
+    # randn, both use the same state)
+    if brian_prefs['codegen.runtime.weave.random_generator'] == 'native':
+        return {'_rng_state': native_rng_state()}
+    else:
+        return None
+
+DEFAULT_FUNCTIONS['randn'].implementations.add_dynamic_implementation(WeaveCodeObject,
+                                                                      code=_random_function_code(randn_code, native_randn_code),
+                                                                      namespace=_random_function_namespace,
+                                                                      name='_randn')
+DEFAULT_FUNCTIONS['rand'].implementations.add_dynamic_implementation(WeaveCodeObject,
+                                                                     code=_random_function_code(rand_code, native_rand_code),
+                                                                     namespace=_random_function_namespace,
+                                                                     name='_rand')
@@ -5,14 +5,17 @@ import os
 import re
 import collections
 
-from jinja2 import Environment, PackageLoader
+from jinja2 import Environment, PackageLoader, FileSystemBytecodeCache, meta
 
+from brian2.utils.logger import get_logger
 from brian2.utils.stringtools import (indent, strip_empty_lines,
                                       get_identifiers)
 
 
 __all__ = ['Templater']
 
+logger = get_logger(__name__)
+
 AUTOINDENT_START = '%%START_AUTOINDENT%%'
 AUTOINDENT_END = '%%END_AUTOINDENT%%'
 
@@ -41,28 +44,109 @@ def autoindent_postfilter(code):
         outlines.append(' '*addspaces+line)
     return '\n'.join(outlines)
 
+def _get_bytecode_cache():
+    '''
+    Return a Jinja bytecode cache in the ``templates`` subdirectory of the code
+    cache, or ``None`` if the code cache is switched off.
+    '''
+    # Imported here to avoid a circular import
+    from brian2.codegen.cache import get_code_cache
+    code_cache = get_code_cache()
+    if code_cache is None:
+        return None
+    directory = os.path.join(code_cache.directory, 'templates')
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+    except OSError as ex:
+        # Another process might have created it in the meantime
+        if not os.path.isdir(directory):
+            logger.debug('Not using a template cache: %s' % ex)
+            return None
+    return FileSystemBytecodeCache(directory)
+
+
 class Templater(object):
     '''
     Class to load and return all the templates a `CodeObject` defines.
+
+    The templates are available as attributes, named after their file names
+    without the extension. They are only loaded and compiled (using the
+    compiled versions stored in the code cache if possible) when they are
+    accessed for the first time.
     '''
     def __init__(self, package_name, env_globals=None):
-        self.env = Environment(loader=PackageLoader(package_name, 'templates'),
-                               trim_blocks=True,
-                               lstrip_blocks=True,
-                               )
-        self.env.globals['autoindent'] = autoindent
-        self.env.filters['autoindent'] = autoindent
-        if env_globals is not None:
-            self.env.globals.update(env_globals)
-        for name in self.env.list_templates():
-            template = CodeObjectTemplate(self.env.get_template(name),
-                                          self.env.loader.get_source(self.env,
-                                                                     name)[0])
-            setattr(self, os.path.splitext(name)[0], template)
+        self.package_name = package_name
+        self.env_globals = env_globals
+        self._env = None
+        self._template_files = None
+
+    @property
+    def env(self):
+        '''
+        The Jinja `Environment` for the templates.
+        '''
+        if self._env is None:
+            env = Environment(loader=PackageLoader(self.package_name,
+                                                   'templates'),
+                              trim_blocks=True,
+                              lstrip_blocks=True,
+                              bytecode_cache=_get_bytecode_cache(),
+                              )
+            env.globals['autoindent'] = autoindent
+            env.filters['autoindent'] = autoindent
+            if self.env_globals is not None:
+                env.globals.update(self.env_globals)
+            self._env = env
+        return self._env
+
+    @property
+    def template_files(self):
+        '''
+        Dictionary mapping template names to the names of their files.
+        '''
+        if self._template_files is None:
+            self._template_files = dict((os.path.splitext(name)[0], name)
+                                        for name in self.env.list_templates())
+        return self._template_files
+
+    def __getattr__(self, name):
+        # Only called for templates that have not been loaded yet
+        if (name.startswith('_') or name in ('env', 'template_files') or
+                name not in self.template_files):
+            raise AttributeError(name)
+        filename = self.template_files[name]
+        template = CodeObjectTemplate(self.env.get_template(filename),
+                                      self.env.loader.get_source(self.env,
+                                                                 filename)[0],
+                                      self._referenced_sources(filename))
+        setattr(self, name, template)
+        return template
+
+    def _referenced_sources(self, filename):
+        '''
+        Return the sources of all templates that are (directly or indirectly)
+        extended, included or imported by a template.
+        '''
+        sources = []
+        to_check = [filename]
+        checked = set()
+        while to_check:
+            current = to_check.pop()
+            if current in checked:
+                continue
+            checked.add(current)
+            source = self.env.loader.get_source(self.env, current)[0]
+            if current != filename:
+                sources.append(source)
+            for referenced in meta.find_referenced_templates(self.env.parse(source)):
+                if referenced is not None:
+                    to_check.append(referenced)
+        return sources
 
 
 class CodeObjectTemplate(object):
-    def __init__(self, template, template_source):
+    def __init__(self, template, template_source, referenced_sources=()):
         self.template = template
         #: The set of variables in this template
         self.variables = set([])
@@ -76,6 +160,10 @@ class CodeObjectTemplate(object):
                                         template_source, re.M|re.S)
         #: Does this template allow writing to scalar variables?
         self.allows_scalar_write = 'ALLOWS_SCALAR_WRITE' in template_source
+        #: Does this template (or a template it extends) use the scalar code?
+        self.uses_scalar_code = any('scalar_code' in source
+                                    for source in [template_source] +
+                                                  list(referenced_sources))
 
         for block in specifier_blocks:
             self.variables.update(get_identifiers(block))
@@ -104,6 +192,18 @@ class MultiTemplate(object):
                 s = autoindent_postfilter(str(f()))
                 setattr(self, k, s)
                 self._templates[k] = s
+
+    @classmethod
+    def from_templates(cls, templates):
+        '''
+        Create a `MultiTemplate` from a dictionary of already rendered code
+        strings (as stored in its ``_templates`` attribute).
+        '''
+        multi_template = cls.__new__(cls)
+        multi_template._templates = dict(templates)
+        for k, s in templates.iteritems():
+            setattr(multi_template, k, s)
+        return multi_template
                 
     def __str__(self):
         s = ''
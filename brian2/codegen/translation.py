@@ -24,6 +24,7 @@ from brian2.core.functions import Function
 from brian2.utils.stringtools import (deindent, strip_empty_lines,
                                       get_identifiers, word_substitute)
 from brian2.utils.topsort import topsort
+from brian2.utils.caching import memoize
 from brian2.parsing.statements import parse_statement
 
 from .statements import Statement
@@ -132,13 +133,34 @@ def get_identifiers_recursively(expressions, variables):
     return identifiers
 
 
+def _make_statements_key(code, variables, dtype):
+    '''
+    Return a key for the arguments of `make_statements`, including all the
+    information about the variables that is used to create the statements.
+    '''
+    variable_info = []
+    for name, var in variables.iteritems():
+        if isinstance(var, Function):
+            variable_info.append((name, 'Function'))
+        elif isinstance(var, Subexpression):
+            variable_info.append((name, 'Subexpression', var.dtype,
+                                  var.scalar, var.expr))
+        else:
+            variable_info.append((name, var.__class__.__name__,
+                                  getattr(var, 'dtype', None),
+                                  getattr(var, 'scalar', False)))
+    return code, frozenset(variable_info), dtype
+
+
+@memoize(maxsize=1000, key=_make_statements_key)
 def make_statements(code, variables, dtype):
     '''
     Turn a series of abstract code statements into Statement objects, inferring
     whether each line is a set/declare operation, whether the variables are
     constant or not, and handling the cacheing of subexpressions. Returns a
     list of Statement objects. For arguments, see documentation for
-    :func:`translate`.
+    :func:`translate`. The results are cached, the returned list must
+    therefore not be changed.
     '''
     code = strip_empty_lines(deindent(code))
     lines = re.split(r'[;\n]', code)
@@ -308,6 +308,22 @@ class Network(Nameable):
         brian_prefs.check_all_validated()
 
         self._clocks = set(obj.clock for obj in self.objects)
+        # The clocks in a fixed order, and for every clock its dt in units of
+        # the smallest dt. If all dts are multiples of the smallest dt, this
+        # allows to determine the clocks to update with integer comparisons,
+        # otherwise _clock_steps is None
+        self._clock_list = sorted(self._clocks, key=lambda clock: clock.name)
+        self._clock_steps = None
+        if len(self._clock_list):
+            min_dt = min(clock.dt_ for clock in self._clock_list)
+            clock_steps = [int(round(clock.dt_ / min_dt))
+                           for clock in self._clock_list]
+            if all(abs(steps*min_dt - clock.dt_) <= Clock.epsilon*clock.dt_
+                   for steps, clock in zip(clock_steps, self._clock_list)):
+                self._clock_steps = clock_steps
+        # The objects to update for every combination of clocks, filled during
+        # the run
+        self._schedules = {}
         
         self._stopped = False
         Network._globally_stopped = False
@@ -341,12 +357,23 @@ class Network(Nameable):
             if obj.active:
                 obj.after_run()
         
-    def _nextclocks(self):
-        minclock = min(self._clocks, key=lambda c: c.t_)
-        curclocks = set(clock for clock in self._clocks if
-                        (clock.t_ == minclock.t_ or
-                         abs(clock.t_ - minclock.t_)<Clock.epsilon))
-        return minclock, curclocks
+    def _multistep_runner(self, clock):
+        '''
+        Return a function running all objects for several time steps (see
+        `CodeObject.multistep_runner`) or ``None`` if this is not possible.
+        This is only possible if all objects are active and only run their
+        code objects.
+        '''
+        code_objects = []
+        for obj in self.objects:
+            if not obj.active or type(obj).run != BrianObject.run:
+                return None
+            code_objects.extend(obj._code_objects)
+        codeobj_classes = set(type(codeobj) for codeobj in code_objects)
+        if len(codeobj_classes) != 1:
+            return None
+        codeobj_class = codeobj_classes.pop()
+        return codeobj_class.multistep_runner(code_objects, clock)
 
     @device_override('network_run')
     @check_units(duration=second, report_period=second)
@@ -404,8 +431,9 @@ class Network(Nameable):
             
         # TODO: progress reporting stuff
         
-        # Find the first clock to be updated (see note below)
-        clock, curclocks = self._nextclocks()
+        # The clock to be updated if there is only a single clock (see note
+        # below for several clocks)
+        clock = self._clock_list[0]
         if report is not None:
             report_period = float(report_period)
             start = current = time.time()
@@ -426,7 +454,35 @@ class Network(Nameable):
                                  'but it is of type %s') % type(report))
             report_callback(0*second, 0.0, duration)
 
-        while clock.running and not self._stopped and not Network._globally_stopped:
+        clocks = self._clock_list
+        clock_steps = self._clock_steps
+        schedules = self._schedules
+        if clock_steps is not None:
+            # The time of every clock as an integer, in units of the smallest dt
+            clock_positions = [int(c.i)*steps
+                               for c, steps in zip(clocks, clock_steps)]
+        active = (True, )
+        # With a single clock, several time steps might be run in a single call
+        if len(clocks) == 1:
+            multistep_runner = self._multistep_runner(clock)
+        else:
+            multistep_runner = None
+        while not self._stopped and not Network._globally_stopped:
+            # find the next clocks to be updated: the clock with the smallest t
+            # value, or all clocks with the smallest t value if there are
+            # several of them
+            if len(clocks) > 1:
+                if clock_steps is not None:
+                    position = min(clock_positions)
+                    active = tuple(p == position for p in clock_positions)
+                else:
+                    min_t = min(c.t_ for c in clocks)
+                    active = tuple(c.t_ == min_t or
+                                   abs(c.t_ - min_t) < Clock.epsilon
+                                   for c in clocks)
+                clock = clocks[active.index(True)]
+            if not clock.running:
+                break
             # update the network time to this clocks time
             self.t_ = clock.t_
             if report is not None:
@@ -436,18 +492,31 @@ class Network(Nameable):
                                     (self.t_ - float(t_start))/float(t_end),
                                     duration)
                     next_report_time = current + report_period
-                # update the objects with this clock
-            for obj in self.objects:
-                if obj.clock in curclocks and obj.active:
+            if (multistep_runner is not None and
+                    all(obj.active for obj in self.objects)):
+                num_steps = int(min(multistep_runner.steps,
+                                    clock.i_end - clock.i))
+                multistep_runner(num_steps)
+                clock.i += num_steps
+                continue
+            # update the objects with this clock, the list of objects for each
+            # combination of clocks is only determined once
+            try:
+                objects = schedules[active]
+            except KeyError:
+                curclocks = set(c for c, is_active in zip(clocks, active)
+                                if is_active)
+                objects = [obj for obj in self.objects if obj.clock in curclocks]
+                schedules[active] = objects
+            for obj in objects:
+                if obj.active:
                     obj.run()
             # tick the clock forward one time step
-            for c in curclocks:
-                c.tick()
-            # find the next clocks to be updated. The < operator for Clock
-            # determines that the first clock to be updated should be the one
-            # with the smallest t value, unless there are several with the 
-            # same t value in which case we update all of them
-            clock, curclocks = self._nextclocks()
+            for idx, is_active in enumerate(active):
+                if is_active:
+                    clocks[idx].tick()
+                    if clock_steps is not None:
+                        clock_positions[idx] += clock_steps[idx]
 
         self.t = t_end
 
@@ -420,6 +420,12 @@ class ArrayVariable(Variable):
         #: denoting the absence of refractoriness)
         self.conditional_write = None
 
+        #: A counter that is increased every time the values or the size of
+        #: the variable are changed from outside of a run (e.g. via
+        #: `set_value` or when setting the variable on its `Group`). Allows
+        #: to cache data structures derived from the variable.
+        self.version = 0
+
     def set_conditional_write(self, var):
         if not var.is_boolean:
             raise TypeError(('A variable can only be conditionally writeable '
@@ -432,6 +438,7 @@ class ArrayVariable(Variable):
 
     def set_value(self, value):
         self.device.fill_with_array(self, value)
+        self.version += 1
 
     def get_len(self):
         return self.size
@@ -522,6 +529,7 @@ class DynamicArrayVariable(ArrayVariable):
         '''
         self.device.resize(self, new_size)
         self.size = new_size
+        self.version += 1
 
 
 class Subexpression(Variable):
@@ -827,6 +835,9 @@ class VariableView(object):
             self.set_with_index_array(item, value,
                                       check_units=check_units)
 
+        if isinstance(variable, ArrayVariable):
+            variable.version += 1
+
     def __setitem__(self, item, value):
         self.set_item(item, value, level=1)
 
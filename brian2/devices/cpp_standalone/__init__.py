@@ -1,5 +1,9 @@
 '''
 Package implementing the C++ "standalone" `Device` and `CodeObject`.
+
+Preferences
+--------------------
+.. document_brian_prefs:: devices.cpp_standalone
 '''
 
 from .codeobject import CPPStandaloneCodeObject
@@ -7,6 +7,7 @@
 Network::Network()
 {
 	t = 0.0;
+	report_steps = 100;
 }
 
 void Network::clear()
@@ -25,12 +26,17 @@ void Network::run(const double duration, void (*report_func)(const double, const
     const double t_start = t;
 	const double t_end = t + duration;
 	double next_report_time = report_period;
-	// compute the set of clocks
+	// compute the set of clocks and the schedules
 	compute_clocks();
+	if(clocks.empty())
+	{
+		t = t_end;
+		return;
+	}
 	// set interval for all clocks
-	for(std::set<Clock*>::iterator i=clocks.begin(); i!=clocks.end(); i++)
+	for(int i=0; i<clocks.size(); i++)
 	{
-		(*i)->set_interval(t, t_end);
+		clocks[i]->set_interval(t, t_end);
 	}
 	start = std::clock();
 	if (report_func)
@@ -38,34 +44,41 @@ void Network::run(const double duration, void (*report_func)(const double, const
 	    report_func(0.0, 0.0, duration);
 	}
 
-	Clock* clock = next_clocks();
+	std::vector<bool> active(clocks.size()), last_active;
+	std::vector<codeobj_func> *funcs = NULL;
+	long step = 0;
+	Clock* clock = next_clocks(active);
 	while(clock->running())
 	{
-		for(int i=0; i<objects.size(); i++)
+		// Most of the time, the same clocks are active as in the previous step
+		if(funcs == NULL || active != last_active)
 		{
-			if (report_func)
-            {
-                current = std::clock();
-                const double elapsed = (double)(current - start)/CLOCKS_PER_SEC;
-                if (elapsed > next_report_time)
-                {
-                    report_func(elapsed, (clock->t_()-t_start)/duration, duration);
-                    next_report_time += report_period;
-                }
-            }
-			Clock *obj_clock = objects[i].first;
-			// Only execute the object if it uses the right clock for this step
-			if (curclocks.find(obj_clock) != curclocks.end())
-			{
-                codeobj_func func = objects[i].second;
-                func();
-			}
+			funcs = &schedule(active);
+			last_active = active;
+		}
+		for(int i=0; i<funcs->size(); i++)
+		{
+			(*funcs)[i]();
+		}
+		for(int i=0; i<clocks.size(); i++)
+		{
+			if(active[i])
+				clocks[i]->tick();
 		}
-		for(std::set<Clock*>::iterator i=curclocks.begin(); i!=curclocks.end(); i++)
+		clock = next_clocks(active);
+		// Only check the time every report_steps steps, std::clock is
+		// expensive compared to small code objects
+		step++;
+		if (report_func && step % report_steps == 0)
 		{
-			(*i)->tick();
+			current = std::clock();
+			const double elapsed = (double)(current - start)/CLOCKS_PER_SEC;
+			if (elapsed > next_report_time)
+			{
+				report_func(elapsed, (clock->t_()-t_start)/duration, duration);
+				next_report_time += report_period;
+			}
 		}
-		clock = next_clocks();
 	}
 	if (report_func)
 	{
@@ -78,32 +91,87 @@ void Network::run(const double duration, void (*report_func)(const double, const
 void Network::compute_clocks()
 {
 	clocks.clear();
+	object_clocks.clear();
+	schedules.clear();
 	for(int i=0; i<objects.size(); i++)
 	{
 		Clock *clock = objects[i].first;
-		clocks.insert(clock);
+		int clock_idx = 0;
+		while(clock_idx < clocks.size() && clocks[clock_idx] != clock)
+			clock_idx++;
+		if(clock_idx == clocks.size())
+			clocks.push_back(clock);
+		object_clocks.push_back(clock_idx);
+	}
+	if(clocks.empty())
+		return;
+	// If all dts are multiples of the smallest dt, the clocks can be compared
+	// with integer time steps
+	double min_dt = clocks[0]->dt_();
+	for(int i=1; i<clocks.size(); i++)
+	{
+		if(clocks[i]->dt_() < min_dt)
+			min_dt = clocks[i]->dt_();
+	}
+	clock_steps.resize(clocks.size());
+	bool multiples = true;
+	for(int i=0; i<clocks.size(); i++)
+	{
+		const double dt = clocks[i]->dt_();
+		clock_steps[i] = fround(dt/min_dt);
+		if(fabs(clock_steps[i]*min_dt - dt) > Clock_epsilon*dt)
+			multiples = false;
 	}
+	if(!multiples)
+		clock_steps.assign(clocks.size(), 0);
 }
 
-Clock* Network::next_clocks()
+Clock* Network::next_clocks(std::vector<bool> &active)
 {
-	// find minclock, clock with smallest t value
-	Clock *minclock = *clocks.begin();
-	for(std::set<Clock*>::iterator i=clocks.begin(); i!=clocks.end(); i++)
+	// find minclock, clock with smallest t value, and the set of clocks with
+	// the same t value
+	int minclock = 0;
+	if(clock_steps[0] > 0)
 	{
-		Clock *clock = *i;
-		if(clock->t_()<minclock->t_())
-			minclock = clock;
+		long min_step = clocks[0]->i*clock_steps[0];
+		for(int i=1; i<clocks.size(); i++)
+		{
+			const long clock_step = clocks[i]->i*clock_steps[i];
+			if(clock_step < min_step)
+			{
+				min_step = clock_step;
+				minclock = i;
+			}
+		}
+		for(int i=0; i<clocks.size(); i++)
+			active[i] = clocks[i]->i*clock_steps[i] == min_step;
+	} else
+	{
+		for(int i=1; i<clocks.size(); i++)
+		{
+			if(clocks[i]->t_() < clocks[minclock]->t_())
+				minclock = i;
+		}
+		const double t = clocks[minclock]->t_();
+		for(int i=0; i<clocks.size(); i++)
+		{
+			const double s = clocks[i]->t_();
+			active[i] = (s==t or fabs(s-t)<=Clock_epsilon);
+		}
 	}
-	// find set of equal clocks
-	curclocks.clear();
-	double t = minclock->t_();
-	for(std::set<Clock*>::iterator i=clocks.begin(); i!=clocks.end(); i++)
+	return clocks[minclock];
+}
+
+std::vector<codeobj_func>& Network::schedule(const std::vector<bool> &active)
+{
+	std::map< std::vector<bool>, std::vector<codeobj_func> >::iterator found = schedules.find(active);
+	if(found != schedules.end())
+		return found->second;
+	std::vector<codeobj_func> &funcs = schedules[active];
+	for(int i=0; i<objects.size(); i++)
 	{
-		Clock *clock = *i;
-		double s = clock->t_();
-		if(s==t or fabs(s-t)<=Clock_epsilon)
-			curclocks.insert(clock);
+		if(active[object_clocks[i]])
+			funcs.push_back(objects[i].second);
 	}
-	return minclock;
+	return funcs;
 }
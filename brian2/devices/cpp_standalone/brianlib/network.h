@@ -3,19 +3,29 @@
 
 #include<vector>
 #include<utility>
-#include<set>
+#include<map>
 #include "clocks.h"
 
 typedef void (*codeobj_func)();
 
 class Network
 {
-	std::set<Clock*> clocks, curclocks;
+	std::vector<Clock*> clocks;
+	// index into clocks for every object
+	std::vector<int> object_clocks;
+	// number of steps of the smallest dt for every clock, all zero if the
+	// clocks are not multiples of the smallest dt
+	std::vector<long> clock_steps;
+	// the functions to execute for each combination of active clocks
+	std::map< std::vector<bool>, std::vector<codeobj_func> > schedules;
 	void compute_clocks();
-	Clock* next_clocks();
+	Clock* next_clocks(std::vector<bool> &active);
+	std::vector<codeobj_func>& schedule(const std::vector<bool> &active);
 public:
 	std::vector< std::pair< Clock*, codeobj_func > > objects;
 	double t;
+	// check whether progress should be reported every report_steps steps
+	int report_steps;
 
 	Network();
 	void clear();
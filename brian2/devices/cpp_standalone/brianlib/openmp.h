@@ -0,0 +1,52 @@
+#ifndef _BRIAN_OPENMP_H
+#define _BRIAN_OPENMP_H
+
+/*
+ * OpenMP support. If the project is compiled without OpenMP, the #pragma omp
+ * directives in the code objects are ignored and the functions below make
+ * sure that everything runs in a single thread.
+ */
+#ifdef _OPENMP
+#include<omp.h>
+#else
+inline int omp_get_thread_num() { return 0; }
+inline int omp_get_num_threads() { return 1; }
+inline int omp_get_max_threads() { return 1; }
+inline void omp_set_num_threads(int num_threads) {}
+#endif
+
+#include<cstddef>
+#include<vector>
+#include<stdint.h>
+
+/*
+ * Sort events (e.g. spiking synapses) into partitions for parallel
+ * processing: an event belongs to partition targets[event] % num_partitions,
+ * i.e. events of different partitions never have the same target. The events
+ * of partition p are stored in partitioned[partition_start[p]] to
+ * partitioned[partition_start[p+1]-1], in their original order. If events is
+ * NULL, the events are the indices 0 to num_events-1.
+ */
+inline void _brian_partition_events(const int32_t *events, long num_events,
+                                    const int32_t *targets, int num_partitions,
+                                    std::vector<int32_t> &partitioned,
+                                    std::vector<long> &partition_start)
+{
+    partition_start.assign(num_partitions + 1, 0);
+    for(long _i=0; _i<num_events; _i++)
+    {
+        const int32_t _event = events == NULL ? _i : events[_i];
+        partition_start[targets[_event] % num_partitions + 1]++;
+    }
+    for(int _p=0; _p<num_partitions; _p++)
+        partition_start[_p + 1] += partition_start[_p];
+    partitioned.resize(num_events);
+    std::vector<long> _next(partition_start.begin(), partition_start.end() - 1);
+    for(long _i=0; _i<num_events; _i++)
+    {
+        const int32_t _event = events == NULL ? _i : events[_i];
+        partitioned[_next[targets[_event] % num_partitions]++] = _event;
+    }
+}
+
+#endif
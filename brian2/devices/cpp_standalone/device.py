@@ -5,12 +5,17 @@ import os
 import shutil
 import subprocess
 import inspect
+import hashlib
+import multiprocessing
+import platform
 from collections import defaultdict
+from distutils.spawn import find_executable
 
 import numpy as np
 
 from brian2.core.clocks import defaultclock
 from brian2.core.network import Network
+from brian2.core.preferences import brian_prefs, BrianPreference
 from brian2.devices.device import Device, all_devices
 from brian2.core.variables import *
 from brian2.synapses.synapses import Synapses
@@ -28,6 +33,34 @@ __all__ = []
 
 logger = get_logger(__name__)
 
+# Preferences
+brian_prefs.register_preferences(
+    'devices.cpp_standalone',
+    'C++ standalone preferences',
+    compile_jobs = BrianPreference(
+        default=0,
+        docs='''
+        The number of parallel jobs used for compiling the project
+        (``make -j``). Use 0 to use one job per CPU.
+        '''
+        ),
+    object_cache_dir = BrianPreference(
+        default=os.path.join('~', '.brian', 'cpp_standalone_objects'),
+        docs='''
+        The directory in which compiled object files are stored, so that
+        unchanged code objects do not have to be recompiled, even in a new
+        project directory. Use an empty string to switch off the cache.
+        '''
+        ),
+    object_cache_size_limit = BrianPreference(
+        default=200,
+        docs='''
+        The maximum size of the object cache in megabytes. If the cache grows
+        larger, the least recently used object files are deleted.
+        '''
+        ),
+    )
+
 
 def freeze(code, ns):
     # this is a bit of a hack, it should be passed to the template somehow
@@ -68,6 +101,126 @@ class CPPWriter(object):
         open(fullfilename, 'w').write(contents)
         
         
+def object_cache_keys(project_dir, source_files, header_files, flags):
+    '''
+    Return a key for the compiled object file of every source file.
+
+    The key is a hash of the source file, all the header files of the project
+    (any of them might be included) and the description of the compiler and
+    its flags.
+
+    Parameters
+    ----------
+    project_dir : str
+        The project directory, all file names are relative to it.
+    source_files : list of str
+        The ``.cpp`` files of the project.
+    header_files : list of str
+        The ``.h`` files of the project.
+    flags : str
+        A description of the compiler and the compiler flags (see
+        `compiler_signature`).
+
+    Returns
+    -------
+    keys : dict
+        Dictionary mapping source file names to their key.
+    '''
+    headers_hash = hashlib.sha1(flags)
+    for header_file in sorted(set(header_files)):
+        headers_hash.update(header_file)
+        with open(os.path.join(project_dir, header_file), 'rb') as f:
+            headers_hash.update(f.read())
+    keys = {}
+    for source_file in source_files:
+        source_hash = headers_hash.copy()
+        with open(os.path.join(project_dir, source_file), 'rb') as f:
+            source_hash.update(f.read())
+        keys[source_file] = source_hash.hexdigest()
+    return keys
+
+
+_compiler_signatures = {}
+
+
+def compiler_signature(compiler, native=False):
+    '''
+    Return a description of the compiler that changes whenever the compiler
+    would generate different object files for the same source and flags.
+
+    The description contains the full path and the version of the compiler.
+    With ``native=True``, it also contains the target options that
+    ``-march=native`` resolves to on this machine (or the host name and
+    processor if they cannot be determined).
+
+    Parameters
+    ----------
+    compiler : str
+        The name of the compiler executable.
+    native : bool, optional
+        Whether the code is compiled with ``-march=native``.
+
+    Returns
+    -------
+    signature : str
+        The description of the compiler.
+    '''
+    key = (compiler, native)
+    if key not in _compiler_signatures:
+        parts = [str(find_executable(compiler))]
+        try:
+            parts.append(subprocess.check_output([compiler, '--version'],
+                                                 stderr=subprocess.STDOUT))
+        except (OSError, subprocess.CalledProcessError):
+            pass
+        if native:
+            try:
+                parts.append(subprocess.check_output([compiler,
+                                                      '-march=native', '-Q',
+                                                      '--help=target'],
+                                                     stderr=subprocess.STDOUT))
+            except (OSError, subprocess.CalledProcessError):
+                parts.extend([platform.node(), platform.machine(),
+                              platform.processor()])
+        _compiler_signatures[key] = '\n'.join(parts)
+    return _compiler_signatures[key]
+
+
+def prune_object_cache(cache_dir, size_limit):
+    '''
+    Remove the least recently used object files from the object cache until
+    its total size is below the size limit.
+
+    Parameters
+    ----------
+    cache_dir : str
+        The directory of the object cache.
+    size_limit : int
+        The maximum total size of all object files in bytes.
+    '''
+    entries = []
+    for filename in os.listdir(cache_dir):
+        if not filename.endswith('.o'):
+            continue
+        full_name = os.path.join(cache_dir, filename)
+        try:
+            stat = os.stat(full_name)
+        except OSError:
+            # Removed by another process
+            continue
+        entries.append((stat.st_mtime, stat.st_size, full_name))
+    entries.sort()
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, filename in entries:
+        if total_size <= size_limit:
+            break
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+        total_size -= size
+
+
 def invert_dict(x):
     return dict((v, k) for k, v in x.iteritems())
 
@@ -311,7 +464,7 @@ class CPPStandaloneDevice(Device):
               with_output=True, native=True,
               additional_source_files=None, additional_header_files=None,
               main_includes=None, run_includes=None,
-              run_args=None,
+              run_args=None, num_threads=1, parameters=None,
               ):
         '''
         Build the project
@@ -340,6 +493,27 @@ class CPPStandaloneDevice(Device):
             A list of additional header files to include in ``main.cpp``.
         run_includes : list of str
             A list of additional header files to include in ``run.cpp``.
+        run_args : list of str
+            Additional command line arguments for the built program, e.g.
+            ``['tau=0.02']`` to set a parameter (see ``parameters``).
+        num_threads : int
+            The number of threads used to run the simulation. For more than one
+            thread, the project is compiled with OpenMP (``-fopenmp``), which
+            parallelises state updates, thresholds, resets, synaptic
+            propagation and summed variables.
+        parameters : list of str
+            Names of scalar constants (e.g. ``'tau'``) that should not be
+            written into the generated code, but can be changed when running
+            the compiled program with arguments of the form ``name=value``.
+            The values at the time of the build are used as defaults. The
+            program also reads arguments from a parameter file with one
+            ``name=value`` entry per line if its name is given with a
+            leading ``@``. Independent of this option, the program accepts
+            ``seed=...`` to seed the random number generator,
+            ``results_dir=...`` to write the results to another directory
+            and ``static_array_name=filename`` to read the initial values of
+            a static array (stored in the ``static_arrays`` directory) from
+            another file.
         '''
         
         if additional_source_files is None:
@@ -352,6 +526,10 @@ class CPPStandaloneDevice(Device):
             run_includes = []
         if run_args is None:
             run_args = []
+        if num_threads < 1:
+            raise ValueError('num_threads has to be at least 1, is %d' % num_threads)
+        if parameters is None:
+            parameters = []
         self.project_dir = project_dir
         ensure_directory(project_dir)
         for d in ['code_objects', 'results', 'static_arrays']:
@@ -383,6 +561,42 @@ class CPPStandaloneDevice(Device):
             arr.tofile(os.path.join(project_dir, 'static_arrays', name))
             static_array_specs.append((name, c_data_type(arr.dtype), arr.size, name))
 
+        # Find the values of the parameters that can be set at runtime
+        parameter_values = {}
+        for codeobj in self.code_objects.itervalues():
+            for name in parameters:
+                if not name in codeobj.variables:
+                    continue
+                var = codeobj.variables[name]
+                if isinstance(var, (int, float)):
+                    value = var
+                elif (isinstance(var, Variable) and
+                          not isinstance(var, AttributeVariable) and
+                          var.scalar and var.constant and var.read_only):
+                    value = var.get_value()
+                else:
+                    raise TypeError(('"%s" cannot be used as a parameter, only '
+                                     'scalar constants can be set at '
+                                     'runtime.') % name)
+                if name in parameter_values and parameter_values[name] != value:
+                    raise ValueError(('Parameter "%s" refers to different '
+                                      'values in different objects '
+                                      '(%r and %r).') % (name,
+                                                         parameter_values[name],
+                                                         value))
+                parameter_values[name] = value
+        for name in parameters:
+            if not name in parameter_values:
+                logger.warn('Parameter "%s" is not used by any object.' % name)
+        parameter_specs = []
+        for name, value in sorted(parameter_values.iteritems()):
+            if isinstance(value, (bool, np.bool_)):
+                default = 'true' if value else 'false'
+            else:
+                default = repr(value)
+            parameter_specs.append((name, c_data_type(np.asarray(value).dtype),
+                                    default))
+
         # Write the global objects
         networks = [net() for net in Network.__instances__() if net().name!='_fake_network']
         synapses = [S() for S in Synapses.__instances__()]
@@ -396,6 +610,7 @@ class CPPStandaloneDevice(Device):
                         synapses=synapses,
                         clocks=self.clocks,
                         static_array_specs=static_array_specs,
+                        parameter_specs=parameter_specs,
                         networks=networks,
                         )
         writer.write('objects.*', arr_tmp)
@@ -483,9 +698,18 @@ class CPPStandaloneDevice(Device):
                 if not line in code_object_defs[codeobj.name]:
                     code_object_defs[codeobj.name].append(line)
 
+        # Parameters are not frozen but refer to global values
+        for codeobj in self.code_objects.itervalues():
+            for name, c_type, _ in parameter_specs:
+                if name in codeobj.variables:
+                    line = 'const {c_type} {name} = _parameter_{name};'
+                    code_object_defs[codeobj.name].append(line.format(c_type=c_type,
+                                                                      name=name))
+
         # Generate the code objects
         for codeobj in self.code_objects.itervalues():
-            ns = codeobj.variables
+            ns = dict((k, v) for k, v in codeobj.variables.iteritems()
+                      if not k in parameter_values)
             # TODO: fix these freeze/CONSTANTS hacks somehow - they work but not elegant.
             code = freeze(codeobj.code.cpp_file, ns)
             code = code.replace('%CONSTANTS%', '\n'.join(code_object_defs[codeobj.name]))
@@ -503,6 +727,7 @@ class CPPStandaloneDevice(Device):
                                                           report_func=self.report_func,
                                                           dt=float(defaultclock.dt),
                                                           additional_headers=main_includes,
+                                                          num_threads=num_threads,
                                                           )
         writer.write('main.cpp', main_tmp)
         
@@ -537,22 +762,76 @@ class CPPStandaloneDevice(Device):
             rm_cmd = 'del'
         else:
             rm_cmd = 'rm'
+        if num_threads > 1:
+            openmp_flags = '-fopenmp'
+        else:
+            openmp_flags = ''
         makefile_tmp = CPPStandaloneCodeObject.templater.makefile(None, None,
                                                                   source_files=' '.join(writer.source_files),
                                                                   header_files=' '.join(writer.header_files),
-                                                                  rm_cmd=rm_cmd)
+                                                                  rm_cmd=rm_cmd,
+                                                                  openmp_flags=openmp_flags)
         writer.write('makefile', makefile_tmp)
 
         # build the project
         if compile_project:
+            if debug:
+                make_target = 'debug'
+            elif native:
+                make_target = 'native'
+            else:
+                make_target = 'all'
+            compile_jobs = brian_prefs['devices.cpp_standalone.compile_jobs']
+            if compile_jobs <= 0:
+                compile_jobs = multiprocessing.cpu_count()
+
+            # Use previously compiled objects for all source files that did
+            # not change (the makefile will only compile the remaining ones)
+            cache_dir = brian_prefs['devices.cpp_standalone.object_cache_dir']
+            if cache_dir:
+                cache_dir = os.path.expanduser(cache_dir)
+                ensure_directory(cache_dir)
+                # The flags are described by the makefile (without the lists
+                # of files, which do not affect the individual objects), the
+                # make target and the compiler itself
+                makefile_flags = [line for line in makefile_tmp.split('\n')
+                                  if not line.startswith(('SRCS', 'H_SRCS'))]
+                flags = '\n'.join([make_target] + makefile_flags +
+                                   [compiler_signature('g++',
+                                                       native=make_target == 'native')])
+                object_keys = object_cache_keys(project_dir,
+                                                writer.source_files,
+                                                writer.header_files + ['brianlib/spikequeue.h'],
+                                                flags=flags)
+                for source_file, key in object_keys.iteritems():
+                    cached_object = os.path.join(cache_dir, key+'.o')
+                    if os.path.exists(cached_object):
+                        object_file = os.path.join(project_dir,
+                                                   source_file[:-4]+'.o')
+                        # copying sets the modification time, make will
+                        # therefore consider the object file up to date
+                        shutil.copy(cached_object, object_file)
+                        # Mark the cached object as recently used
+                        try:
+                            os.utime(cached_object, None)
+                        except OSError:
+                            pass
+
             with in_directory(project_dir):
-                if debug:
-                    x = os.system('make debug')
-                elif native:
-                    x = os.system('make native')
-                else:
-                    x = os.system('make')
+                x = os.system('make -j%d %s' % (compile_jobs, make_target))
                 if x==0:
+                    if cache_dir:
+                        for source_file, key in object_keys.iteritems():
+                            cached_object = os.path.join(cache_dir, key+'.o')
+                            if not os.path.exists(cached_object):
+                                # Write to a temporary file first, other
+                                # processes might use the cache at the same time
+                                tmp_object = '%s.%d.tmp' % (cached_object,
+                                                            os.getpid())
+                                shutil.copy(source_file[:-4]+'.o', tmp_object)
+                                os.rename(tmp_object, cached_object)
+                        size_limit = brian_prefs['devices.cpp_standalone.object_cache_size_limit']
+                        prune_object_cache(cache_dir, size_limit*1024*1024)
                     if run_project:
                         if not with_output:
                             stdout = open(os.devnull, 'w')
@@ -2,6 +2,7 @@
 #include "code_objects/{{codeobj_name}}.h"
 #include<math.h>
 #include "brianlib/common_math.h"
+#include "brianlib/openmp.h"
 #include<stdint.h>
 #include<iostream>
 #include<fstream>
@@ -30,6 +31,10 @@ void _run_{{codeobj_name}}()
 	// scalar code
 	const int _vectorisation_idx = -1;
 	{{scalar_code|autoindent}}
+	{# The random number functions are not thread-safe #}
+	{% if not uses_random_numbers %}
+	#pragma omp parallel for schedule(static)
+	{% endif %}
 	for(int _idx=0; _idx<N; _idx++)
 	{
 	    // vector code
@@ -1,6 +1,7 @@
 #include<stdlib.h>
 #include "objects.h"
 #include "run.h"
+#include "brianlib/openmp.h"
 
 {% for codeobj in code_objects %}
 #include "code_objects/{{codeobj.name}}.h"
@@ -16,6 +17,9 @@
 
 int main(int argc, char **argv)
 {
+	if(!_read_parameters(argc, argv))
+		return 1;
+	omp_set_num_threads({{num_threads}});
 	brian_start();
 
 	{
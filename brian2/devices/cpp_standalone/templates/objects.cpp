@@ -9,6 +9,9 @@
 #include "brianlib/network.h"
 #include<iostream>
 #include<fstream>
+#include<sstream>
+#include<string>
+#include<map>
 
 //////////////// clocks ///////////////////
 {% for clock in clocks | sort(attribute='name') %}
@@ -47,6 +50,16 @@ const int brian::_num_{{name}} = {{N}};
 {% endif %}
 {% endfor %}
 
+//////////////// parameters /////////////
+{% for (name, dtype_spec, value) in parameter_specs %}
+{{dtype_spec}} brian::_parameter_{{name}} = {{value}};
+{% endfor %}
+std::string brian::_results_dir = "results";
+long brian::_seed = -1;
+
+// Files to load the static arrays from
+static std::map<std::string, std::string> _static_array_files;
+
 //////////////// synapses /////////////////
 {% for S in synapses | sort(attribute='name') %}
 // {{S.name}}
@@ -63,6 +76,98 @@ SynapticPathway<double> brian::{{path.name}}(
 {% endfor %}
 
 
+static bool _check_parsed(const std::istringstream &value_stream,
+                          const std::string &name, const std::string &value)
+{
+	if(value_stream.fail())
+	{
+		std::cerr << "Cannot parse value \"" << value << "\" for parameter " << name << "." << std::endl;
+		return false;
+	}
+	return true;
+}
+
+bool _set_parameter(const std::string &name, const std::string &value)
+{
+	using namespace brian;
+
+	std::istringstream value_stream(value);
+	{% for (name, dtype_spec, default) in parameter_specs %}
+	if(name == "{{name}}")
+	{
+		value_stream >> std::boolalpha >> _parameter_{{name}};
+		return _check_parsed(value_stream, name, value);
+	}
+	{% endfor %}
+	if(name == "seed")
+	{
+		value_stream >> _seed;
+		return _check_parsed(value_stream, name, value);
+	}
+	if(name == "results_dir")
+	{
+		_results_dir = value;
+		return true;
+	}
+	{% for (name, dtype_spec, N, filename) in static_array_specs | sort %}
+	if(name == "{{name}}")
+	{
+		_static_array_files[name] = value;
+		return true;
+	}
+	{% endfor %}
+	std::cerr << "Unknown parameter " << name << "." << std::endl;
+	return false;
+}
+
+bool _set_parameter_from_string(const std::string &argument)
+{
+	const size_t equal_sign = argument.find('=');
+	if(equal_sign == std::string::npos)
+	{
+		std::cerr << "Cannot parse parameter \"" << argument << "\", use name=value." << std::endl;
+		return false;
+	}
+	std::string name = argument.substr(0, equal_sign);
+	std::string value = argument.substr(equal_sign + 1);
+	// remove surrounding whitespace
+	name.erase(name.find_last_not_of(" \t") + 1);
+	name.erase(0, name.find_first_not_of(" \t"));
+	value.erase(value.find_last_not_of(" \t\r") + 1);
+	value.erase(0, value.find_first_not_of(" \t"));
+	return _set_parameter(name, value);
+}
+
+bool _read_parameters(int argc, char **argv)
+{
+	for(int i=1; i<argc; i++)
+	{
+		const std::string argument(argv[i]);
+		if(argument.size() > 0 && argument[0] == '@')
+		{
+			// a parameter file with one name=value entry per line, empty
+			// lines and lines starting with # are ignored
+			std::ifstream parameter_file(argument.substr(1).c_str());
+			if(!parameter_file.is_open())
+			{
+				std::cerr << "Error opening parameter file " << argument.substr(1) << "." << std::endl;
+				return false;
+			}
+			std::string line;
+			while(std::getline(parameter_file, line))
+			{
+				const size_t start = line.find_first_not_of(" \t\r");
+				if(start == std::string::npos || line[start] == '#')
+					continue;
+				if(!_set_parameter_from_string(line))
+					return false;
+			}
+		} else if(!_set_parameter_from_string(argument))
+			return false;
+	}
+	return true;
+}
+
 void _init_arrays()
 {
 	using namespace brian;
@@ -93,7 +198,10 @@ void _load_arrays()
 
 	{% for (name, dtype_spec, N, filename) in static_array_specs | sort %}
 	ifstream f{{name}};
-	f{{name}}.open("static_arrays/{{name}}", ios::in | ios::binary);
+	if(_static_array_files.count("{{name}}"))
+		f{{name}}.open(_static_array_files["{{name}}"].c_str(), ios::in | ios::binary);
+	else
+		f{{name}}.open("static_arrays/{{name}}", ios::in | ios::binary);
 	if(f{{name}}.is_open())
 	{
 		f{{name}}.read(reinterpret_cast<char*>({{name}}), {{N}}*sizeof({{dtype_spec}}));
@@ -111,7 +219,7 @@ void _write_arrays()
 	{% for var, varname in array_specs | dictsort(by='value') %}
 	{% if not (var in dynamic_array_specs or var in dynamic_array_2d_specs) %}
 	ofstream outfile_{{varname}};
-	outfile_{{varname}}.open("results/{{varname}}", ios::binary | ios::out);
+	outfile_{{varname}}.open((_results_dir + "/{{varname}}").c_str(), ios::binary | ios::out);
 	if(outfile_{{varname}}.is_open())
 	{
 		outfile_{{varname}}.write(reinterpret_cast<char*>({{varname}}), {{var.size}}*sizeof({{varname}}[0]));
@@ -125,7 +233,7 @@ void _write_arrays()
 
 	{% for var, varname in dynamic_array_specs | dictsort(by='value') %}
 	ofstream outfile_{{varname}};
-	outfile_{{varname}}.open("results/{{varname}}", ios::binary | ios::out);
+	outfile_{{varname}}.open((_results_dir + "/{{varname}}").c_str(), ios::binary | ios::out);
 	if(outfile_{{varname}}.is_open())
 	{
 		outfile_{{varname}}.write(reinterpret_cast<char*>(&{{varname}}[0]), {{varname}}.size()*sizeof({{varname}}[0]));
@@ -138,7 +246,7 @@ void _write_arrays()
 
 	{% for var, varname in dynamic_array_2d_specs | dictsort(by='value') %}
 	ofstream outfile_{{varname}};
-	outfile_{{varname}}.open("results/{{varname}}", ios::binary | ios::out);
+	outfile_{{varname}}.open((_results_dir + "/{{varname}}").c_str(), ios::binary | ios::out);
 	if(outfile_{{varname}}.is_open())
 	{
         for (int n=0; n<{{varname}}.n; n++)
@@ -187,6 +295,7 @@ void _dealloc_arrays()
 #define _BRIAN_OBJECTS_H
 
 #include<vector>
+#include<string>
 #include<stdint.h>
 #include "brianlib/synapses.h"
 #include "brianlib/clocks.h"
@@ -233,6 +342,13 @@ extern const int _num_{{name}};
 {% endif %}
 {% endfor %}
 
+//////////////// parameters /////////////
+{% for (name, dtype_spec, value) in parameter_specs %}
+extern {{dtype_spec}} _parameter_{{name}};
+{% endfor %}
+extern std::string _results_dir;
+extern long _seed;
+
 //////////////// synapses /////////////////
 {% for S in synapses | sort(attribute='name') %}
 // {{S.name}}
@@ -244,6 +360,7 @@ extern SynapticPathway<double> {{path.name}};
 
 }
 
+bool _read_parameters(int argc, char **argv);
 void _init_arrays();
 void _load_arrays();
 void _write_arrays();
@@ -10,6 +10,12 @@
 	const int _vectorisation_idx = -1;
 	{{scalar_code|autoindent}}
 
+	// Every neuron spikes at most once, the loop can therefore be parallelised
+	// (unless the code uses the random number functions, which are not
+	// thread-safe)
+	{% if not uses_random_numbers %}
+	#pragma omp parallel for schedule(static)
+	{% endif %}
 	for(int _index_spikes=0; _index_spikes<_num_spikes; _index_spikes++)
 	{
 	    // vector code
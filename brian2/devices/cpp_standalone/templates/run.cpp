@@ -15,7 +15,10 @@ void brian_start()
 {
 	_init_arrays();
 	_load_arrays();
-	srand((unsigned int)time(NULL));
+	if(brian::_seed >= 0)
+		srand((unsigned int)brian::_seed);
+	else
+		srand((unsigned int)time(NULL));
 }
 
 void brian_end()
@@ -6,6 +6,7 @@
 	//// MAIN CODE ////////////
 
 	// Set all the target variable values to zero
+	#pragma omp parallel for schedule(static)
 	for (int _target_idx=0; _target_idx<N_post; _target_idx++)
 	    {{_target_var_array}}[_target_idx] = 0.0;
 
@@ -13,11 +14,37 @@
 	const int _vectorisation_idx = -1;
 	{{scalar_code|autoindent}}
 
-	for(int _idx=0; _idx<_num_synaptic_post; _idx++)
+	// The synapses are partitioned by their target neurons, every partition
+	// is summed over by a single thread. The partitions only change if
+	// synapses are added.
+	{% if uses_random_numbers %}
+	// The random number functions are not thread-safe
+	const int _num_partitions = 1;
+	{% else %}
+	const int _num_partitions = omp_get_max_threads();
+	{% endif %}
+	static std::vector<int32_t> _partitioned;
+	static std::vector<long> _partition_start;
+	if (_num_partitions > 1 &&
+		((long)_partitioned.size() != _num_synaptic_post ||
+		 (int)_partition_start.size() != _num_partitions + 1))
+		_brian_partition_events(NULL, _num_synaptic_post, {{_synaptic_post}},
+		                        _num_partitions, _partitioned,
+		                        _partition_start);
+	{% if not uses_random_numbers %}
+	#pragma omp parallel for schedule(static)
+	{% endif %}
+	for(int _partition=0; _partition<_num_partitions; _partition++)
 	{
-	    // vector code
-	    const int _vectorisation_idx = _idx;
-        {{vector_code|autoindent}}
-		{{_target_var_array}}[{{_synaptic_post}}[_idx]] += _synaptic_var;
+		const long _start = _num_partitions > 1 ? _partition_start[_partition] : 0;
+		const long _end = _num_partitions > 1 ? _partition_start[_partition + 1] : _num_synaptic_post;
+		for(long _synapse=_start; _synapse<_end; _synapse++)
+		{
+			const int _idx = _num_partitions > 1 ? _partitioned[_synapse] : _synapse;
+			// vector code
+			const int _vectorisation_idx = _idx;
+			{{vector_code|autoindent}}
+			{{_target_var_array}}[{{_synaptic_post}}[_idx]] += _synaptic_var;
+		}
 	}
 {% endblock %}
@@ -1,8 +1,8 @@
 {% extends 'common_synapses.cpp' %}
 
 {% block maincode %}
-    // This is only needed for the _debugmsg function below
-    {# USES_VARIABLES { _synaptic_pre } #}
+    // _synaptic_pre is also needed for the _debugmsg function below
+    {# USES_VARIABLES { _synaptic_pre, _synaptic_post } #}
 	std::vector<int32_t> *_spiking_synapses = {{pathway.name}}.queue->peek();
 
 	// scalar code
@@ -10,14 +10,53 @@
 	{{scalar_code|autoindent}}
 
 	const unsigned int _num_spiking_synapses = _spiking_synapses->size();
-	for(unsigned int _spiking_synapse_idx=0;
-		_spiking_synapse_idx<_num_spiking_synapses;
-		_spiking_synapse_idx++)
+	{# Several synapses can target the same neuron. For parallel execution,
+	   the spiking synapses are partitioned by their target neurons (i.e.
+	   postsynaptic neurons for the pre pathway) and every partition is
+	   processed by a single thread. This is only safe if the code does not
+	   write to variables of the other side and does not use the random number
+	   functions (which are not thread-safe). #}
+	{% if pathway.prepost == 'pre' %}
+	{% set _partition_array, _other_index = _synaptic_post, '_presynaptic_idx' %}
+	{% else %}
+	{% set _partition_array, _other_index = _synaptic_pre, '_postsynaptic_idx' %}
+	{% endif %}
+	{% set _serial = [] %}
+	{% if uses_random_numbers %}
+	{% if _serial.append(1) %}{% endif %}
+	{% endif %}
+	{% for var in written_variables %}
+	{% if variable_indices[var] == _other_index %}
+	{% if _serial.append(1) %}{% endif %}
+	{% endif %}
+	{% endfor %}
+	{% if _serial %}
+	const int _num_partitions = 1;
+	{% else %}
+	const int _num_partitions = omp_get_max_threads();
+	{% endif %}
+	std::vector<int32_t> _partitioned;
+	std::vector<long> _partition_start;
+	if (_num_partitions > 1 && _num_spiking_synapses > 0)
+		_brian_partition_events(&(*_spiking_synapses)[0], _num_spiking_synapses,
+		                        {{_partition_array}}, _num_partitions,
+		                        _partitioned, _partition_start);
+	{% if not _serial %}
+	#pragma omp parallel for schedule(dynamic)
+	{% endif %}
+	for(int _partition=0; _partition<_num_partitions; _partition++)
 	{
-	    // vector code
-		const int32_t _idx = (*_spiking_synapses)[_spiking_synapse_idx];
-		const int32_t _vectorisation_idx = _idx;
-		{{vector_code|autoindent}}
+		const long _start = _num_partitions > 1 ? _partition_start[_partition] : 0;
+		const long _end = _num_partitions > 1 ? _partition_start[_partition + 1] : _num_spiking_synapses;
+		for(long _spiking_synapse_idx=_start;
+			_spiking_synapse_idx<_end;
+			_spiking_synapse_idx++)
+		{
+			const int32_t _idx = _num_partitions > 1 ? _partitioned[_spiking_synapse_idx] : (*_spiking_synapses)[_spiking_synapse_idx];
+			// vector code
+			const int32_t _vectorisation_idx = _idx;
+			{{vector_code|autoindent}}
+		}
 	}
 {% endblock %}
 
@@ -10,22 +10,49 @@
 	const int _vectorisation_idx = -1;
 	{{scalar_code|autoindent}}
 
-	long _cpp_numspikes = 0;
-	for(int _idx=0; _idx<N; _idx++)
+	// Every thread checks a contiguous range of neurons and stores the spikes
+	// at the beginning of its range in the spike space. The spikes are then
+	// moved together to keep them sorted. Without a parallel region (the
+	// random number functions are not thread-safe), this is done by a single
+	// thread.
+	std::vector<long> _thread_numspikes(omp_get_max_threads(), 0);
+	{% if not uses_random_numbers %}
+	#pragma omp parallel
+	{% endif %}
 	{
-	    // vector code
-	    const int _vectorisation_idx = _idx;
-        {{vector_code|autoindent}}
-		if(_cond) {
-			{{_spikespace}}[_cpp_numspikes++] = _idx;
-			{% if _uses_refractory %}
-			// We have to use the pointer names directly here: The condition
-			// might contain references to not_refractory or lastspike and in
-			// that case the names will refer to a single entry.
-			{{not_refractory}}[_idx] = false;
-			{{lastspike}}[_idx] = t;
-			{% endif %}
+		const int _thread = omp_get_thread_num();
+		const int _num_threads = omp_get_num_threads();
+		const int _start = (int)(((long)N * _thread) / _num_threads);
+		const int _end = (int)(((long)N * (_thread + 1)) / _num_threads);
+		long _cpp_numspikes = 0;
+		for(int _idx=_start; _idx<_end; _idx++)
+		{
+			// vector code
+			const int _vectorisation_idx = _idx;
+			{{vector_code|autoindent}}
+			if(_cond) {
+				{{_spikespace}}[_start + _cpp_numspikes++] = _idx;
+				{% if _uses_refractory %}
+				// We have to use the pointer names directly here: The condition
+				// might contain references to not_refractory or lastspike and in
+				// that case the names will refer to a single entry.
+				{{not_refractory}}[_idx] = false;
+				{{lastspike}}[_idx] = t;
+				{% endif %}
+			}
+		}
+		_thread_numspikes[_thread] = _cpp_numspikes;
+		#pragma omp barrier
+		#pragma omp single
+		{
+			long _cpp_numspikes = _thread_numspikes[0];
+			for(int _other_thread=1; _other_thread<_num_threads; _other_thread++)
+			{
+				const int _other_start = (int)(((long)N * _other_thread) / _num_threads);
+				for(long _j=0; _j<_thread_numspikes[_other_thread]; _j++)
+					{{_spikespace}}[_cpp_numspikes++] = {{_spikespace}}[_other_start + _j];
+			}
+			{{_spikespace}}[N] = _cpp_numspikes;
 		}
 	}
-	{{_spikespace}}[N] = _cpp_numspikes;
 {% endblock %}
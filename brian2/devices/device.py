@@ -8,6 +8,7 @@ import numpy as np
 
 from brian2.memory.dynamicarray import DynamicArray, DynamicArray1D
 from brian2.codegen.targets import codegen_targets
+from brian2.codegen.cache import get_code_cache, code_object_cache_key
 from brian2.codegen.runtime.numpy_rt import NumpyCodeObject
 from brian2.core.names import find_name
 from brian2.core.preferences import brian_prefs
@@ -48,6 +49,10 @@ class Device(object):
     '''
     Base Device object.
     '''
+    #: Whether the generated code can be stored in the code cache (see
+    #: `brian2.codegen.cache`)
+    use_code_cache = False
+
     def __init__(self):
         pass
 
@@ -164,7 +169,8 @@ class Device(object):
                                                   iterate_all=iterate_all,
                                                   codeobj_class=codeobj_class,
                                                   override_conditional_write=override_conditional_write,
-                                                  allows_scalar_write=template.allows_scalar_write)
+                                                  allows_scalar_write=template.allows_scalar_write,
+                                                  uses_scalar_code=template.uses_scalar_code)
         if template_kwds is None:
             template_kwds = dict()
         else:
@@ -177,7 +183,7 @@ class Device(object):
                     value.implementations[codeobj_class]
                 except KeyError as ex:
                     # if we are dealing with numpy, add the default implementation
-                    if codeobj_class is NumpyCodeObject:
+                    if issubclass(codeobj_class, NumpyCodeObject):
                         value.implementations.add_numpy_implementation(value.pyfunc)
                     else:
                         raise NotImplementedError(('Cannot use function '
@@ -185,6 +191,30 @@ class Device(object):
 
         logger.debug('%s abstract code:\n%s' % (name, indent(code_representation(abstract_code))))
 
+        name = find_name(name)
+
+        code_cache = get_code_cache() if self.use_code_cache else None
+        cache_key = None
+        cached = None
+        if code_cache is not None:
+            cache_key = code_object_cache_key(codeobj_class, template_name,
+                                              name, abstract_code, variables,
+                                              variable_indices, template_kwds,
+                                              override_conditional_write,
+                                              generator, owner)
+            if cache_key is not None:
+                cached = code_cache.get(cache_key)
+
+        if cached is not None:
+            code, compiled_data = cached
+            logger.debug('%s code loaded from cache (key %s)' % (name, cache_key))
+            # The translation would have replaced the functions in the
+            # variables by the objects the code uses
+            generator.replace_function_variables()
+            codeobj = codeobj_class(owner, code, variables, name=name)
+            codeobj.load_compiled_data(compiled_data)
+            return codeobj
+
         scalar_code, vector_code, kwds = generator.translate(abstract_code,
                                                              dtype=brian_prefs['core.default_float_dtype'])
         # Add the array names as keywords as well
@@ -202,8 +232,6 @@ class Device(object):
         logger.debug('%s snippet (scalar):\n%s' % (name, indent(code_representation(scalar_code))))
         logger.debug('%s snippet (vector):\n%s' % (name, indent(code_representation(vector_code))))
 
-        name = find_name(name)
-
         code = template(scalar_code, vector_code,
                         owner=owner, variables=variables, codeobj_name=name,
                         variable_indices=variable_indices,
@@ -213,6 +241,8 @@ class Device(object):
 
         codeobj = codeobj_class(owner, code, variables, name=name)
         codeobj.compile()
+        if cache_key is not None:
+            code_cache.set(cache_key, code, codeobj.get_compiled_data())
         return codeobj
     
     def activate(self):
@@ -237,6 +267,8 @@ class Device(object):
 class RuntimeDevice(Device):
     '''
     '''
+    use_code_cache = True
+
     def __init__(self):
         super(Device, self).__init__()
         #: Mapping from `Variable` objects to numpy arrays (or `DynamicArray`
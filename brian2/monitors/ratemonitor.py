@@ -2,8 +2,10 @@ import numpy as np
 
 from brian2.core.scheduler import Scheduler
 from brian2.core.variables import Variables
+from brian2.devices.device import get_device, RuntimeDevice
 from brian2.units.allunits import second, hertz
-from brian2.units.fundamentalunits import Unit, Quantity
+from brian2.units.fundamentalunits import (Unit, Quantity,
+                                           fail_for_dimension_mismatch)
 from brian2.groups.group import CodeRunner, Group
 
 __all__ = ['PopulationRateMonitor']
@@ -23,11 +25,16 @@ class PopulationRateMonitor(Group, CodeRunner):
         ``source.name+'_ratemonitor_0'``, etc.
     codeobj_class : class, optional
         The `CodeObject` class to run code with.
+    history : `Quantity`, optional
+        Only keep the rates recorded during this duration (rounded to a number
+        of time steps) in a circular buffer of fixed size, older rates are
+        overwritten. The rates are still returned in chronological order. Not
+        supported for standalone devices. By default, all rates are kept.
     '''
     invalidates_magic_network = False
     add_to_magic_network = True
     def __init__(self, source, name='ratemonitor*',
-                 codeobj_class=None):
+                 codeobj_class=None, history=None):
 
         #: The group we are recording from
         self.source = source
@@ -40,6 +47,25 @@ class PopulationRateMonitor(Group, CodeRunner):
 
         self.add_dependency(source)
 
+        #: The number of time steps that are kept in a circular buffer (or
+        #: ``None`` if all rates are kept)
+        self.history_size = None
+        if history is not None:
+            if not isinstance(get_device(), RuntimeDevice):
+                raise NotImplementedError('The history argument is only '
+                                          'supported with the runtime '
+                                          'device.')
+            fail_for_dimension_mismatch(history, second,
+                                        'history has to be a time')
+            self.history_size = max(int(round(float(history /
+                                                    source.clock.dt))), 1)
+        # Whether the circular buffer has been filled completely, i.e.
+        # whether the oldest rates start at the current position
+        self._history_full = False
+        #: The number of recorded time steps during a run, when the arrays are
+        #: larger than the recorded values (see `reserve`). ``None`` otherwise.
+        self._num_recorded = None
+
         self.variables = Variables(self)
         self.variables.add_reference('_spikespace', source)
         self.variables.add_reference('_clock_t', source, 't')
@@ -56,12 +82,60 @@ class PopulationRateMonitor(Group, CodeRunner):
 
     @property
     def _N(self):
+        if self._history_full:
+            return self.history_size
+        if self._num_recorded is not None:
+            return self._num_recorded
         return len(self.variables['t'].get_value())
 
+    def _get_recorded_values(self, varname):
+        '''
+        Return the recorded values (without units) for ``'t'`` or ``'rate'``
+        in chronological order.
+        '''
+        values = self.variables[varname].get_value()
+        if self._history_full:
+            return np.concatenate([values[self._num_recorded:],
+                                   values[:self._num_recorded]])
+        return values[:self._N].copy()
+
     def resize(self, new_size):
         self.variables['rate'].resize(new_size)
         self.variables['t'].resize(new_size)
 
+    def reserve(self):
+        '''
+        Enlarge the arrays storing the rates, so that they can store the rates
+        for all the remaining time steps of the current run (or for the
+        ``history`` of the monitor, the arrays are then used as a circular
+        buffer). Called by the templates, see `StateMonitor.reserve`.
+
+        Returns
+        -------
+        index : int
+            The index for the rate of the current time step.
+        '''
+        if self.history_size is not None:
+            if self.variables['t'].get_value().shape[0] == self.history_size:
+                self._history_full = True
+            else:
+                self.resize(self.history_size)
+            self._num_recorded = 0
+            return 0
+        remaining_steps = max(int(self.clock.i_end) - int(self.clock.i), 1)
+        num_recorded = self._N
+        self.resize(num_recorded + remaining_steps)
+        self._num_recorded = num_recorded
+        return num_recorded
+
+    def after_run(self):
+        if self.history_size is not None:
+            # Continue at the current position of the circular buffer
+            return
+        if self._num_recorded is not None:
+            self.resize(self._num_recorded)
+            self._num_recorded = None
+
     def __len__(self):
         return self._N
 
@@ -71,6 +145,28 @@ class PopulationRateMonitor(Group, CodeRunner):
         '''
         raise NotImplementedError()
 
+    def __getattr__(self, item):
+        # We do this because __setattr__ and __getattr__ are not active until
+        # _group_attribute_access_active attribute is set, and if it is set,
+        # then __getattr__ will not be called. Therefore, if getattr is called
+        # with this name, it is because it hasn't been set yet and so this
+        # method should raise an AttributeError to agree that it hasn't been
+        # called yet.
+        if item == '_group_attribute_access_active':
+            raise AttributeError
+        if not hasattr(self, '_group_attribute_access_active'):
+            raise AttributeError
+        if (item in ('t', 't_', 'rate', 'rate_') and
+                self._num_recorded is not None):
+            # Access during a run (the arrays might be larger than the number
+            # of recorded values) or to the circular buffer
+            values = self._get_recorded_values(item.rstrip('_'))
+            if item.endswith('_'):
+                return values
+            unit = second if item == 't' else hertz
+            return Quantity(values, dim=unit.dim)
+        return Group.__getattr__(self, item)
+
     def __repr__(self):
         description = '<{classname}, recording {source}>'
         return description.format(classname=self.__class__.__name__,
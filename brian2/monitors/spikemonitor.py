@@ -2,10 +2,14 @@ import numpy as np
 
 from brian2.core.scheduler import Scheduler
 from brian2.core.variables import Variables
+from brian2.devices.device import get_device, RuntimeDevice
 from brian2.units.allunits import second
-from brian2.units.fundamentalunits import Unit, Quantity
+from brian2.units.fundamentalunits import (Unit, Quantity,
+                                           fail_for_dimension_mismatch)
 from brian2.groups.group import CodeRunner, Group
 
+from .storage import open_storage
+
 __all__ = ['SpikeMonitor']
 
 
@@ -28,11 +32,25 @@ class SpikeMonitor(Group, CodeRunner):
         ``source.name+'_spikemonitor_0'``, etc.
     codeobj_class : class, optional
         The `CodeObject` class to run code with.
+    storage : str or `MonitorStorage`, optional
+        Write the recorded spikes to disk during the run, only keeping a
+        block of spikes in memory. Either a `MonitorStorage` object or a
+        filename, see `open_storage`. Not supported for standalone devices.
+        By default, all spikes are kept in memory.
+    history : `Quantity`, optional
+        Only keep the spikes of the last ``history/dt`` recorded time steps
+        (i.e. the same time steps as a `StateMonitor` with the same
+        ``history``). Older spikes are discarded when new spikes are
+        recorded, the arrays storing the spikes are then reused without
+        reallocating them, i.e. the memory usage only depends on the number
+        of spikes during the ``history``. Note that `count` still counts all
+        spikes. Cannot be combined with ``storage`` and not supported for
+        standalone devices. By default, all spikes are kept.
     '''
     invalidates_magic_network = False
     add_to_magic_network = True
     def __init__(self, source, record=True, when=None, name='spikemonitor*',
-                 codeobj_class=None):
+                 codeobj_class=None, storage=None, history=None):
         self.record = bool(record)
         #: The source we are recording from
         self.source =source
@@ -68,16 +86,117 @@ class SpikeMonitor(Group, CodeRunner):
         self.variables.add_attribute_variable('N', unit=Unit(1), obj=self,
                                               attribute='_N', dtype=np.int32)
 
+        #: The `MonitorStorage` where the recorded spikes are written to
+        #: (or ``None``)
+        self.storage = None
+        #: The number of spikes written to the storage
+        self._num_stored = 0
+        if storage is not None:
+            self.storage = open_storage(storage)
+            self.storage.add('i', np.int32)
+            self.storage.add('t', np.float64)
+
+        #: The duration for which spikes are kept (or ``None`` if all spikes
+        #: are kept)
+        self.history = None
+        if history is not None:
+            if not isinstance(get_device(), RuntimeDevice):
+                raise NotImplementedError('The history argument is only '
+                                          'supported with the runtime '
+                                          'device.')
+            if storage is not None:
+                raise ValueError('Cannot use a storage and a history at the '
+                                 'same time.')
+            fail_for_dimension_mismatch(history, second,
+                                        'history has to be a time')
+            self.history = history
+        # The time of the last time step recorded in a previous run (or
+        # ``None`` during a run)
+        self._last_recorded_t = None
+
         self._enable_group_attributes()
 
     @property
     def _N(self):
-        return len(self.variables['t'].get_value())
+        if self.history is not None:
+            return len(self.variables['t'].get_value()) - self._num_expired()
+        return self._num_stored + len(self.variables['t'].get_value())
+
+    def _num_expired(self, last_t=None):
+        '''
+        Return the number of spikes in memory that are older than the
+        ``history`` (they are stored at the start of the arrays).
+
+        Parameters
+        ----------
+        last_t : float, optional
+            The time of the most recent time step that belongs to the
+            history. Defaults to the last recorded time step, i.e. the same
+            time steps as for `StateMonitor` and `PopulationRateMonitor` with
+            the same ``history`` are kept.
+        '''
+        if last_t is None:
+            last_t = self._last_recorded_t
+        if last_t is None:
+            # During a run, the current time step is not yet recorded
+            last_t = self.clock.t_ - self.clock.dt_
+        # Spikes are kept for the time steps within the history, the half time
+        # step avoids rounding issues
+        threshold = last_t - float(self.history) + 0.5*self.clock.dt_
+        return np.searchsorted(self.variables['t'].get_value(), threshold)
 
     def resize(self, new_size):
+        '''
+        Resize the arrays storing the spikes in memory. If the monitor uses a
+        storage and the new size exceeds its block size, the spikes in memory
+        are written to the storage first and the arrays are only resized for
+        the additional spikes, i.e. new spikes have to be stored at the end
+        of the arrays. Similarly, spikes older than the ``history`` of the
+        monitor are removed from the start of the arrays.
+        '''
+        num_in_memory = len(self.variables['t'].get_value())
+        if self.history is not None:
+            # The current time step is being recorded
+            num_expired = self._num_expired(last_t=self.clock.t_)
+            # Only move the remaining spikes if this removes at least as many
+            # spikes as it moves, i.e. each spike is moved once on average
+            if num_expired > 0 and 2*num_expired >= num_in_memory:
+                for varname in ('i', 't'):
+                    values = self.variables[varname].get_value()
+                    values[:num_in_memory-num_expired] = values[num_expired:]
+                new_size -= num_expired
+        if (self.storage is not None and num_in_memory > 0 and
+                new_size > self.storage.block_size):
+            self.flush()
+            new_size -= num_in_memory
         self.variables['i'].resize(new_size)
         self.variables['t'].resize(new_size)
 
+    def flush(self):
+        '''
+        Write the spikes that are currently stored in memory to the storage.
+        Does nothing if the monitor does not use a storage.
+        '''
+        if self.storage is None:
+            return
+        num_in_memory = len(self.variables['t'].get_value())
+        if num_in_memory:
+            self.storage.append('i', self.variables['i'].get_value())
+            self.storage.append('t', self.variables['t'].get_value())
+            self._num_stored += num_in_memory
+            self.variables['i'].resize(0)
+            self.variables['t'].resize(0)
+
+    def before_run(self, run_namespace=None, level=0):
+        self._last_recorded_t = None
+        super(SpikeMonitor, self).before_run(run_namespace, level=level+1)
+
+    def after_run(self):
+        # The history refers to the last recorded time step, even if the clock
+        # is changed after the run
+        self._last_recorded_t = self.clock.t_ - self.clock.dt_
+        self.flush()
+
     def __len__(self):
         return self._N
 
@@ -87,6 +206,36 @@ class SpikeMonitor(Group, CodeRunner):
         '''
         raise NotImplementedError()
 
+    def __getattr__(self, item):
+        # We do this because __setattr__ and __getattr__ are not active until
+        # _group_attribute_access_active attribute is set, and if it is set,
+        # then __getattr__ will not be called. Therefore, if getattr is called
+        # with this name, it is because it hasn't been set yet and so this
+        # method should raise an AttributeError to agree that it hasn't been
+        # called yet.
+        if item == '_group_attribute_access_active':
+            raise AttributeError
+        if not hasattr(self, '_group_attribute_access_active'):
+            raise AttributeError
+        if self.history is not None and item in ('i', 't', 't_'):
+            # Only return the spikes within the history
+            num_expired = self._num_expired()
+            if item == 'i':
+                return self.variables['i'].get_value()[num_expired:].copy()
+            values = self.variables['t'].get_value()[num_expired:].copy()
+            if item == 't':
+                return Quantity(values, dim=second.dim)
+            return values
+        if self.storage is not None and item in ('i', 't', 't_'):
+            self.flush()
+            if item == 'i':
+                return self.storage.read('i')
+            values = self.storage.read('t')
+            if item == 't':
+                return Quantity(values, dim=second.dim)
+            return values
+        return Group.__getattr__(self, item)
+
     # TODO: Maybe there's a more elegant solution for the count attribute?
     @property
     def count(self):
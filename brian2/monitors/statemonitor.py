@@ -4,11 +4,15 @@ import numpy as np
 
 from brian2.core.variables import (Variables, Subexpression, get_dtype)
 from brian2.core.scheduler import Scheduler
+from brian2.devices.device import get_device, RuntimeDevice
 from brian2.groups.group import Group, CodeRunner
 from brian2.utils.logger import get_logger
-from brian2.units.fundamentalunits import Unit, Quantity
+from brian2.units.fundamentalunits import (Unit, Quantity,
+                                           fail_for_dimension_mismatch)
 from brian2.units.allunits import second
 
+from .storage import open_storage
+
 __all__ = ['StateMonitor']
 
 logger = get_logger(__name__)
@@ -35,15 +39,15 @@ class StateMonitorView(object):
 
         mon = self.monitor
         if item == 't':
-            return Quantity(mon.variables['t'].get_value(), dim=second.dim)
+            return Quantity(mon._get_recorded_values('t'), dim=second.dim)
         elif item == 't_':
-            return mon.variables['t'].get_value()
+            return mon._get_recorded_values('t')
         elif item in mon.record_variables:
             unit = mon.variables[item].unit
-            return Quantity(mon.variables['_recorded_'+item].get_value().T[self.indices],
+            return Quantity(mon._get_recorded_values(item).T[self.indices],
                             dim=unit.dim, copy=True)
         elif item.endswith('_') and item[:-1] in mon.record_variables:
-            return mon.variables['_recorded_'+item[:-1]].get_value().T[self.indices].copy()
+            return mon._get_recorded_values(item[:-1]).T[self.indices].copy()
         else:
             raise AttributeError('Unknown attribute %s' % item)
 
@@ -112,6 +116,38 @@ class StateMonitor(Group, CodeRunner):
         ``source.name+'statemonitor_0'``, etc.
     codeobj_class : `CodeObject`, optional
         The `CodeObject` class to create.
+    storage : str or `MonitorStorage`, optional
+        Write the recorded values to disk during the run, only keeping a
+        block of values in memory. Either a `MonitorStorage` object or a
+        filename, see `open_storage`. The recorded values are then read from
+        the storage when they are accessed. Not supported for standalone
+        devices. By default, all values are kept in memory.
+    every : int, optional
+        Only record values once for every window of ``every`` time steps.
+        Without a ``reduction``, the values of the first time step of each
+        window are recorded. Defaults to 1, i.e. every time step is recorded.
+    reduction : {None, 'mean', 'min', 'max'}, optional
+        Record the mean, the minimum or the maximum of the values over each
+        window of ``every`` time steps instead of the value of its first time
+        step. The recorded time is the time of the first time step of the
+        window. Values are only recorded for complete windows, an incomplete
+        window at the end of a run is continued in the next run. Use two
+        monitors with ``'min'`` and ``'max'`` to record an envelope.
+    population_mean : bool, optional
+        Record the mean over all recorded indices instead of the individual
+        values, the recorded values then have the shape ``(1, len(t))``.
+        Defaults to ``False``.
+    history : `Quantity`, optional
+        Only keep the values recorded during this duration (rounded to a
+        number of recorded time steps) in a circular buffer of fixed size,
+        older values are overwritten. The values are still returned in
+        chronological order. Cannot be combined with ``storage``. By default,
+        all recorded values are kept.
+
+    Notes
+    -----
+    The ``every``, ``reduction``, ``population_mean`` and ``history``
+    arguments are not supported for standalone devices.
 
     Examples
     --------
@@ -134,10 +170,30 @@ class StateMonitor(Group, CodeRunner):
     invalidates_magic_network = False
     add_to_magic_network = True
     def __init__(self, source, variables, record=None, when=None,
-                 name='statemonitor*', codeobj_class=None):
+                 name='statemonitor*', codeobj_class=None, storage=None,
+                 every=1, reduction=None, population_mean=False,
+                 history=None):
         self.source = source
         self.codeobj_class = codeobj_class
 
+        if int(every) != every or every < 1:
+            raise ValueError('every has to be a positive integer, is %s' % every)
+        if reduction not in (None, 'mean', 'min', 'max'):
+            raise ValueError(("reduction has to be None, 'mean', 'min' or "
+                              "'max', is %r") % (reduction, ))
+        #: Record values once for every window of this number of time steps
+        self.every = int(every)
+        #: The reduction over the time steps of a window (or ``None``)
+        self.reduction = reduction if self.every > 1 else None
+        #: Whether the mean over the recorded indices is recorded
+        self.population_mean = bool(population_mean)
+        if ((self.every != 1 or reduction is not None or
+                self.population_mean) and
+                not isinstance(get_device(), RuntimeDevice)):
+            raise NotImplementedError('The every, reduction and '
+                                      'population_mean arguments are only '
+                                      'supported with the runtime device.')
+
         # run by default on source clock at the end
         scheduler = Scheduler(when)
         if not scheduler.defined_clock:
@@ -145,6 +201,26 @@ class StateMonitor(Group, CodeRunner):
         if not scheduler.defined_when:
             scheduler.when = 'end'
 
+        #: The number of recorded time steps that are kept in a circular
+        #: buffer (or ``None`` if all values are kept)
+        self.history_size = None
+        if history is not None:
+            if not isinstance(get_device(), RuntimeDevice):
+                raise NotImplementedError('The history argument is only '
+                                          'supported with the runtime '
+                                          'device.')
+            if storage is not None:
+                raise ValueError('Cannot use a storage and a history at the '
+                                 'same time.')
+            fail_for_dimension_mismatch(history, second,
+                                        'history has to be a time')
+            self.history_size = max(int(round(float(history /
+                                                    (scheduler.clock.dt *
+                                                     self.every)))), 1)
+        # Whether the circular buffer has been filled completely, i.e.
+        # whether the oldest values start at the current position
+        self._history_full = False
+
         # variables should always be a list of strings
         if variables is True:
             variables = source.equations.names
@@ -168,6 +244,8 @@ class StateMonitor(Group, CodeRunner):
         #: The array of recorded indices
         self.indices = record
         self.n_indices = len(record)
+        # The number of values stored for every recorded time step
+        self._n_columns = 1 if self.population_mean else self.n_indices
 
         # Some dummy code so that code generation takes care of the indexing
         # and subexpressions
@@ -201,9 +279,16 @@ class StateMonitor(Group, CodeRunner):
                                  constant=True, read_only=True)
         self.variables['_indices'].set_value(self.indices)
 
+        if self.every > 1:
+            self.variables.add_array('_window_step', size=1, unit=Unit(1),
+                                     dtype=np.int32)
+        if self.reduction is not None:
+            self.variables.add_array('_window_t', size=1, unit=second)
+
         for varname in variables:
             var = source.variables[varname]
-            if var.scalar and len(self.indices) > 1:
+            if (var.scalar and len(self.indices) > 1 and
+                    not self.population_mean):
                 logger.warn(('Variable %s is a shared variable but it will be '
                              'recorded once for every target.' % varname),
                             once=True)
@@ -211,12 +296,23 @@ class StateMonitor(Group, CodeRunner):
             self.variables.add_reference(varname, source, varname, index=index)
             if not index in ('_idx', '0') and index not in variables:
                 self.variables.add_reference(index, source)
+            # Means of integer values are stored as floating point values
+            if ((self.reduction == 'mean' or self.population_mean) and
+                    not np.issubdtype(var.dtype, np.floating)):
+                dtype = np.float64
+            else:
+                dtype = var.dtype
             self.variables.add_dynamic_array('_recorded_' + varname,
-                                             size=(0, len(self.indices)),
+                                             size=(0, self._n_columns),
                                              unit=var.unit,
-                                             dtype=var.dtype,
+                                             dtype=dtype,
                                              constant=False,
                                              constant_size=False)
+            if self.reduction is not None:
+                # The values accumulated over the current window
+                self.variables.add_array('_window_' + varname,
+                                         size=self._n_columns, unit=var.unit,
+                                         dtype=dtype)
 
         for varname in self.record_variables:
             var = self.source.variables[varname]
@@ -232,13 +328,97 @@ class StateMonitor(Group, CodeRunner):
                           for varname in self.record_variables]
 
         self.needed_variables = recorded_names
+        if self.every > 1:
+            self.needed_variables.append('_window_step')
+        if self.reduction is not None:
+            window_variables = dict((varname,
+                                     self.variables['_window_' + varname])
+                                    for varname in self.record_variables)
+            self.needed_variables.append('_window_t')
+            self.needed_variables.extend('_window_' + varname
+                                         for varname in self.record_variables)
+        else:
+            window_variables = {}
         self.template_kwds = template_kwds={'_recorded_variables':
-                                            self.recorded_variables}
+                                            self.recorded_variables,
+                                            '_window_variables':
+                                            window_variables,
+                                            '_every': self.every,
+                                            '_reduction': self.reduction,
+                                            '_population_mean':
+                                            self.population_mean}
+        #: The number of recorded time steps in memory during a run, when the
+        #: arrays are larger than the recorded values (see `reserve`).
+        #: ``None`` otherwise.
+        self._num_recorded = None
+
+        #: The `MonitorStorage` where the recorded values are written to
+        #: (or ``None``)
+        self.storage = None
+        #: The number of time steps written to the storage
+        self._num_stored = 0
+        if storage is not None:
+            self.storage = open_storage(storage)
+            self.storage.add('t', np.float64)
+            for varname in self.record_variables:
+                self.storage.add(varname,
+                                 self.recorded_variables[varname].dtype,
+                                 (self._n_columns, ))
+
         self._enable_group_attributes()
 
     @property
     def _N(self):
-        return self.variables['t'].get_value().shape[0]
+        if self._history_full:
+            return self.history_size
+        if self._num_recorded is not None:
+            num_in_memory = self._num_recorded
+        else:
+            num_in_memory = self.variables['t'].get_value().shape[0]
+        return self._num_stored + num_in_memory
+
+    def _get_recorded_values(self, varname):
+        '''
+        Return the recorded values (without units) for ``'t'`` or a recorded
+        variable, with the time as the first dimension.
+        '''
+        if varname == 't':
+            var = self.variables['t']
+        else:
+            var = self.variables['_recorded_' + varname]
+        if self._history_full:
+            # The oldest values start at the current position of the
+            # circular buffer
+            values = var.get_value()
+            return np.concatenate([values[self._num_recorded:],
+                                   values[:self._num_recorded]])
+        if self.storage is None:
+            return var.get_value()[:self._N]
+        self.flush()
+        return self.storage.read(varname)
+
+    def flush(self):
+        '''
+        Write the values that are currently stored in memory to the storage.
+        Does nothing if the monitor does not use a storage.
+        '''
+        if self.storage is None:
+            return
+        if self._num_recorded is not None:
+            num_in_memory = self._num_recorded
+        else:
+            num_in_memory = self.variables['t'].get_value().shape[0]
+        if num_in_memory:
+            self.storage.append('t', self.variables['t'].get_value()[:num_in_memory])
+            for varname in self.record_variables:
+                values = self.variables['_recorded_' + varname].get_value()
+                self.storage.append(varname, values[:num_in_memory])
+            self._num_stored += num_in_memory
+        if self._num_recorded is not None:
+            # Keep the allocated arrays during a run
+            self._num_recorded = 0
+        else:
+            self.resize(0)
 
     def __len__(self):
         return self._N
@@ -247,12 +427,64 @@ class StateMonitor(Group, CodeRunner):
         self.variables['t'].resize(new_size)
 
         for var in self.recorded_variables.values():
-            var.resize((new_size, self.n_indices))
+            var.resize((new_size, self._n_columns))
+
+    def reserve(self):
+        '''
+        Enlarge the arrays storing the recorded values, so that they can store
+        the values for all the remaining time steps of the current run. This
+        is called by the templates instead of resizing the arrays for every
+        time step, the arrays are resized to the number of recorded values
+        after the run.
+
+        For a monitor with a ``history``, the arrays are only allocated once
+        for the size of the circular buffer. When they are full, the values
+        are stored from the beginning of the arrays again.
+
+        Returns
+        -------
+        index : int
+            The index for the values of the current time step.
+        '''
+        if self.history_size is not None:
+            if self.variables['t'].get_value().shape[0] == self.history_size:
+                self._history_full = True
+            else:
+                self.resize(self.history_size)
+            self._num_recorded = 0
+            return 0
+        remaining_steps = max(int(self.clock.i_end) - int(self.clock.i), 1)
+        if self.every > 1:
+            # The number of remaining windows (at most one more than the
+            # number of complete windows)
+            remaining_steps = remaining_steps // self.every + 1
+        if self.storage is not None:
+            # Only keep a block of values in memory
+            self.flush()
+            self.resize(min(remaining_steps, self.storage.block_size))
+            self._num_recorded = 0
+            return 0
+        num_recorded = self._N
+        self.resize(num_recorded + remaining_steps)
+        self._num_recorded = num_recorded
+        return num_recorded
+
+    def after_run(self):
+        if self.history_size is not None:
+            # Continue at the current position of the circular buffer
+            return
+        if self._num_recorded is not None:
+            self.resize(self._num_recorded)
+            self._num_recorded = None
+        self.flush()
 
     def reinit(self):
         raise NotImplementedError()
 
     def __getitem__(self, item):
+        if self.population_mean:
+            raise IndexError('Cannot index a monitor recording the population '
+                             'mean.')
         dtype = get_dtype(item)
         if np.issubdtype(dtype, np.int):
             return StateMonitorView(self, item)
@@ -279,10 +511,18 @@ class StateMonitor(Group, CodeRunner):
             raise AttributeError
         if item in self.record_variables:
             unit = self.variables[item].unit
-            return Quantity(self.variables['_recorded_'+item].get_value().T,
-                            dim=unit.dim, copy=True)
+            return Quantity(self._get_recorded_values(item).T,
+                            dim=unit.dim, copy=self.storage is None)
         elif item.endswith('_') and item[:-1] in self.record_variables:
-            return self.variables['_recorded_'+item[:-1]].get_value().T
+            return self._get_recorded_values(item[:-1]).T
+        elif item in ('t', 't_') and (self._num_recorded is not None or
+                                      self.storage is not None):
+            # Access during a run (the array might be larger than the number
+            # of recorded values) or to values in the storage
+            t = self._get_recorded_values('t')
+            if item == 't':
+                return Quantity(t, dim=second.dim, copy=self.storage is None)
+            return t
         else:
             return Group.__getattr__(self, item)
 
@@ -0,0 +1,238 @@
+'''
+Module providing storage backends that write the values recorded by monitors
+to disk during a run (see `StateMonitor` and `SpikeMonitor`).
+
+A monitor using a storage only keeps a block of recorded values in memory
+and appends it to the storage when it is full, the memory usage is therefore
+bounded independent of the length of the run.
+'''
+import os
+import struct
+
+import numpy as np
+
+from brian2.devices.device import get_device, RuntimeDevice
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+__all__ = ['MonitorStorage', 'NpyStorage', 'HDF5Storage', 'open_storage']
+
+
+class MonitorStorage(object):
+    '''
+    Base class for the storage of recorded values. Each recorded variable is
+    stored as an array that can be appended to along its first dimension.
+
+    Parameters
+    ----------
+    block_size : int, optional
+        The maximum number of records (time steps for a `StateMonitor`,
+        spikes for a `SpikeMonitor`) that the monitor keeps in memory before
+        appending them to the storage. Defaults to 10000.
+    '''
+    def __init__(self, block_size=10000):
+        if block_size < 1:
+            raise ValueError('block_size has to be positive, is %d' % block_size)
+        self.block_size = int(block_size)
+        #: The dtype and the shape of a single record for each array
+        self.arrays = {}
+
+    def add(self, name, dtype, shape=()):
+        '''
+        Register an array in the storage.
+
+        Parameters
+        ----------
+        name : str
+            The name of the array.
+        dtype : `dtype`
+            The dtype of the stored values.
+        shape : tuple of int, optional
+            The shape of a single record, e.g. ``(n, )`` for ``n`` values per
+            time step. Defaults to ``()``, i.e. a single value per record.
+        '''
+        if name in self.arrays:
+            raise KeyError('An array with the name %s already exists' % name)
+        self.arrays[name] = (np.dtype(dtype), tuple(shape))
+
+    def empty(self, name):
+        '''
+        Return an empty array with the dtype and shape of the array ``name``.
+        '''
+        dtype, shape = self.arrays[name]
+        return np.zeros((0, ) + shape, dtype=dtype)
+
+    def append(self, name, values):
+        '''
+        Append values to a stored array.
+
+        Parameters
+        ----------
+        name : str
+            The name of the array (as given to `add`).
+        values : `ndarray`
+            The values to append, the first dimension is the number of
+            records.
+        '''
+        raise NotImplementedError()
+
+    def read(self, name):
+        '''
+        Return all stored values of an array. Implementations should avoid
+        loading the values into memory if possible.
+        '''
+        raise NotImplementedError()
+
+    def close(self):
+        '''
+        Close all open files.
+        '''
+        pass
+
+
+class NpyStorage(MonitorStorage):
+    '''
+    Store recorded values in ``.npy`` files (one file per recorded variable)
+    in a directory. Stored values are accessed via memory-mapping, i.e. they
+    are only read from disk when they are used.
+
+    Parameters
+    ----------
+    directory : str
+        The directory where the files are stored, will be created if it does
+        not exist. Existing files for the recorded variables are overwritten.
+    block_size : int, optional
+        See `MonitorStorage`.
+    '''
+    # The size of the header of the .npy files. It is chosen so that the
+    # shape can be updated in place and the data is aligned.
+    header_size = 128
+
+    def __init__(self, directory, block_size=10000):
+        super(NpyStorage, self).__init__(block_size=block_size)
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        # The number of records in each file
+        self._sizes = {}
+
+    def filename(self, name):
+        return os.path.join(self.directory, name + '.npy')
+
+    def add(self, name, dtype, shape=()):
+        super(NpyStorage, self).add(name, dtype, shape)
+        with open(self.filename(name), 'wb') as f:
+            self._write_header(f, name, 0)
+        self._sizes[name] = 0
+
+    def _write_header(self, f, name, size):
+        dtype, shape = self.arrays[name]
+        header = repr({'descr': np.lib.format.dtype_to_descr(dtype),
+                       'fortran_order': False,
+                       'shape': (size, ) + shape})
+        # magic string, version 1.0 and the length of the header
+        preamble = np.lib.format.magic(1, 0)
+        header_len = self.header_size - len(preamble) - 2
+        header = header.ljust(header_len - 1) + '\n'
+        if len(header) > header_len:
+            raise ValueError('Cannot store the header for array %s' % name)
+        f.seek(0)
+        f.write(preamble)
+        f.write(struct.pack('<H', header_len))
+        f.write(header.encode('latin1'))
+
+    def append(self, name, values):
+        dtype, shape = self.arrays[name]
+        values = np.asarray(values, dtype=dtype)
+        if len(values) == 0:
+            return
+        new_size = self._sizes[name] + len(values)
+        with open(self.filename(name), 'r+b') as f:
+            f.seek(0, os.SEEK_END)
+            values.tofile(f)
+            self._write_header(f, name, new_size)
+        self._sizes[name] = new_size
+
+    def read(self, name):
+        if self._sizes[name] == 0:
+            # Empty files cannot be memory-mapped
+            return self.empty(name)
+        return np.load(self.filename(name), mmap_mode='r')
+
+
+class HDF5Storage(MonitorStorage):
+    '''
+    Store recorded values as datasets in a HDF5 file (requires the ``h5py``
+    package). Note that the stored values are read into memory when they are
+    accessed.
+
+    Parameters
+    ----------
+    filename : str
+        The name of the HDF5 file, an existing file will be overwritten.
+    block_size : int, optional
+        See `MonitorStorage`.
+    '''
+    def __init__(self, filename, block_size=10000):
+        if h5py is None:
+            raise ImportError('Storing recorded values in HDF5 files requires '
+                              'the h5py package.')
+        super(HDF5Storage, self).__init__(block_size=block_size)
+        self.filename = os.path.abspath(os.path.expanduser(filename))
+        self.file = h5py.File(self.filename, 'w')
+
+    def add(self, name, dtype, shape=()):
+        super(HDF5Storage, self).add(name, dtype, shape)
+        self.file.create_dataset(name, shape=(0, ) + tuple(shape),
+                                 maxshape=(None, ) + tuple(shape),
+                                 dtype=dtype, chunks=True)
+
+    def append(self, name, values):
+        if len(values) == 0:
+            return
+        dataset = self.file[name]
+        old_size = dataset.shape[0]
+        dataset.resize(old_size + len(values), axis=0)
+        dataset[old_size:] = values
+        self.file.flush()
+
+    def read(self, name):
+        return self.file[name][...]
+
+    def close(self):
+        self.file.close()
+
+
+def open_storage(storage):
+    '''
+    Return a `MonitorStorage` for the ``storage`` argument of a monitor.
+
+    Parameters
+    ----------
+    storage : str or `MonitorStorage`
+        A storage object (which is returned unchanged) or a filename. Files
+        ending in ``.h5`` or ``.hdf5`` use a `HDF5Storage`, all other names
+        are used as a directory for a `NpyStorage`.
+
+    Raises
+    ------
+    NotImplementedError
+        If the current device is not the runtime device, standalone devices
+        do not support writing recorded values to a storage.
+    '''
+    if not isinstance(get_device(), RuntimeDevice):
+        raise NotImplementedError('Monitors can only write their values to a '
+                                  'storage with the runtime device.')
+    if isinstance(storage, MonitorStorage):
+        return storage
+    elif isinstance(storage, basestring):
+        if os.path.splitext(storage)[1].lower() in ('.h5', '.hdf5'):
+            return HDF5Storage(storage)
+        else:
+            return NpyStorage(storage)
+    else:
+        raise TypeError(('storage has to be a filename or a MonitorStorage '
+                         'object, is type %s instead.') % type(storage))
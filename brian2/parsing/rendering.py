@@ -6,6 +6,7 @@ from brian2.core.functions import DEFAULT_FUNCTIONS, DEFAULT_CONSTANTS
 
 __all__ = ['NodeRenderer',
            'NumpyNodeRenderer',
+           'NumexprNodeRenderer',
            'CPPNodeRenderer',
            'SympyNodeRenderer'
            ]
@@ -166,6 +167,17 @@ class NumpyNodeRenderer(NodeRenderer):
             return 'logical_not(%s)' % self.render_node(node.operand)
         else:
             return NodeRenderer.render_UnaryOp(self, node)
+
+
+class NumexprNodeRenderer(NodeRenderer):
+    expression_ops = NodeRenderer.expression_ops.copy()
+    expression_ops.update({
+          # Unary ops
+          'Not': '~',
+          # Bool ops
+          'And': '&',
+          'Or': '|',
+          })
     
 
 class SympyNodeRenderer(NodeRenderer):
@@ -1,6 +1,8 @@
 from pyparsing import (CharsNotIn, Optional, Suppress, Word, Regex,
                        ParseException, alphas, nums)
 
+from brian2.utils.caching import memoize
+
 VARIABLE = Word(alphas + '_',
                   alphas + nums + '_').setResultsName('variable')
 
@@ -9,6 +11,7 @@ EXPR = CharsNotIn('#').setResultsName('expression')
 COMMENT = CharsNotIn('#').setResultsName('comment')
 STATEMENT = VARIABLE + OP + EXPR + Optional(Suppress('#') + COMMENT)
 
+@memoize(maxsize=10000)
 def parse_statement(code):
     '''
     Parses a single line of code into "var op expr".
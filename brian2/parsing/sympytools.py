@@ -6,8 +6,25 @@ from sympy.printing.str import StrPrinter
 
 from brian2.core.functions import DEFAULT_FUNCTIONS, DEFAULT_CONSTANTS, log10
 from brian2.parsing.rendering import SympyNodeRenderer
+from brian2.utils.caching import memoize
 
 
+def _sympy_key(sympy_expr):
+    # sympy considers e.g. 1 and 1.0 to be equal, use the full representation
+    # to distinguish them
+    return sympy.srepr(sympy_expr)
+
+
+@memoize(maxsize=1000, key=_sympy_key)
+def _simplify(sympy_expr):
+    try:
+        # unfortunately, simplifying does sometimes not work
+        return sympy_expr.simplify()
+    except AttributeError:
+        return sympy_expr
+
+
+@memoize(maxsize=10000)
 def str_to_sympy(expr):
     '''
     Parses a string into a sympy expression. There are two reasons for not
@@ -86,6 +103,7 @@ class CustomSympyPrinter(StrPrinter):
 PRINTER = CustomSympyPrinter()
 
 
+@memoize(maxsize=10000, key=_sympy_key)
 def sympy_to_str(sympy_expr):
     '''
     Converts a sympy expression into a string. This could be as easy as 
@@ -154,10 +172,5 @@ def replace_constants(sympy_expr, variables=None):
                 # TODO: We should handle variables of other data types better
                 float_val = var.get_value()
                 sympy_expr = sympy_expr.xreplace({symbol: sympy.Float(float_val)})
-    try:
-        # unfortunately, simplifying does sometimes not work
-        sympy_expr = sympy_expr.simplify()
-    except AttributeError:
-        pass
 
-    return sympy_expr
+    return _simplify(sympy_expr)
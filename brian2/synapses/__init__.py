@@ -2,4 +2,5 @@
 Package providing synapse support.
 '''
 
-from .synapses import *
\ No newline at end of file
+from .synapses import *
+from .spikequeue import BucketSpikeQueue
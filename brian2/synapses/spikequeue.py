@@ -10,7 +10,7 @@ import numpy as np
 from brian2.memory.dynamicarray import DynamicArray1D
 from brian2.utils.logger import get_logger
 
-__all__=['SpikeQueue']
+__all__=['SpikeQueue', 'BucketSpikeQueue']
 
 logger = get_logger(__name__)
 
@@ -53,6 +53,16 @@ class SpikeQueue(object):
     row index corresponding to the current timestep is `currentime`.
     Each element contains the target synapse index.    
     
+    **Synapse lookup**
+
+    The synapses of every presynaptic neuron are stored in a compressed sparse
+    row layout: `_synapse_indices` contains all synapse indices, sorted by
+    their presynaptic neuron, and the synapses of neuron ``k`` (relative to
+    the start of the source group) are
+    ``_synapse_indices[_synapse_indptr[k]:_synapse_indptr[k+1]]``. This allows
+    to look up the synapses of all spiking neurons with a single vectorised
+    gather.
+
     **Offsets**
     
     Offsets are used to solve the problem of inserting multiple synaptic events
@@ -84,6 +94,16 @@ class SpikeQueue(object):
         self.n = np.zeros(1, dtype=int)
         #: precalculated offsets
         self._offsets = None
+        #: synapse indices, sorted by presynaptic neuron (will be set in
+        #: `prepare`)
+        self._synapse_indices = np.zeros(0, dtype=np.int32)
+        #: start and end positions of each neuron's synapses in
+        #: `_synapse_indices` (will be set in `prepare`)
+        self._synapse_indptr = np.zeros(source_end - source_start + 1,
+                                        dtype=np.int32)
+        #: Buffer for the synapse indices of the spiking neurons, reused
+        #: across time steps
+        self._push_buffer = np.zeros(0, dtype=np.int32)
 
         #: The dt used for storing the spikes (will be set in `prepare`)
         self._dt = None
@@ -96,20 +116,12 @@ class SpikeQueue(object):
         delay in `delays`, if necessary. Offsets are calculated, unless
         the option `precompute_offsets` is set to ``False``. A flag is set if
         delays are homogeneous, in which case insertion will use a faster method
-        implemented in `insert_homogeneous`.        
+        implemented in `insert_homogeneous`. Spikes that are already stored
+        in the queue are only extracted and re-inserted if `dt` changed or if
+        the data structure has to be resized.
         '''
         n_synapses = len(synapse_sources)
 
-        if self._dt is not None:
-            # store the current spikes
-            spikes = self._extract_spikes()
-            # adapt the spikes to the new dt if it changed
-            if self._dt != dt:
-                spiketimes = spikes[:, 0] * self._dt
-                spikes[:, 0] = np.round(spiketimes / dt).astype(np.int)
-        else:
-            spikes = None
-
         if len(delays):
             delays = np.array(np.round(delays / dt)).astype(np.int)
             max_delays = max(delays)
@@ -120,14 +132,7 @@ class SpikeQueue(object):
         self._delays = delays
 
         # Prepare the data structure used in propagation
-        synapse_sources = synapse_sources[:]        
-        ss = np.ravel(synapse_sources)
-        # mergesort to retain relative order, keeps the output lists in sorted order
-        I = np.argsort(ss, kind='mergesort')
-        ss_sorted = ss[I]
-        splitinds = np.searchsorted(ss_sorted, np.arange(self._source_start, self. _source_end+1))
-        self._neurons_to_synapses = [I[splitinds[j]:splitinds[j+1]] for j in xrange(len(splitinds)-1)]
-        max_events = max(map(len, self._neurons_to_synapses))
+        max_events = self._prepare_synapse_lookup(synapse_sources)
 
         n_steps = max_delays + 1
         
@@ -135,6 +140,22 @@ class SpikeQueue(object):
         # Check if delays are homogeneous
         self._homogeneous = (max_delays == min_delays)
 
+        needs_resize = ((n_steps > self.X.shape[0]) or
+                        (max_events > self.X.shape[1]))
+        if self._dt is not None and (self._dt != dt or needs_resize):
+            # store the current spikes
+            spikes = self._extract_spikes()
+            # adapt the spikes to the new dt if it changed
+            if self._dt != dt:
+                spiketimes = spikes[:, 0] * self._dt
+                spikes[:, 0] = np.round(spiketimes / dt).astype(np.int)
+            # Make sure that there is space for all the stored spikes (might
+            # not be the case with a smaller dt)
+            if len(spikes):
+                n_steps = max(n_steps, np.max(spikes[:, 0]) + 1)
+        else:
+            spikes = None
+
         # Resize
         if (n_steps > self.X.shape[0]) or (max_events > self.X.shape[1]): # Resize
             # Choose max_delay if is is larger than the maximum delay
@@ -154,6 +175,36 @@ class SpikeQueue(object):
 
         self._dt = dt
 
+    def _prepare_synapse_lookup(self, synapse_sources):
+        '''
+        Prepare the data structure used to look up the synapses of spiking
+        neurons (see "Synapse lookup" in the class documentation).
+
+        Parameters
+        ----------
+        synapse_sources : ndarray of int
+            The source neuron for each synapse.
+
+        Returns
+        -------
+        max_events : int
+            The maximum number of synapses of a single source neuron.
+        '''
+        synapse_sources = synapse_sources[:]
+        ss = np.ravel(synapse_sources)
+        # mergesort to retain relative order, keeps the output lists in sorted order
+        I = np.argsort(ss, kind='mergesort')
+        ss_sorted = ss[I]
+        splitinds = np.searchsorted(ss_sorted, np.arange(self._source_start, self. _source_end+1))
+        self._synapse_indices = np.asarray(I, dtype=np.int32)
+        self._synapse_indptr = np.asarray(splitinds, dtype=np.int32)
+        if len(self._push_buffer) < len(ss):
+            self._push_buffer = np.zeros(len(ss), dtype=np.int32)
+        if len(splitinds) > 1:
+            return np.max(np.diff(splitinds))
+        else:
+            return 0
+
     def _extract_spikes(self):
         '''
         Get all the stored spikes
@@ -165,13 +216,15 @@ class SpikeQueue(object):
             The first column gives the time (as integer time steps) and the
             second column gives the index of the target synapse.
         '''
-        spikes = np.zeros((np.sum(self.n), 2))
-        counter = 0
-        for idx, n in enumerate(self.n):
-            t = (idx - self.currenttime) % len(self.n)
-            for target in self.X[idx, :n]:
-                spikes[counter, :] = np.array([t, target])
-                counter += 1
+        n_rows = len(self.n)
+        n_events = np.sum(self.n)
+        rows = np.repeat(np.arange(n_rows), self.n)
+        # Position of each event in its row
+        columns = np.arange(n_events) - np.repeat(np.cumsum(self.n) - self.n,
+                                                  self.n)
+        spikes = np.empty((n_events, 2), dtype=np.int)
+        spikes[:, 0] = (rows - self.currenttime) % n_rows
+        spikes[:, 1] = self.X[rows, columns]
         return spikes
 
     def _store_spikes(self, spikes):
@@ -189,10 +242,19 @@ class SpikeQueue(object):
         '''
         # Clear all spikes
         self.n[:] = 0
-        for t, target in spikes:
-            row_idx = (t + self.currenttime) % len(self.n)
-            self.X[row_idx, self.n[row_idx]] = target
-            self.n[row_idx] += 1
+        if not len(spikes):
+            return
+        rows = (spikes[:, 0].astype(np.int) + self.currenttime) % len(self.n)
+        # mergesort to keep the order of spikes within each time step
+        order = np.argsort(rows, kind='mergesort')
+        rows = rows[order]
+        counts = np.bincount(rows, minlength=len(self.n))
+        if np.max(counts) > self.X.shape[1]:
+            self._resize(np.max(counts))
+        # Position of each spike in its row
+        columns = np.arange(len(rows)) - (np.cumsum(counts) - counts)[rows]
+        self.X[rows, columns] = spikes[order, 1]
+        self.n[:] = counts
 
     ################################ SPIKE QUEUE DATASTRUCTURE ################
     def advance(self):
@@ -218,6 +280,39 @@ class SpikeQueue(object):
         sources : ndarray of int
             The indices of the neurons that spiked.
         '''
+        sources = self._relative_sources(sources)
+        if len(sources):
+            indices = self._synapses_for_sources(sources)
+            if not len(indices):
+                return
+            if self._homogeneous:  # homogeneous delays
+                self._insert_homogeneous(self._delays[0], indices)
+            elif self._offsets is None or len(sources) > 1:
+                # vectorise over synaptic events. Precomputed offsets only
+                # take into account synapses of the same source neuron, they
+                # can therefore not be used when several neurons spiked
+                # (events with the same delay would overwrite each other).
+                # There are no precomputed offsets (in particular) when there
+                # are dynamic delays
+                self._insert(self._delays[indices], indices)
+            else: # offsets are precomputed
+                self._insert(self._delays[indices], indices, self._offsets[indices])
+
+    def _relative_sources(self, sources):
+        '''
+        Restrict spiking neurons to the source group.
+
+        Parameters
+        ----------
+        sources : ndarray of int
+            The (sorted) indices of the neurons that spiked.
+
+        Returns
+        -------
+        sources : ndarray of int
+            The indices of the neurons that spiked and belong to the source
+            group, relative to the start of the group.
+        '''
         if len(sources):
             start = self._source_start
             stop = self._source_end
@@ -228,22 +323,42 @@ class SpikeQueue(object):
             if stop <= sources[-1]:
                 stop_idx = bisect.bisect_left(sources, stop, lo=start_idx)
             else:
-                stop_idx = len(self._neurons_to_synapses)
-            sources = sources[start_idx:stop_idx]
-            if len(sources)==0:
-                return
-            synapse_indices = self._neurons_to_synapses
-            indices = np.concatenate([synapse_indices[source - start]
-                                      for source in sources]).astype(np.int32)
-            if self._homogeneous:  # homogeneous delays
-                self._insert_homogeneous(self._delays[0], indices)
-            elif self._offsets is None:  # vectorise over synaptic events
-                # there are no precomputed offsets, this is the case
-                # (in particular) when there are dynamic delays
-                self._insert(self._delays[indices], indices)
-            else: # offsets are precomputed
-                self._insert(self._delays[indices], indices, self._offsets[indices])
-                # Note: the trick can only work if offsets are ordered in the right way
+                stop_idx = len(sources)
+            sources = sources[start_idx:stop_idx] - start
+        return sources
+
+    def _synapses_for_sources(self, sources):
+        '''
+        Look up the synapses of a number of presynaptic neurons.
+
+        Parameters
+        ----------
+        sources : ndarray of int
+            The indices of the neurons (relative to the start of the source
+            group).
+
+        Returns
+        -------
+        indices : ndarray of int
+            The synapse indices for all neurons in `sources`, concatenated.
+            For more than one neuron, this array is a view on an internal
+            buffer that will be overwritten by the next call.
+        '''
+        indptr = self._synapse_indptr
+        if len(sources) == 1:
+            # No need to copy anything
+            return self._synapse_indices[indptr[sources[0]]:indptr[sources[0]+1]]
+        starts = indptr[sources]
+        counts = indptr[sources + 1] - starts
+        ends = np.cumsum(counts)
+        n_events = ends[-1]
+        # Positions in _synapse_indices: for each neuron, a contiguous range
+        # starting at its entry in the index pointer array
+        positions = np.arange(n_events)
+        positions += np.repeat(starts - (ends - counts), counts)
+        indices = self._push_buffer[:n_events]
+        np.take(self._synapse_indices, positions, out=indices)
+        return indices
 
     def _do_precompute_offsets(self, n_synapses):
         '''
@@ -255,12 +370,17 @@ class SpikeQueue(object):
             delays = self._delays.repeat(n_synapses)
         else:
             delays = self._delays
-        self._offsets = np.zeros_like(delays)
-        index = 0
-        for targets in self._neurons_to_synapses:
-            target_delays = delays[targets]
-            self._offsets[index:index+len(target_delays)] = self._calc_offsets(target_delays)
-            index += len(target_delays)
+        if not len(delays):
+            self._offsets = np.zeros_like(delays)
+            return
+        # The offsets are calculated for all neurons at once, by using a
+        # combination of source neuron and delay as the key for _calc_offsets
+        indptr = self._synapse_indptr
+        sources = np.zeros(len(delays), dtype=np.int)
+        sources[self._synapse_indices] = np.repeat(np.arange(len(indptr) - 1),
+                                                   np.diff(indptr))
+        self._offsets = self._calc_offsets(sources * (np.max(delays) + 1) +
+                                           delays)
 
     def _calc_offsets(self, delay):
         '''
@@ -361,3 +481,149 @@ class SpikeQueue(object):
 
         self.X = newX
         self.X_flat = self.X.reshape(self.X.shape[0]*new_maxevents,)
+
+
+class BucketSpikeQueue(SpikeQueue):
+    '''
+    Alternative implementation of the `SpikeQueue`, storing synaptic events
+    in growable buckets, one for each time step. This should be preferred
+    over the standard `SpikeQueue` for long and broadly distributed delays.
+
+    Parameters
+    ----------
+    source_start : int
+        The start of the source indices (for subgroups)
+    source_end : int
+        The end of the source indices (for subgroups)
+    dtype : `dtype`, optional
+        The data type used for storing synapse indices.
+
+    Notes
+    -----
+    The queue is a list of buckets that is circular in the time direction,
+    the bucket corresponding to the current timestep is `currenttime`. Each
+    bucket is a list of arrays of target synapse indices, every `push` appends
+    one array per distinct delay. The arrays of the current bucket are only
+    concatenated when it is accessed with `peek`. In contrast to the 2D array
+    used in `SpikeQueue`, the memory use therefore scales with the number of
+    events that have to be delivered in the future, and not with the maximum
+    number of events per time step multiplied by the number of time steps.
+    No offsets are needed for the insertion of events.
+    '''
+    def __init__(self, source_start, source_end, dtype=np.int32):
+        super(BucketSpikeQueue, self).__init__(source_start, source_end,
+                                               dtype=dtype,
+                                               precompute_offsets=False)
+        #: The list of buckets, one for each time step
+        self._buckets = [[]]
+        #: Returned by `peek` if there are no events in the current time step
+        self._no_events = np.zeros(0, dtype=dtype)
+
+    def prepare(self, delays, dt, synapse_sources):
+        '''
+        Prepare the data structure. This is called every time the network is
+        run. The number of buckets is adjusted to fit the maximum delay in
+        `delays`, if necessary. Stored events are moved to other buckets if
+        `dt` changed.
+        '''
+        if len(delays):
+            delays = np.array(np.round(delays / dt)).astype(np.int)
+            max_delays = max(delays)
+            min_delays = min(delays)
+        else:
+            max_delays = min_delays = 0
+
+        self._delays = delays
+        self._homogeneous = (max_delays == min_delays)
+
+        self._prepare_synapse_lookup(synapse_sources)
+
+        if self._dt is not None and self._dt != dt:
+            self._rescale_buckets(self._dt / dt)
+
+        n_steps = max_delays + 1
+        n_buckets = len(self._buckets)
+        if n_steps > n_buckets:
+            # Rotate the buckets so that the current time step is the first
+            # one and add new buckets at the end
+            self._buckets = (self._buckets[self.currenttime:] +
+                             self._buckets[:self.currenttime] +
+                             [[] for _ in xrange(n_steps - n_buckets)])
+            self.currenttime = 0
+
+        self._dt = dt
+
+    def _rescale_buckets(self, factor):
+        '''
+        Move the stored events to new buckets after a change of dt.
+
+        Parameters
+        ----------
+        factor : float
+            The ratio between the old and the new dt.
+        '''
+        n_buckets = len(self._buckets)
+        new_buckets = {}
+        for step in xrange(n_buckets):
+            bucket = self._buckets[(self.currenttime + step) % n_buckets]
+            if len(bucket):
+                new_step = int(np.round(step * factor))
+                new_buckets.setdefault(new_step, []).extend(bucket)
+        if len(new_buckets):
+            n_new_buckets = max(new_buckets) + 1
+        else:
+            n_new_buckets = 1
+        self._buckets = [new_buckets.get(step, [])
+                         for step in xrange(n_new_buckets)]
+        self.currenttime = 0
+
+    def advance(self):
+        '''
+        Advances by one timestep
+        '''
+        self._buckets[self.currenttime] = []
+        self.currenttime = (self.currenttime + 1) % len(self._buckets)
+
+    def peek(self):
+        '''
+        Returns the all the synaptic events corresponding to the current time,
+        as an array of synapse indexes.
+        '''
+        bucket = self._buckets[self.currenttime]
+        if not len(bucket):
+            return self._no_events
+        if len(bucket) > 1:
+            bucket[:] = [np.concatenate(bucket)]
+        return bucket[0]
+
+    def push(self, sources):
+        '''
+        Push spikes to the queue.
+
+        Parameters
+        ----------
+        sources : ndarray of int
+            The indices of the neurons that spiked.
+        '''
+        sources = self._relative_sources(sources)
+        if not len(sources):
+            return
+        indices = self._synapses_for_sources(sources)
+        if not len(indices):
+            return
+        n_buckets = len(self._buckets)
+        if self._homogeneous:
+            # indices might refer to an internal buffer, we have to copy
+            bucket = (self.currenttime + self._delays[0]) % n_buckets
+            self._buckets[bucket].append(np.array(indices, dtype=self.dtype))
+        else:
+            # Sort the events by delay and add the events for each delay to
+            # the respective bucket
+            delays = self._delays[indices]
+            order = np.argsort(delays, kind='mergesort')
+            delays = delays[order]
+            indices = indices[order].astype(self.dtype)
+            splits = np.flatnonzero(delays[1:] != delays[:-1]) + 1
+            for delay, events in zip(delays[np.hstack((0, splits))],
+                                     np.split(indices, splits)):
+                self._buckets[(self.currenttime + delay) % n_buckets].append(events)
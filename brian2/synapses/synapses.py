@@ -31,6 +31,73 @@ __all__ = ['Synapses']
 
 logger = get_logger(__name__)
 
+#: Conditions for which random connections are created without evaluating
+#: the condition for every pair of neurons (see `sample_random_connections`),
+#: mapping the condition (without spaces) to a function of ``i`` and ``j``.
+SIMPLE_CONDITIONS = {'True': None,
+                     'i!=j': np.not_equal, 'j!=i': np.not_equal,
+                     'i<j': np.less, 'j>i': np.less,
+                     'i>j': np.greater, 'j<i': np.greater,
+                     'i<=j': np.less_equal, 'j>=i': np.less_equal,
+                     'i>=j': np.greater_equal, 'j<=i': np.greater_equal}
+
+
+def sample_random_connections(num_source, num_target, p, condition=None):
+    '''
+    Randomly select pairs of source and target indices, each pair being
+    selected independently with probability ``p``. Instead of drawing a random
+    number for every pair, the gaps between the selected pairs (in the
+    flattened ``num_source`` x ``num_target`` matrix) are drawn from a
+    geometric distribution, the cost is therefore proportional to the number
+    of selected pairs.
+
+    Parameters
+    ----------
+    num_source : int
+        The number of source indices.
+    num_target : int
+        The number of target indices.
+    p : float
+        The probability for each pair to be selected.
+    condition : function, optional
+        A function taking the arrays of source and target indices and
+        returning a boolean array to further restrict the pairs (e.g.
+        `numpy.not_equal` to exclude pairs with identical indices).
+
+    Returns
+    -------
+    sources, targets : `ndarray`
+        The selected source and target indices, sorted by source index
+        first and target index second.
+    '''
+    total = num_source * num_target
+    if p <= 0 or total == 0:
+        positions = np.zeros(0, dtype=np.int64)
+    else:
+        chunks = []
+        last = -1
+        while True:
+            # Draw a few more gaps than expected to normally need a single
+            # chunk only
+            remaining = total - last - 1
+            expected = remaining * p
+            size = int(expected + 5 * np.sqrt(expected) + 10)
+            gaps = np.random.geometric(p, size=size)
+            positions = last + np.cumsum(gaps, dtype=np.int64)
+            if positions[-1] >= total:
+                chunks.append(positions[:np.searchsorted(positions, total)])
+                break
+            chunks.append(positions)
+            last = positions[-1]
+        positions = np.concatenate(chunks)
+    sources = (positions // num_target).astype(np.int32)
+    targets = (positions % num_target).astype(np.int32)
+    if condition is not None:
+        selected = condition(sources, targets)
+        sources = sources[selected]
+        targets = targets[selected]
+    return sources, targets
+
 
 class StateUpdater(CodeRunner):
     '''
@@ -192,6 +259,10 @@ class SynapticPathway(CodeRunner, Group):
         #: The `CodeObject` initalising the `SpikeQueue` at the begin of a run
         self._initialise_queue_codeobj = None
 
+        #: The dt and the versions of the synaptic sources and delays used for
+        #: the last preparation of the `SpikeQueue`
+        self._queue_state = None
+
         self.namespace = synapses.namespace
         # Enable access to the delay attribute via the specifier
         self._enable_group_attributes()
@@ -243,13 +314,24 @@ class SynapticPathway(CodeRunner, Group):
 
     def initialise_queue(self):
         if self.queue is None:
-            self.queue = get_device().spike_queue(self.source.start, self.source.stop)
+            if self.synapses.queue_class is None:
+                self.queue = get_device().spike_queue(self.source.start,
+                                                      self.source.stop)
+            else:
+                self.queue = self.synapses.queue_class(self.source.start,
+                                                       self.source.stop)
 
         # Update the dt (might have changed between runs)
         self.dt = self.synapses.clock.dt_
 
-        self.queue.prepare(self._delays.get_value(), self.dt,
-                           self.synapse_sources.get_value())
+        # The queue only has to be prepared again if the connectivity, the
+        # delays or the dt changed since the last run
+        queue_state = (self.dt, self.synapse_sources.version,
+                       self._delays.version)
+        if queue_state != self._queue_state:
+            self.queue.prepare(self._delays.get_value(), self.dt,
+                               self.synapse_sources.get_value())
+            self._queue_state = queue_state
 
     def push_spikes(self):
         # Push new spikes into the queue
@@ -446,6 +528,10 @@ class Synapses(Group):
     method : {str, `StateUpdateMethod`}, optional
         The numerical integration method to use. If none is given, an
         appropriate one is automatically determined.
+    queue_class : class, optional
+        The class used for the spike queues of the synaptic pathways, e.g.
+        `BucketSpikeQueue` for long and broadly distributed delays. If none
+        is given, the device chooses the class (see `Device.spike_queue`).
     name : str, optional
         The name for this object. If none is given, a unique name of the form
         ``synapses``, ``synapses_1``, etc. will be automatically chosen.
@@ -455,12 +541,17 @@ class Synapses(Group):
     def __init__(self, source, target=None, model=None, pre=None, post=None,
                  connect=False, delay=None, namespace=None, dtype=None,
                  codeobj_class=None,
-                 clock=None, method=None, name='synapses*'):
+                 clock=None, method=None, queue_class=None,
+                 name='synapses*'):
         self._N = 0
         Group.__init__(self, when=clock, name=name)
         
         self.codeobj_class = codeobj_class
 
+        #: The class used for the spike queues (``None`` for the device's
+        #: default)
+        self.queue_class = queue_class
+
         self.source = source
         self.add_dependency(source)
         if target is None:
@@ -836,7 +927,10 @@ class Synapses(Group):
         string that evaluates to a boolean value (or directly a boolean value).
         If it is given as an index, also `post` has to be present. A string
         condition will be evaluated for all pre-/postsynaptic indices, which
-        can be referred to as `i` and `j`.
+        can be referred to as `i` and `j`. For a constant probability `p` and
+        a condition that is ``True`` or a comparison between `i` and `j` (e.g.
+        ``'i != j'``), the synapses are sampled directly instead, the cost is
+        then proportional to the number of created synapses.
 
         Parameters
         ----------
@@ -993,6 +1087,17 @@ class Synapses(Group):
                                             run_namespace=namespace,
                                             level=level+1)
             codeobj()
+        elif (condition.replace(' ', '') in SIMPLE_CONDITIONS and
+                  isinstance(p, float) and 0 <= p < 1 and
+                  isinstance(n, (int, long))):
+            # Sparse random connectivity with a constant probability: directly
+            # sample the connections instead of evaluating the condition for
+            # all pairs of neurons
+            sources, targets = sample_random_connections(len(self.source),
+                                                         len(self.target), p,
+                                                         SIMPLE_CONDITIONS[condition.replace(' ', '')])
+            self._add_synapses(sources, targets, n, 1.0, namespace=namespace,
+                               level=level+1)
         else:
             abstract_code = '_pre_idx = _all_pre \n'
             abstract_code += '_post_idx = _all_post \n'
@@ -1,14 +1,26 @@
 from collections import namedtuple
+import gc
+import os
+import tempfile
 
 import numpy as np
-from numpy.testing import assert_raises
+from numpy.testing import assert_raises, assert_equal
 
 from brian2.codegen.translation import (analyse_identifiers,
                                         get_identifiers_recursively,
                                         make_statements,
                                         )
+from brian2.codegen.cache import CodeCache, get_code_cache
+from brian2.codegen.templates import Templater, CodeObjectTemplate
+from brian2.codegen.optimisation import optimise_statements
+from brian2.codegen.runtime.numpy_rt import NumpyCodeObject
 from brian2.core.variables import Subexpression, Variable
+from brian2.core.network import Network
+from brian2.core.preferences import brian_prefs
+from brian2.groups.neurongroup import NeuronGroup
 from brian2.units.fundamentalunits import Unit
+from brian2.units.stdunits import ms
+from brian2.utils.stringtools import get_identifiers
 
 FakeGroup = namedtuple('FakeGroup', ['variables'])
 
@@ -73,9 +85,166 @@ def test_nested_subexpressions():
     evalorder = ''.join(stmt.var for stmt in stmts)
     # This is the order that variables ought to be evaluated in
     assert evalorder=='baxcbaxdax'
-    
+
+
+def test_optimise_statements():
+    '''
+    Test the loop-invariant code motion and the common subexpression
+    elimination.
+    '''
+    code = '''
+    a = v*exp(-dt/tau) + (v + w)*2
+    b = (v + w)*2 + exp(-dt/tau)
+    v = (v + w)*2 + i/2
+    w = (v + w)*2
+    '''
+    variables = {'v': Variable(name='v', unit=None, dtype=np.float64),
+                 'w': Variable(name='w', unit=None, dtype=np.float64),
+                 'i': Variable(name='i', unit=None, dtype=np.int32),
+                 'dt': Variable(name='dt', unit=None, dtype=np.float64,
+                                scalar=True),
+                 'tau': Variable(name='tau', unit=None, dtype=np.float64,
+                                 scalar=True)}
+    statements = make_statements(code, variables, np.float64)
+    optimised = optimise_statements(statements, variables, np.float64)
+    scalar_statements = [stmt for stmt in optimised if stmt.scalar]
+    vector_statements = [stmt for stmt in optimised if not stmt.scalar]
+    # exp(-dt/tau) is only calculated once, in the scalar code
+    assert len(scalar_statements) == 1
+    assert 'exp' in scalar_statements[0].expr
+    assert not any('exp' in stmt.expr for stmt in vector_statements)
+    # (v + w)*2 is calculated once for the first three statements, but it has
+    # to be re-calculated for the last statement (v changed)
+    assert len(vector_statements) == 5
+    cse_var = vector_statements[0].var
+    assert vector_statements[0].op == ':='
+    for stmt in vector_statements[1:4]:
+        assert cse_var in get_identifiers(stmt.expr)
+    assert cse_var not in get_identifiers(vector_statements[4].expr)
+    # integer expressions are not touched
+    assert 'i / 2' in vector_statements[3].expr
+
+    # Without moving scalar expressions, exp(-dt/tau) is a common
+    # subexpression of the vector statements
+    optimised = optimise_statements(statements, variables, np.float64,
+                                    hoist_scalars=False)
+    assert not any(stmt.scalar for stmt in optimised)
+    assert len(optimised) == 6
+
+
+def test_code_cache():
+    '''
+    Test that the generated code is reused from the code cache.
+    '''
+    def run_group():
+        G = NeuronGroup(10, 'dv/dt = -v / (10*ms) : 1', threshold='v>1',
+                        reset='v=0', name='code_cache_test_group',
+                        codeobj_class=NumpyCodeObject)
+        G.v = 'i*0.2'
+        net = Network(G)
+        net.run(1*ms)
+        return G.v[:].copy()
+
+    old_directory = brian_prefs['codegen.cache.directory']
+    try:
+        cache_dir = tempfile.mkdtemp()
+        brian_prefs['codegen.cache.directory'] = cache_dir
+        code_cache = get_code_cache()
+        v_uncached = run_group()
+        gc.collect()  # free the names of the objects
+        entries = sorted(os.listdir(cache_dir))
+        assert len(entries) > 0
+        hits = code_cache.hits
+        v_cached = run_group()
+        assert code_cache.hits > hits
+        assert sorted(os.listdir(cache_dir)) == entries
+        assert_equal(v_cached, v_uncached)
+
+        # switching off the cache
+        brian_prefs['codegen.cache.directory'] = ''
+        assert get_code_cache() is None
+    finally:
+        brian_prefs['codegen.cache.directory'] = old_directory
+
+
+def test_code_cache_random_functions():
+    '''
+    Test that code using random numbers works when loaded from the code cache.
+    '''
+    codeobj_classes = [NumpyCodeObject]
+    try:
+        import scipy.weave
+        from brian2.codegen.runtime.weave_rt import WeaveCodeObject
+        codeobj_classes.append(WeaveCodeObject)
+    except ImportError:
+        pass
+
+    def run_group(codeobj_class):
+        G = NeuronGroup(10, 'dv/dt = -v / (10*ms) : 1', threshold='rand()<0.5',
+                        reset='v=randn()', name='code_cache_random_group',
+                        codeobj_class=codeobj_class)
+        G.v = 'rand()'
+        net = Network(G)
+        np.random.seed(1)
+        net.run(1*ms)
+        return G.v[:].copy()
+
+    old_directory = brian_prefs['codegen.cache.directory']
+    try:
+        brian_prefs['codegen.cache.directory'] = tempfile.mkdtemp()
+        code_cache = get_code_cache()
+        for codeobj_class in codeobj_classes:
+            v_uncached = run_group(codeobj_class)
+            gc.collect()  # free the names of the objects
+            hits = code_cache.hits
+            v_cached = run_group(codeobj_class)
+            gc.collect()
+            assert code_cache.hits > hits
+            if codeobj_class is NumpyCodeObject:
+                assert_equal(v_cached, v_uncached)
+    finally:
+        brian_prefs['codegen.cache.directory'] = old_directory
+
+
+def test_code_cache_eviction():
+    '''
+    Test that the least recently used entries are removed from the cache.
+    '''
+    cache_dir = tempfile.mkdtemp()
+    code_cache = CodeCache(cache_dir, size_limit=2500)
+    code_cache.set('a', 'a'*1000)
+    code_cache.set('b', 'b'*1000)
+    # make "b" the least recently used entry
+    os.utime(os.path.join(cache_dir, 'b.pickle'), (0, 0))
+    assert code_cache.get('a') == ('a'*1000, None)
+    assert code_cache.get('c') is None
+    code_cache.set('c', 'c'*1000)
+    assert sorted(os.listdir(cache_dir)) == ['a.pickle', 'c.pickle']
+    assert code_cache.get('b') is None
+    assert code_cache.hits == 1
+    assert code_cache.misses == 2
+
+
+def test_templater_lazy_loading():
+    '''
+    Test that templates are only loaded when they are used.
+    '''
+    templater = Templater('brian2.codegen.runtime.numpy_rt')
+    assert 'stateupdate' in templater.template_files
+    assert 'stateupdate' not in vars(templater)
+    template = templater.stateupdate
+    assert isinstance(template, CodeObjectTemplate)
+    assert 'stateupdate' in vars(templater)
+    assert templater.stateupdate is template
+    assert_raises(AttributeError, lambda: templater.does_not_exist)
+
 
 if __name__ == '__main__':
     test_analyse_identifiers()
     test_get_identifiers_recursively()
     test_nested_subexpressions()
+    test_optimise_statements()
+    test_code_cache()
+    test_code_cache_random_functions()
+    test_code_cache_eviction()
+    test_templater_lazy_loading()
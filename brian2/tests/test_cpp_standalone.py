@@ -3,6 +3,7 @@ import os
 
 from nose import with_setup
 import numpy
+from numpy.testing import assert_allclose, assert_equal, assert_raises
 
 from brian2 import *
 from brian2.devices.cpp_standalone import cpp_standalone_device
@@ -53,8 +54,167 @@ def test_cpp_standalone(with_output=False):
     assert len(M.t) == len(M.i)
     assert M.t[0] == 0.
     assert M.t[-1] == 100*ms - defaultclock.dt
-    
+
+
+@with_setup(teardown=restore_device)
+def test_cpp_standalone_openmp(with_output=False):
+    Synapses.__instances__().clear()
+    set_device('cpp_standalone')
+    tau = 1*ms
+    eqs = '''
+    dV/dt = (-40*mV-V)/tau : volt (unless refractory)
+    '''
+    N = 1000
+    G = NeuronGroup(N, eqs, reset='V=-60*mV', threshold='V>-50*mV',
+                    refractory=5*ms, name='gp')
+    G.V = '-i*mV'
+    M = SpikeMonitor(G)
+    S = Synapses(G, G, 'w : volt', pre='V += w')
+    S.connect('abs(i-j)<5 and i!=j')
+    S.w = 0.5*mV
+    S.delay = '0*ms'
+
+    net = Network(G, M, S)
+    net.run(100*ms)
+    tempdir = tempfile.mkdtemp()
+    if with_output:
+        print tempdir
+    device.build(project_dir=tempdir, compile_project=True, run_project=True,
+                 with_output=with_output, num_threads=2)
+    # Same model as in test_cpp_standalone, the results should not depend on
+    # the number of threads
+    assert len(M.i)>=17000 and len(M.i)<=18000
+    assert len(M.t) == len(M.i)
+    # spikes have to be sorted within every time step
+    for t in numpy.unique(M.t):
+        indices = M.i[M.t == t]
+        assert all(numpy.diff(indices) > 0)
+
+
+@with_setup(teardown=restore_device)
+def test_cpp_standalone_openmp_random(with_output=False):
+    # Code using rand() or randn() is executed serially, the results should
+    # therefore not depend on the number of threads
+    results = []
+    for num_threads in [1, 2]:
+        cpp_standalone_device.reinit()
+        Synapses.__instances__().clear()
+        set_device('cpp_standalone')
+        G = NeuronGroup(100, 'dv/dt = -v / (10*ms) : 1', threshold='rand()<0.1',
+                        reset='v = randn()', name='gp')
+        G.v = 'rand()'
+        S = Synapses(G, G, 'w : 1', pre='v_post += w*rand()')
+        S.connect('i!=j', p=0.1)
+        S.w = 'rand()'
+        M = SpikeMonitor(G)
+        net = Network(G, S, M)
+        net.run(10*ms)
+        tempdir = tempfile.mkdtemp()
+        if with_output:
+            print tempdir
+        device.build(project_dir=tempdir, compile_project=True,
+                     run_project=True, with_output=with_output,
+                     num_threads=num_threads, run_args=['seed=42'])
+        results.append((M.i[:], M.t[:]))
+    assert_equal(results[0][0], results[1][0])
+    assert_equal(results[0][1], results[1][1])
+
+
+@with_setup(teardown=restore_device)
+def test_cpp_standalone_object_cache():
+    Synapses.__instances__().clear()
+    set_device('cpp_standalone')
+    G = NeuronGroup(10, 'dv/dt = -v / (10*ms) : 1', threshold='v>1',
+                    reset='v=0', name='gp')
+    G.v = 'i*0.2'
+    net = Network(G)
+    net.run(10*ms)
+    # the preferences are restored in restore_device
+    cache_dir = tempfile.mkdtemp()
+    brian_prefs['devices.cpp_standalone.object_cache_dir'] = cache_dir
+    device.build(project_dir=tempfile.mkdtemp(), compile_project=True,
+                 run_project=False, with_output=False)
+    cached_objects = sorted(os.listdir(cache_dir))
+    assert len(cached_objects) > 0
+    assert all(fname.endswith('.o') for fname in cached_objects)
+    # Building the same project again in a new directory should take all the
+    # objects from the cache
+    device.build(project_dir=tempfile.mkdtemp(), compile_project=True,
+                 run_project=False, with_output=False)
+    assert sorted(os.listdir(cache_dir)) == cached_objects
+    # Different compiler flags should not use the cached objects
+    device.build(project_dir=tempfile.mkdtemp(), compile_project=True,
+                 run_project=False, with_output=False, debug=False)
+    assert len(os.listdir(cache_dir)) == 2*len(cached_objects)
+    # The least recently used objects are removed if the cache is too big
+    brian_prefs['devices.cpp_standalone.object_cache_size_limit'] = 0
+    device.build(project_dir=tempfile.mkdtemp(), compile_project=True,
+                 run_project=False, with_output=False)
+    assert len(os.listdir(cache_dir)) == 0
+
+@with_setup(teardown=restore_device)
+def test_cpp_standalone_monitor_storage():
+    set_device('cpp_standalone')
+    G = NeuronGroup(10, 'dv/dt = -v / (10*ms) : 1', threshold='v>1',
+                    reset='v=0', name='gp')
+    storage = tempfile.mkdtemp()
+    # Standalone devices do not support writing values to a storage
+    assert_raises(NotImplementedError,
+                  lambda: StateMonitor(G, 'v', record=True, storage=storage))
+    assert_raises(NotImplementedError,
+                  lambda: SpikeMonitor(G, storage=storage))
+
+@with_setup(teardown=restore_device)
+def test_cpp_standalone_monitor_reductions():
+    set_device('cpp_standalone')
+    G = NeuronGroup(10, 'dv/dt = -v / (10*ms) : 1', name='gp')
+    # Standalone devices do not support downsampling or reductions
+    assert_raises(NotImplementedError,
+                  lambda: StateMonitor(G, 'v', record=True, every=5))
+    assert_raises(NotImplementedError,
+                  lambda: StateMonitor(G, 'v', record=True, every=5,
+                                       reduction='mean'))
+    assert_raises(NotImplementedError,
+                  lambda: StateMonitor(G, 'v', record=True,
+                                       population_mean=True))
+    # The default arguments are supported
+    StateMonitor(G, 'v', record=True, every=1)
+
+@with_setup(teardown=restore_device)
+def test_cpp_standalone_monitor_history():
+    set_device('cpp_standalone')
+    G = NeuronGroup(10, 'dv/dt = -v / (10*ms) : 1', threshold='v>1',
+                    reset='v=0', name='gp')
+    # Standalone devices do not support keeping only recent values
+    assert_raises(NotImplementedError,
+                  lambda: StateMonitor(G, 'v', record=True, history=5*ms))
+    assert_raises(NotImplementedError,
+                  lambda: SpikeMonitor(G, history=5*ms))
+    assert_raises(NotImplementedError,
+                  lambda: PopulationRateMonitor(G, history=5*ms))
+
+@with_setup(teardown=restore_device)
+def test_cpp_standalone_parameters():
+    Synapses.__instances__().clear()
+    set_device('cpp_standalone')
+    tau = 10*ms
+    G = NeuronGroup(1, 'dv/dt = 1/tau : 1', name='gp')
+    net = Network(G)
+    net.run(10*ms)
+    tempdir = tempfile.mkdtemp()
+    # tau is not compiled into the code but set when running the program
+    device.build(project_dir=tempdir, compile_project=True, run_project=True,
+                 with_output=False, parameters=['tau'], run_args=['tau=0.005'])
+    assert_allclose(G.v[:], 2.0)
+
 if __name__=='__main__':
     # Print the debug output when testing this file only but not when running
     # via nose test
     test_cpp_standalone(with_output=True)
+    test_cpp_standalone_openmp(with_output=True)
+    test_cpp_standalone_openmp_random(with_output=True)
+    test_cpp_standalone_object_cache()
+    test_cpp_standalone_monitor_storage()
+    test_cpp_standalone_monitor_reductions()
+    test_cpp_standalone_monitor_history()
+    test_cpp_standalone_parameters()
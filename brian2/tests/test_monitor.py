@@ -1,3 +1,7 @@
+import os
+import shutil
+import tempfile
+
 import numpy as np
 from numpy.testing.utils import assert_allclose, assert_array_equal, assert_raises
 
@@ -11,6 +15,11 @@ except ImportError:
     # Can't test C++
     targets = ['numpy']
 
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
 
 def test_spike_monitor():
     target_before = brian_prefs.codegen.target
@@ -144,6 +153,233 @@ def test_state_monitor():
     brian_prefs.codegen.target = target_before
 
 
+def test_state_monitor_multiple_runs():
+    '''
+    Test the preallocation of the recorded values over several runs and the
+    access to the values during a run.
+    '''
+    target_before = brian_prefs.codegen.target
+    for target in targets:
+        brian_prefs.codegen.target = target
+        defaultclock.t = 0*second
+        G = NeuronGroup(3, 'dv/dt = 1/(10*ms) : 1')
+        mon = StateMonitor(G, 'v', record=[0, 2])
+        recorded_during_run = []
+
+        @network_operation(when='end')
+        def check_recording():
+            recorded_during_run.append(len(mon))
+            assert len(mon.t) == len(mon)
+            assert mon.v.shape == (2, len(mon))
+
+        net = Network(G, mon, check_recording)
+        net.run(5*defaultclock.dt)
+        assert len(mon) == 5
+        assert mon.variables['t'].get_value().shape == (5, )
+        net.run(3*defaultclock.dt)
+        assert len(mon) == 8
+        assert mon.variables['_recorded_v'].get_value().shape == (8, 2)
+        assert_allclose(mon.t, np.arange(8) * defaultclock.dt)
+        assert_allclose(mon.v[0], (np.arange(8) + 1) * float(defaultclock.dt / (10*ms)))
+        assert_array_equal(mon.v[0], mon.v[1])
+        # The network operation might run before or after the monitor
+        assert len(recorded_during_run) == 8
+        assert all(np.diff(recorded_during_run) == 1)
+
+    brian_prefs.codegen.target = target_before
+
+
+def test_state_monitor_reductions():
+    '''
+    Test recording every n-th value, reductions over time windows and the
+    population mean.
+    '''
+    target_before = brian_prefs.codegen.target
+    for target in targets:
+        brian_prefs.codegen.target = target
+        defaultclock.t = 0*second
+        G = NeuronGroup(3, 'dv/dt = cos(2*pi*t/ms)/ms : 1')
+        G.v = 'i*0.2'
+        mon = StateMonitor(G, 'v', record=True)
+        every_mon = StateMonitor(G, 'v', record=True, every=5)
+        mean_mon = StateMonitor(G, 'v', record=[0, 2], every=5,
+                                reduction='mean')
+        min_mon = StateMonitor(G, 'v', record=True, every=5, reduction='min')
+        max_mon = StateMonitor(G, 'v', record=True, every=5, reduction='max')
+        pop_mon = StateMonitor(G, 'v', record=True, population_mean=True)
+        pop_mean_mon = StateMonitor(G, 'v', record=True, every=5,
+                                    reduction='mean', population_mean=True)
+        net = Network(G, mon, every_mon, mean_mon, min_mon, max_mon, pop_mon,
+                      pop_mean_mon)
+        # Windows continue across runs
+        net.run(12*defaultclock.dt)
+        net.run(11*defaultclock.dt)
+
+        assert_allclose(every_mon.t, mon.t[::5])
+        assert_array_equal(every_mon.v, mon.v[:, ::5])
+        # Only complete windows are recorded
+        windows = mon.v[:, :20].reshape(3, 4, 5)
+        for reduction_mon in [mean_mon, min_mon, max_mon]:
+            assert len(reduction_mon) == 4
+            assert_allclose(reduction_mon.t, mon.t[:20:5])
+        assert_allclose(mean_mon.v, windows[[0, 2]].mean(axis=2))
+        assert_allclose(mean_mon[2].v, windows[2].mean(axis=1))
+        assert_allclose(min_mon.v, windows.min(axis=2))
+        assert_allclose(max_mon.v, windows.max(axis=2))
+        assert pop_mon.v.shape == (1, 23)
+        assert_allclose(pop_mon.v[0], mon.v.mean(axis=0))
+        assert_raises(IndexError, lambda: pop_mon[0])
+        assert_allclose(pop_mean_mon.v[0], windows.mean(axis=(0, 2)))
+
+    assert_raises(ValueError, lambda: StateMonitor(G, 'v', every=0))
+    assert_raises(ValueError, lambda: StateMonitor(G, 'v', every=5,
+                                                   reduction='median'))
+
+    brian_prefs.codegen.target = target_before
+
+
+def test_monitor_storage():
+    '''
+    Test writing the recorded values to disk during the run.
+    '''
+    target_before = brian_prefs.codegen.target
+    tempdir = tempfile.mkdtemp()
+    try:
+        for target in targets:
+            brian_prefs.codegen.target = target
+            defaultclock.t = 0*second
+            G = NeuronGroup(5, '''dv/dt = rate : 1
+                                  rate : Hz''', threshold='v>1', reset='v=0')
+            G.rate = np.linspace(100, 1000, 5)*Hz
+            state_mon = StateMonitor(G, 'v', record=[1, 3])
+            spike_mon = SpikeMonitor(G)
+            state_storage = NpyStorage(os.path.join(tempdir, target, 'state'),
+                                       block_size=7)
+            stored_state_mon = StateMonitor(G, 'v', record=[1, 3],
+                                            storage=state_storage)
+            stored_spike_mon = SpikeMonitor(G, storage=NpyStorage(os.path.join(tempdir, target, 'spikes'),
+                                                                  block_size=3))
+            net = Network(G, state_mon, spike_mon, stored_state_mon,
+                          stored_spike_mon)
+            net.run(2*ms)
+            net.run(3*ms)
+            assert len(stored_state_mon) == len(state_mon) == 50
+            assert_array_equal(stored_state_mon.t, state_mon.t)
+            assert_array_equal(stored_state_mon.v, state_mon.v)
+            assert_array_equal(stored_state_mon[3].v, state_mon[3].v)
+            assert stored_spike_mon.num_spikes == spike_mon.num_spikes > 0
+            assert_array_equal(stored_spike_mon.i, spike_mon.i[:])
+            assert_array_equal(stored_spike_mon.t, spike_mon.t[:])
+            assert_array_equal(stored_spike_mon.count, spike_mon.count)
+            # The values are stored in standard .npy files
+            assert_array_equal(np.load(os.path.join(state_storage.directory, 'v.npy')).T,
+                               state_mon.v_)
+            # Only a block of values is kept in memory
+            assert len(stored_state_mon.variables['t'].get_value()) == 0
+    finally:
+        shutil.rmtree(tempdir)
+        brian_prefs.codegen.target = target_before
+
+
+def test_monitor_storage_hdf5():
+    '''
+    Test writing the recorded values to a HDF5 file during the run.
+    '''
+    if h5py is None:
+        return
+    target_before = brian_prefs.codegen.target
+    tempdir = tempfile.mkdtemp()
+    try:
+        for target in targets:
+            brian_prefs.codegen.target = target
+            defaultclock.t = 0*second
+            G = NeuronGroup(5, '''dv/dt = rate : 1
+                                  rate : Hz''', threshold='v>1', reset='v=0')
+            G.rate = np.linspace(100, 1000, 5)*Hz
+            state_mon = StateMonitor(G, 'v', record=[1, 3])
+            spike_mon = SpikeMonitor(G)
+            state_storage = HDF5Storage(os.path.join(tempdir, target + '_state.h5'),
+                                        block_size=7)
+            stored_state_mon = StateMonitor(G, 'v', record=[1, 3],
+                                            storage=state_storage)
+            # The file name extension selects the HDF5 storage
+            spike_filename = os.path.join(tempdir, target + '_spikes.hdf5')
+            stored_spike_mon = SpikeMonitor(G, storage=spike_filename)
+            assert isinstance(stored_spike_mon.storage, HDF5Storage)
+            net = Network(G, state_mon, spike_mon, stored_state_mon,
+                          stored_spike_mon)
+            net.run(2*ms)
+            net.run(3*ms)
+            assert len(stored_state_mon) == len(state_mon) == 50
+            assert_array_equal(stored_state_mon.t, state_mon.t)
+            assert_array_equal(stored_state_mon.v, state_mon.v)
+            assert stored_spike_mon.num_spikes == spike_mon.num_spikes > 0
+            assert_array_equal(stored_spike_mon.i, spike_mon.i[:])
+            assert_array_equal(stored_spike_mon.t, spike_mon.t[:])
+            # The values are stored as datasets in the file
+            state_storage.close()
+            stored_spike_mon.storage.close()
+            with h5py.File(state_storage.filename, 'r') as f:
+                assert_array_equal(f['v'][...].T, state_mon.v_)
+            with h5py.File(spike_filename, 'r') as f:
+                assert_array_equal(f['i'][...], spike_mon.i[:])
+    finally:
+        shutil.rmtree(tempdir)
+        brian_prefs.codegen.target = target_before
+
+
+def test_monitor_history():
+    '''
+    Test keeping only the values recorded during a given duration.
+    '''
+    target_before = brian_prefs.codegen.target
+    for target in targets:
+        brian_prefs.codegen.target = target
+        defaultclock.t = 0*second
+        G = NeuronGroup(2, '''dv/dt = 1/ms : 1
+                              spiking : 1''', threshold='spiking > 0')
+        G.spiking = [1, 0]  # only the first neuron spikes, every time step
+        mon = StateMonitor(G, 'v', record=True)
+        history = 5*defaultclock.dt
+        state_mon = StateMonitor(G, 'v', record=True, history=history)
+        spike_mon = SpikeMonitor(G, history=history)
+        rate_mon = PopulationRateMonitor(G, history=history)
+        net = Network(G, mon, state_mon, spike_mon, rate_mon)
+        net.run(3*defaultclock.dt)
+        assert len(state_mon) == 3
+        assert_allclose(state_mon.t, mon.t)
+        assert_allclose(rate_mon.t, mon.t)
+        assert_allclose(spike_mon.t, mon.t)
+        net.run(9*defaultclock.dt)
+        # The arrays are only allocated for the history
+        assert state_mon.variables['t'].get_value().shape == (5, )
+        assert rate_mon.variables['rate'].get_value().shape == (5, )
+        assert len(state_mon) == 5
+        assert_allclose(state_mon.t, mon.t[-5:])
+        assert_allclose(state_mon.v, mon.v[:, -5:])
+        assert_allclose(state_mon[1].v, mon[1].v[-5:])
+        assert_allclose(rate_mon.t, mon.t[-5:])
+        assert_allclose(rate_mon.rate, 0.5 * np.ones(5) / defaultclock.dt)
+        # Spikes during the same time steps as the recorded values
+        assert len(spike_mon) == 5
+        assert_allclose(spike_mon.t, np.arange(7, 12) * defaultclock.dt)
+        assert_array_equal(spike_mon.i, np.zeros(5))
+        assert_array_equal(spike_mon.count, [12, 0])
+        # Changing the clock after the run does not change the history
+        defaultclock.t = 0*second
+        assert len(spike_mon) == 5
+        assert_allclose(spike_mon.t, np.arange(7, 12) * defaultclock.dt)
+
+    assert_raises(ValueError, lambda: StateMonitor(G, 'v', history=5*ms,
+                                                   storage=MonitorStorage()))
+    assert_raises(ValueError, lambda: SpikeMonitor(G, history=5*ms,
+                                                   storage=MonitorStorage()))
+    assert_raises(DimensionMismatchError,
+                  lambda: PopulationRateMonitor(G, history=5))
+
+    brian_prefs.codegen.target = target_before
+
+
 def test_rate_monitor():
     target_before = brian_prefs.codegen.target
     for target in targets:
@@ -175,4 +411,9 @@ def test_rate_monitor():
 if __name__ == '__main__':
     test_spike_monitor()
     test_state_monitor()
+    test_state_monitor_multiple_runs()
+    test_state_monitor_reductions()
+    test_monitor_storage()
+    test_monitor_storage_hdf5()
+    test_monitor_history()
     test_rate_monitor()
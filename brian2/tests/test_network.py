@@ -97,6 +97,19 @@ def test_network_different_clocks():
     net.run(10*ms)
     assert_equal(''.join(updates), 'xyxxxyxxxyxxxy')
 
+@with_setup(teardown=restore_initial_state)
+def test_network_different_clocks_no_multiples():
+    # Check that a network with two clocks where one dt is not a multiple of
+    # the other functions correctly
+    updates[:] = []
+    clock1 = Clock(dt=1*ms)
+    clock2 = Clock(dt=2.5*ms)
+    x = NameLister(name='x', when=(clock1, 0))
+    y = NameLister(name='y', when=(clock2, 1))
+    net = Network(x, y)
+    net.run(5*ms)
+    assert_equal(''.join(updates), 'xyxxyxx')
+
 @with_setup(teardown=restore_initial_state)
 def test_network_different_when():
     # Check that a network with different when attributes functions correctly
@@ -566,6 +579,7 @@ if __name__=='__main__':
               test_network_single_object,
               test_network_two_objects,
               test_network_different_clocks,
+              test_network_different_clocks_no_multiples,
               test_network_different_when,
               test_network_reinit_pre_post_run,
               test_magic_network,
@@ -1,3 +1,8 @@
+import os
+from distutils.ccompiler import new_compiler
+from distutils.spawn import find_executable
+from distutils.sysconfig import customize_compiler, get_python_inc
+
 import sympy
 import numpy as np
 from numpy.testing.utils import assert_raises, assert_equal, assert_allclose
@@ -17,6 +22,8 @@ from brian2.units.allunits import second, volt
 from brian2.units.stdunits import ms, mV, Hz
 from brian2.codegen.runtime.weave_rt import WeaveCodeObject
 from brian2.codegen.runtime.numpy_rt import NumpyCodeObject
+from brian2.codegen.runtime.numexpr_rt import NumexprCodeObject, numexpr
+from brian2.codegen.runtime.cpp_extension_rt import CPPExtensionCodeObject
 from brian2.utils.logger import catch_logs
 
 # We can only test C++ if weave is available
@@ -28,6 +35,22 @@ except ImportError:
     codeobj_classes = [NumpyCodeObject]
 
 
+def can_compile_extensions():
+    '''
+    Whether a compiler and the Python headers for compiling extension modules
+    (see `CPPExtensionCodeObject`) are available.
+    '''
+    try:
+        compiler = new_compiler()
+        customize_compiler(compiler)
+    except Exception:
+        return False
+    executable = getattr(compiler, 'compiler_so', None)
+    if executable and find_executable(executable[0]) is None:
+        return False
+    return os.path.exists(os.path.join(get_python_inc(), 'Python.h'))
+
+
 def test_creation():
     '''
     A basic test that creating a NeuronGroup works.
@@ -95,6 +118,40 @@ def test_stochastic_variable_multiplicative():
         net = Network(G)
         net.run(defaultclock.dt)
 
+def test_random_numbers_weave():
+    '''
+    Test the random number generators for weave.
+    '''
+    if not WeaveCodeObject in codeobj_classes:
+        return
+    for generator in ['native', 'numpy']:
+        brian_prefs['codegen.runtime.weave.random_generator'] = generator
+        try:
+            values = []
+            for _ in range(2):
+                np.random.seed(42)
+                G = NeuronGroup(10000, '''x : 1
+                                          y : 1''',
+                                codeobj_class=WeaveCodeObject)
+                G.x = 'rand()'
+                G.y = 'randn()'
+                values.append((G.x[:].copy(), G.y[:].copy()))
+            if generator == 'native':
+                # Seeding numpy's generator makes the results reproducible
+                # (the numpy implementation uses buffers shared across
+                # code objects, the results depend on earlier calls)
+                assert_equal(values[0][0], values[1][0])
+                assert_equal(values[0][1], values[1][1])
+            x, y = values[0]
+            assert np.all((x >= 0) & (x < 1))
+            assert abs(np.mean(x) - 0.5) < 0.05
+            assert abs(np.mean(y)) < 0.05
+            assert abs(np.std(y) - 1) < 0.05
+            # Different code objects should not use the same random numbers
+            assert not np.any(x == y)
+        finally:
+            brian_prefs['codegen.runtime.weave.random_generator'] = 'native'
+
 def test_scalar_variable():
     '''
     Test the correct handling of scalar variables
@@ -484,6 +541,86 @@ def test_threshold_reset():
         net.run(defaultclock.dt)
         assert_equal(G.v[:], np.array([0, 1, 0.5]))
 
+def test_weave_compiled_function():
+    '''
+    Test that the compiled function is called directly after the first call.
+    '''
+    if not WeaveCodeObject in codeobj_classes:
+        return
+    G = NeuronGroup(3, 'dv/dt = -v/(10*ms) : 1', codeobj_class=WeaveCodeObject)
+    G.v = 1
+    net = Network(G)
+    net.run(defaultclock.dt)
+    codeobj = G.state_updater.codeobj
+    assert codeobj.compiled_func is not None
+    net.run(defaultclock.dt)
+    assert_allclose(G.v[:], np.exp(-2*defaultclock.dt/(10*ms)))
+
+    # Only a conversion error (i.e. changed argument types) should lead to a
+    # new lookup of the function, other errors are raised directly
+    calls = []
+    def raise_error(message):
+        def func(local_dict, global_dict):
+            calls.append(message)
+            raise TypeError(message)
+        return func
+    codeobj.compiled_func = raise_error('error in the code')
+    assert_raises(TypeError, lambda: net.run(defaultclock.dt))
+    assert calls == ['error in the code']
+    assert_allclose(G.v[:], np.exp(-2*defaultclock.dt/(10*ms)))
+    codeobj.compiled_func = raise_error('Conversion Error: wrong type')
+    net.run(defaultclock.dt)
+    assert calls == ['error in the code', 'Conversion Error: wrong type']
+    assert_allclose(G.v[:], np.exp(-3*defaultclock.dt/(10*ms)))
+    assert codeobj.compiled_func is not None
+
+def test_multistep_run():
+    '''
+    Test that running several time steps in a single weave call gives the same
+    results as running them one by one.
+    '''
+    if not WeaveCodeObject in codeobj_classes:
+        return
+    for random_generator in ['native', 'numpy']:
+        results = []
+        for steps_per_call in [1, 7]:
+            brian_prefs['codegen.runtime.weave.steps_per_call'] = steps_per_call
+            brian_prefs['codegen.runtime.weave.random_generator'] = random_generator
+            try:
+                np.random.seed(4321)
+                # Two groups with different sizes and constants
+                G1 = NeuronGroup(5, 'dv/dt = (2 - v)/tau : 1', threshold='v > 1',
+                                 reset='v = 0', refractory=2*ms,
+                                 namespace={'tau': 10*ms},
+                                 codeobj_class=WeaveCodeObject)
+                G1.v = 'i*0.2'
+                G2 = NeuronGroup(3, 'dv/dt = (3 - v)/tau : 1', threshold='v > 2',
+                                 reset='v = 0.5', namespace={'tau': 5*ms},
+                                 codeobj_class=WeaveCodeObject)
+                # A group using random numbers (with different combinations of
+                # functions and therefore support code in its code objects)
+                G3 = NeuronGroup(4, 'dv/dt = (rand() - v)/(10*ms) : 1',
+                                 threshold='v > 0.5 + 0.1*randn()',
+                                 reset='v = 0.1*rand()',
+                                 codeobj_class=WeaveCodeObject)
+                net = Network(G1, G2, G3)
+                net.run(10.05*ms)
+                # Make sure that the code objects were run together
+                assert ((net._multistep_runner(defaultclock) is not None) ==
+                        (steps_per_call > 1))
+                results.append([G1.v[:].copy(), G1.lastspike[:].copy(),
+                                G2.v[:].copy(), G3.v[:].copy(), net.t])
+            finally:
+                brian_prefs['codegen.runtime.weave.steps_per_call'] = 1
+                brian_prefs['codegen.runtime.weave.random_generator'] = 'native'
+        if random_generator == 'numpy':
+            # The code objects share the buffer of random numbers when run
+            # together, the values of G3 are therefore different
+            del results[0][3]
+            del results[1][3]
+        for values1, values2 in zip(*results):
+            assert_equal(values1, values2)
+
 def test_unit_errors_threshold_reset():
     '''
     Test that unit errors in thresholds and resets are detected.
@@ -874,6 +1011,91 @@ def test_aliasing_in_statements():
     assert_equal(g.x_1_[:], np.array([0]))
 
 
+def test_numpy_inplace_operations():
+    '''
+    Test that the in-place numpy code gives the same results as the standard
+    numpy code and does not allocate new buffers after the first time step.
+    '''
+    eqs = '''dv/dt = (w - v)/(10*ms) + sin(v)/(20*ms) : 1 (unless-refractory)
+             dw/dt = -w/(5*ms) : 1'''
+    results = []
+    old_inplace = brian_prefs['codegen.generators.numpy.inplace_operations']
+    try:
+        for inplace in [False, True]:
+            brian_prefs['codegen.generators.numpy.inplace_operations'] = inplace
+            G = NeuronGroup(10, eqs, threshold='v > 0.8', reset='v = 0',
+                            refractory=2*ms, codeobj_class=NumpyCodeObject)
+            G.v = np.linspace(0, 1, 10)
+            G.w = np.linspace(1, 2, 10)
+            net = Network(G)
+            net.run(5*defaultclock.dt)
+            codeobj = G.state_updater.codeobj
+            buffers = dict(codeobj.scratch_buffers)
+            assert (len(buffers) > 0) == inplace
+            net.run(5*defaultclock.dt)
+            for name, buf in codeobj.scratch_buffers.iteritems():
+                assert buffers[name] is buf
+            results.append((G.v[:].copy(), G.w[:].copy()))
+    finally:
+        brian_prefs['codegen.generators.numpy.inplace_operations'] = old_inplace
+    assert_allclose(results[0][0], results[1][0])
+    assert_allclose(results[0][1], results[1][1])
+
+
+def test_numexpr_target():
+    '''
+    Test that the numexpr target gives the same results as numpy, including
+    statements that have to fall back to numpy.
+    '''
+    if numexpr is None:
+        return
+    eqs = '''dv/dt = (w - v)/(10*ms) + sin(v)/(20*ms) : 1 (unless-refractory)
+             dw/dt = -w/(5*ms) + 0.1*rand()/ms: 1
+             u : 1'''
+    results = []
+    for codeobj_class in [NumpyCodeObject, NumexprCodeObject]:
+        np.random.seed(12345)
+        G = NeuronGroup(10, eqs, threshold='v > 0.8',
+                        reset='''v = 0
+                                 u += 1''',
+                        refractory=2*ms, codeobj_class=codeobj_class)
+        G.v = np.linspace(0, 1, 10)
+        G.w = np.linspace(1, 2, 10)
+        op = G.custom_operation('u = clip(u, 0, 2) + abs(v - w) % 1')
+        net = Network(G, op)
+        net.run(10*defaultclock.dt)
+        results.append((G.v[:].copy(), G.w[:].copy(), G.u[:].copy()))
+        if codeobj_class is NumexprCodeObject:
+            # The statement using sin(v) should be evaluated with numexpr
+            code_lines = G.state_updater.codeobj.code.split('\n')
+            assert any('_numexpr.evaluate' in line and 'sin(' in line
+                       for line in code_lines)
+    for numpy_values, numexpr_values in zip(*results):
+        assert_allclose(numpy_values, numexpr_values)
+
+
+def test_cpp_extension_target():
+    '''
+    Test that the C++ extension target gives the same results as numpy.
+    '''
+    if not can_compile_extensions():
+        return
+    eqs = '''dv/dt = (2 - v)/(10*ms) : 1 (unless-refractory)
+             count : 1'''
+    results = []
+    for codeobj_class in [NumpyCodeObject, CPPExtensionCodeObject]:
+        G = NeuronGroup(10, eqs, threshold='v > 1',
+                        reset='''v = 0
+                                 count += 1''',
+                        refractory=2*ms, codeobj_class=codeobj_class)
+        G.v = np.linspace(0, 1, 10)
+        net = Network(G)
+        net.run(20*ms)
+        results.append((G.v[:].copy(), G.count[:].copy()))
+    for numpy_values, cpp_values in zip(*results):
+        assert_allclose(numpy_values, cpp_values)
+
+
 if __name__ == '__main__':
     test_creation()
     test_variables()
@@ -897,8 +1119,11 @@ if __name__ == '__main__':
     test_linked_synapses()
     test_stochastic_variable()
     test_stochastic_variable_multiplicative()
+    test_random_numbers_weave()
     test_unit_errors()
     test_threshold_reset()
+    test_weave_compiled_function()
+    test_multistep_run()
     test_unit_errors_threshold_reset()
     test_incomplete_namespace()
     test_namespace_errors()
@@ -914,3 +1139,6 @@ if __name__ == '__main__':
     test_repr()
     test_get_dtype()
     test_aliasing_in_statements()
+    test_numpy_inplace_operations()
+    test_numexpr_target()
+    test_cpp_extension_target()
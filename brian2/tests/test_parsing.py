@@ -404,6 +404,15 @@ def test_sympytools():
         expr2 = sympy_to_str(str_to_sympy(expr))
         assert expr.replace(' ', '') == expr2.replace(' ', ''), '%s != %s' % (expr, expr2)
 
+    # The results are cached
+    hits = str_to_sympy.cache_info().hits
+    str_to_sympy(expressions[1])
+    assert str_to_sympy.cache_info().hits == hits + 1
+    # sympy considers 1 and 1.0 as equal, but they should not be rendered in
+    # the same way
+    assert (sympy_to_str(str_to_sympy('1')) !=
+            sympy_to_str(str_to_sympy('1.0')))
+
 
 if __name__=='__main__':
     test_parse_expressions_python()
@@ -1,9 +1,11 @@
 import numpy as np
 from numpy.testing.utils import assert_equal
-from brian2.synapses.spikequeue import SpikeQueue
+from brian2.synapses.spikequeue import SpikeQueue, BucketSpikeQueue
 from brian2.units.stdunits import ms
 from brian2.memory.dynamicarray import DynamicArray1D
 
+queue_classes = [SpikeQueue, BucketSpikeQueue]
+
 
 def create_all_to_all(N, dt):
     '''
@@ -32,31 +34,111 @@ def create_one_to_one(N, dt):
 
 
 def test_spikequeue():
-    N = 100
+    for queue_class in queue_classes:
+        N = 100
+        dt = float(0.1*ms)
+        synapses, delays = create_one_to_one(N, dt)
+        queue = queue_class(source_start=0, source_end=N)
+        queue.prepare(delays[:], dt, synapses)
+        queue.push(np.arange(N, dtype=np.int32))
+        for i in xrange(N):
+            assert_equal(queue.peek(), np.array([i]))
+            queue.advance()
+        for i in xrange(N):
+            assert_equal(queue.peek(), np.array([]))
+            queue.advance()
+
+        synapses, delays = create_all_to_all(N, dt)
+
+        queue = queue_class(source_start=0, source_end=N)
+        queue.prepare(delays[:], dt, synapses)
+        queue.push(np.arange(N*N, dtype=np.int32))
+        for i in xrange(N):
+            assert_equal(queue.peek(), i*N + np.arange(N))
+            queue.advance()
+        for i in xrange(N):
+            assert_equal(queue.peek(), np.array([]))
+            queue.advance()
+
+
+def test_spikequeue_heterogeneous_delays():
+    # Several neurons spiking at the same time with synapses that share the
+    # same delays, synapses are not sorted by their source
+    N = 10
     dt = float(0.1*ms)
-    synapses, delays = create_one_to_one(N, dt)
-    queue = SpikeQueue(source_start=0, source_end=N)
-    queue.prepare(delays[:], dt, synapses)
-    queue.push(np.arange(N, dtype=np.int32))
-    for i in xrange(N):
-        assert_equal(queue.peek(), np.array([i]))
-        queue.advance()
-    for i in xrange(N):
+    sources = np.tile(np.arange(N, dtype=np.int32), 3)
+    delays = np.repeat(np.array([0, 1, 3]), N) * dt
+    queues = [SpikeQueue(source_start=0, source_end=N,
+                         precompute_offsets=True),
+              SpikeQueue(source_start=0, source_end=N,
+                         precompute_offsets=False),
+              BucketSpikeQueue(source_start=0, source_end=N)]
+    for queue in queues:
+        queue.prepare(delays, dt, sources)
+        queue.push(np.array([2, 5, 7], dtype=np.int32))
+        assert_equal(np.sort(queue.peek()), np.array([2, 5, 7]))
+        queue.advance()
+        assert_equal(np.sort(queue.peek()), np.array([12, 15, 17]))
+        queue.advance()
+        assert_equal(queue.peek(), np.array([]))
+        queue.advance()
+        assert_equal(np.sort(queue.peek()), np.array([22, 25, 27]))
+        queue.advance()
+
+    # Subgroup as source (source indices are not relative to the subgroup)
+    for queue_class in queue_classes:
+        queue = queue_class(source_start=5, source_end=N)
+        sources = np.arange(5, N, dtype=np.int32)
+        queue.prepare(np.array([dt, 2*dt, dt, 2*dt, dt]), dt, sources)
+        queue.push(np.arange(N, dtype=np.int32))
         assert_equal(queue.peek(), np.array([]))
         queue.advance()
+        assert_equal(np.sort(queue.peek()), np.array([0, 2, 4]))
+        queue.advance()
+        assert_equal(np.sort(queue.peek()), np.array([1, 3]))
 
-    synapses, delays = create_all_to_all(N, dt)
 
-    queue = SpikeQueue(source_start=0, source_end=N)
-    queue.prepare(delays[:], dt, synapses)
-    queue.push(np.arange(N*N, dtype=np.int32))
-    for i in xrange(N):
-        assert_equal(queue.peek(), i*N + np.arange(N))
+def test_spikequeue_prepare_stored_spikes():
+    for queue_class in queue_classes:
+        N = 10
+        dt = float(0.1*ms)
+        synapses, delays = create_one_to_one(N, dt)
+        queue = queue_class(source_start=0, source_end=N)
+        queue.prepare(delays[:], dt, synapses)
+        queue.push(np.arange(N, dtype=np.int32))
         queue.advance()
-    for i in xrange(N):
-        assert_equal(queue.peek(), np.array([]))
+        # Preparing again with the same dt and delays should not change anything
+        queue.prepare(delays[:], dt, synapses)
+        for i in xrange(1, N):
+            assert_equal(queue.peek(), np.array([i]))
+            queue.advance()
+
+        queue = queue_class(source_start=0, source_end=N)
+        queue.prepare(delays[:], dt, synapses)
+        queue.push(np.arange(N, dtype=np.int32))
+        queue.advance()
+        # Preparing with a larger dt merges spikes into the same time step
+        queue.prepare(delays[:], 2*dt, synapses)
+        for step in xrange(N):
+            expected = [i for i in xrange(1, N)
+                        if int(np.round((i - 1) / 2.0)) == step]
+            assert_equal(np.sort(queue.peek()), np.array(expected))
+            queue.advance()
+
+        queue = queue_class(source_start=0, source_end=N)
+        queue.prepare(delays[:], dt, synapses)
+        queue.push(np.arange(N, dtype=np.int32))
         queue.advance()
+        # Preparing with a smaller dt spreads spikes over more time steps
+        queue.prepare(delays[:], dt/2, synapses)
+        for i in xrange(1, N):
+            assert_equal(queue.peek(), np.array([i]))
+            queue.advance()
+            assert_equal(queue.peek(), np.array([]))
+            queue.advance()
 
 
 if __name__ == '__main__':
     test_spikequeue()
+    test_spikequeue_heterogeneous_delays()
+    test_spikequeue_prepare_stored_spikes()
@@ -284,6 +284,36 @@ def test_connection_random():
         S.connect([0, 1], [0, 2], p=0.3)
 
 
+def test_connection_random_sparse():
+    '''
+    Test random connections with a constant probability, which are sampled
+    directly.
+    '''
+    G = NeuronGroup(1000, 'v: 1')
+    G2 = NeuronGroup(500, 'v: 1')
+
+    for codeobj_class in codeobj_classes:
+        S = Synapses(G, G2, 'w:1', 'v+=w', codeobj_class=codeobj_class)
+        S.connect(True, p=0.1)
+        # The expected number is 50000 with a standard deviation of ~212
+        assert 48000 < len(S) < 52000
+        pairs = S.i[:].astype(np.int64) * len(G2) + S.j[:]
+        assert len(np.unique(pairs)) == len(S)
+        _compare(S, np.bincount(pairs, minlength=len(G)*len(G2)).reshape(len(G), len(G2)))
+
+        S = Synapses(G, G, 'w:1', 'v+=w', codeobj_class=codeobj_class)
+        S.connect('i != j', p=0.05, n=2)
+        assert 2*90000 < len(S) < 2*110000
+        assert all(S.i[:] != S.j[:])
+
+        S = Synapses(G[:100], G2[100:300], 'w:1', 'v+=w', codeobj_class=codeobj_class)
+        S.connect('i < j', p=0.5)
+        assert len(S) > 0
+        assert all(S.i[:] < S.j[:])
+        assert all(S.i[:] < 100)
+        assert all(S.j[:] < 200)
+
+
 def test_connection_multiple_synapses():
     '''
     Test multiple synapses per connection.
@@ -305,6 +335,53 @@ def test_connection_multiple_synapses():
                                                                   axis=0))
 
 
+def test_connection_string_blocks():
+    '''
+    Test that creating synapses in blocks of presynaptic neurons (numpy only)
+    does not depend on the size of the blocks.
+    '''
+    G = NeuronGroup(42, 'v: 1')
+    G2 = NeuronGroup(17, 'v: 1')
+    G2.v = 'i'
+    results = []
+    for block_size in [1, 40, 1000000]:
+        brian_prefs['codegen.runtime.numpy.synapses_create_block_size'] = block_size
+        try:
+            np.random.seed(4321)
+            S = Synapses(G, G2, 'w:1', 'v+=w', codeobj_class=NumpyCodeObject)
+            S.connect('v_post > 2 and rand() < 0.5', n='i % 3', p=0.7)
+            S.connect('i == j')
+            # Without random numbers in the condition, blocks of several
+            # presynaptic neurons are used
+            S2 = Synapses(G, G2, 'w:1', 'v+=w', codeobj_class=NumpyCodeObject)
+            S2.connect('v_post > 2', n='i % 3', p=0.7)
+            # A condition that only depends on the presynaptic index, random
+            # numbers are only drawn for the presynaptic neurons fulfilling it
+            np.random.seed(1234)
+            S3 = Synapses(G, G2, 'w:1', 'v+=w', codeobj_class=NumpyCodeObject)
+            S3.connect('i > 5', p=0.1)
+            results.append((S.i[:].copy(), S.j[:].copy(),
+                            S.N_incoming[:].copy(), S.N_outgoing[:].copy(),
+                            S2.i[:].copy(), S2.j[:].copy(),
+                            S3.i[:].copy(), S3.j[:].copy()))
+        finally:
+            brian_prefs['codegen.runtime.numpy.synapses_create_block_size'] = 1000000
+    for values in results[1:]:
+        for value, expected in zip(values, results[0]):
+            assert_equal(value, expected)
+    assert_equal(results[0][0][-17:], np.arange(17))
+    # The same connections as when connecting each presynaptic neuron
+    # separately
+    np.random.seed(1234)
+    expected_i, expected_j = [], []
+    for i in xrange(6, 42):
+        targets, = (np.random.rand(17) < 0.1).nonzero()
+        expected_i.extend([i] * len(targets))
+        expected_j.extend(targets)
+    assert_equal(results[0][6], expected_i)
+    assert_equal(results[0][7], expected_j)
+
+
 def test_state_variable_assignment():
     '''
     Assign values to state variables in various ways
@@ -499,14 +576,17 @@ def test_transmission():
 
 
 def test_changed_dt_spikes_in_queue():
-    for codeobj_class in codeobj_classes:
+    for codeobj_class, queue_class in [(c, q)
+                                       for c in codeobj_classes
+                                       for q in [None, BucketSpikeQueue]]:
         defaultclock.dt = .5*ms
         G1 = NeuronGroup(1, 'v:1', threshold='v>1', reset='v=0',
                          codeobj_class=codeobj_class)
         G1.v = 1.1
         G2 = NeuronGroup(10, 'v:1', threshold='v>1', reset='v=0',
                          codeobj_class=codeobj_class)
-        S = Synapses(G1, G2, pre='v+=1.1', codeobj_class=codeobj_class)
+        S = Synapses(G1, G2, pre='v+=1.1', codeobj_class=codeobj_class,
+                     queue_class=queue_class)
         S.connect(True)
         S.delay = 'j*ms'
         mon = SpikeMonitor(G2)
@@ -525,6 +605,33 @@ def test_changed_dt_spikes_in_queue():
         assert_equal(mon.t[:], expected)
 
 
+def test_spike_queue_preparation():
+    for codeobj_class in codeobj_classes:
+        G = NeuronGroup(5, 'v:1', threshold='v>1', reset='v=0',
+                        codeobj_class=codeobj_class)
+        S = Synapses(G, G, 'w:1', pre='v+=w', connect='i==j',
+                     codeobj_class=codeobj_class)
+        net = Network(G, S)
+        net.run(0*ms)
+        queue_state = S.pre._queue_state
+        # Nothing changed, the queue does not have to be prepared again
+        net.run(0*ms)
+        assert S.pre._queue_state is queue_state
+        # Changing the delays or the connectivity invalidates the queue
+        S.delay = 'i*ms'
+        net.run(0*ms)
+        assert S.pre._queue_state != queue_state
+        queue_state = S.pre._queue_state
+        S.connect(0, 1)
+        net.run(0*ms)
+        assert S.pre._queue_state != queue_state
+        # Changing other variables does not
+        queue_state = S.pre._queue_state
+        S.w = 2
+        net.run(0*ms)
+        assert S.pre._queue_state is queue_state
+
+
 def test_summed_variable():
     for codeobj_class in codeobj_classes:
         source = NeuronGroup(2, 'v : 1', threshold='v>1', reset='v=0',
@@ -705,7 +812,9 @@ if __name__ == '__main__':
     test_incoming_outgoing()
     test_connection_string_deterministic()
     test_connection_random()
+    test_connection_random_sparse()
     test_connection_multiple_synapses()
+    test_connection_string_blocks()
     test_connection_arrays()
     test_connection_array_standalone()
     restore_device()
@@ -716,6 +825,7 @@ if __name__ == '__main__':
     test_delay_specification()
     test_transmission()
     test_changed_dt_spikes_in_queue()
+    test_spike_queue_preparation()
     test_summed_variable()
     test_summed_variable_errors()
     test_scalar_parameter_access()
@@ -1,4 +1,7 @@
+from numpy.testing import assert_equal
+
 from brian2.utils.environment import running_from_ipython
+from brian2.utils.caching import memoize
 
 def test_environment():
     '''
@@ -25,7 +28,44 @@ def test_environment():
         del builtins.__IPYTHON__
 
 
+def test_memoize():
+    '''
+    Test the bounded memoisation of functions.
+    '''
+    calls = []
+    @memoize(maxsize=2)
+    def f(x, y=1):
+        calls.append((x, y))
+        return x + y
+
+    assert f(1) == 2
+    assert f(1) == 2
+    assert f(1, y=2) == 3
+    assert f(2) == 3
+    assert_equal(calls, [(1, 1), (1, 2), (2, 1)])
+    info = f.cache_info()
+    assert info.hits == 1 and info.misses == 3
+    assert info.maxsize == 2 and info.currsize == 2
+    # f(1) was the least recently used result
+    assert f(1) == 2
+    assert len(calls) == 4
+    # unhashable arguments are not cached
+    assert f([1], y=[2]) == [1, 2]
+    assert f.cache_info().currsize == 2
+    f.cache_clear()
+    assert f.cache_info() == (0, 0, 2, 0)
+
+    # using a key function
+    @memoize(key=lambda x: x.lower())
+    def g(x):
+        calls.append(x)
+        return x.lower()
+    assert g('A') == g('a') == 'a'
+    assert g.cache_info().hits == 1
+
+
 if __name__ == '__main__':
     test_environment()
+    test_memoize()
 
     
\ No newline at end of file
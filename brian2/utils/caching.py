@@ -0,0 +1,101 @@
+'''
+Module providing a decorator for the bounded memoisation of functions.
+'''
+import collections
+import functools
+try:
+    from collections import OrderedDict
+except ImportError:
+    # OrderedDict was added in Python 2.7, use backport for Python 2.6
+    from brian2.utils.ordereddict import OrderedDict
+
+__all__ = ['memoize', 'CacheInfo']
+
+#: The statistics of a memoised function, returned by its ``cache_info``
+#: function
+CacheInfo = collections.namedtuple('CacheInfo',
+                                   ['hits', 'misses', 'maxsize', 'currsize'])
+
+# Separates positional from keyword arguments in the default keys
+_KWD_MARK = object()
+
+
+def memoize(maxsize=1000, key=None):
+    '''
+    Decorator storing the results of a function for previously seen arguments.
+
+    At most ``maxsize`` results are stored, the least recently used results
+    are discarded first. The decorated function has two additional
+    attributes: ``cache_info()`` returns a `CacheInfo` tuple with the number
+    of hits and misses, and ``cache_clear()`` empties the cache and resets the
+    statistics. Note that the same object is returned for all calls with the
+    same arguments, the results should therefore be immutable or not be
+    changed by the caller.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        The maximum number of stored results. Defaults to 1000.
+    key : callable, optional
+        A function that takes the same arguments as the decorated function and
+        returns a hashable key for them. If the arguments are not hashable,
+        the key function can raise a `TypeError`, the decorated function is
+        then called without using the cache. Defaults to using the arguments
+        themselves as the key.
+
+    Examples
+    --------
+    >>> @memoize(maxsize=10)
+    ... def square(x):
+    ...     return x**2
+    >>> square(3), square(3)
+    (9, 9)
+    >>> square.cache_info()
+    CacheInfo(hits=1, misses=1, maxsize=10, currsize=1)
+    '''
+    def decorator(func):
+        cache = OrderedDict()
+        # hits, misses
+        statistics = [0, 0]
+
+        @functools.wraps(func)
+        def memoized_func(*args, **kwds):
+            try:
+                if key is not None:
+                    cache_key = key(*args, **kwds)
+                elif kwds:
+                    cache_key = args + (_KWD_MARK, ) + tuple(sorted(kwds.items()))
+                else:
+                    cache_key = args
+                result = cache.pop(cache_key)
+            except KeyError:
+                pass
+            except TypeError:
+                # unhashable arguments
+                statistics[1] += 1
+                return func(*args, **kwds)
+            else:
+                # re-insert as the most recently used result
+                cache[cache_key] = result
+                statistics[0] += 1
+                return result
+
+            statistics[1] += 1
+            result = func(*args, **kwds)
+            cache[cache_key] = result
+            if len(cache) > maxsize:
+                cache.popitem(last=False)
+            return result
+
+        def cache_info():
+            return CacheInfo(statistics[0], statistics[1], maxsize, len(cache))
+
+        def cache_clear():
+            cache.clear()
+            statistics[:] = [0, 0]
+
+        memoized_func.cache_info = cache_info
+        memoized_func.cache_clear = cache_clear
+        return memoized_func
+
+    return decorator
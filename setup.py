@@ -122,6 +122,7 @@ setup(name='Brian2',
                     'brian2.codegen.runtime.numpy_rt': ['templates/*.py_'],
                     'brian2.codegen.runtime.weave_rt': ['templates/*.cpp',
                                                         'templates/*.h'],
+                    'brian2.codegen.runtime.cpp_extension_rt': ['brianlib/*.h'],
                     'brian2.devices.cpp_standalone': ['templates/*.cpp',
                                                       'templates/*.h',
                                                       'templates/makefile',
@@ -142,7 +143,8 @@ setup(name='Brian2',
       cmdclass={'build_ext': optional_build_ext},
       provides=['brian2'],
       extras_require={'test': ['nosetests>=1.0'],
-                      'docs': ['sphinx>=1.0.1', 'sphinxcontrib-issuetracker']},
+                      'docs': ['sphinx>=1.0.1', 'sphinxcontrib-issuetracker'],
+                      'hdf5': ['h5py']},
       use_2to3=True,
       ext_modules=extensions,
       url='http://www.briansimulator.org/',